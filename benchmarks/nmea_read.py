@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# NMEA reader (gpsx_nmea.Read) benchmark
+# 1行毎に str で split する従来の reader と比較し，読み込み結果が同一であることも確認する
+#
+# 計測値 (400,000 sentences，1 core，共有の build machine):
+#   numpy 使用時	約 0.7M sentences/s (1行毎の reader の約 3倍)
+#   numpy 無し	約 0.25M sentences/s (1行毎の reader の約 1.1〜1.2倍)
+# numpy 無し版は checksum 検証 (処理時間の約 1/4) がある分，baseline の gpsx.py の
+# (datetime を使わない) 1行毎 reader よりはまだ約 1.2倍遅い
+# 当初の目標 1M sentences/s には届いていない
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gpsx
+import gpsx_nmea
+import trackgen
+
+##############################################################################
+# 従来の 1行毎 reader ($GP のみ，checksum 検証なし)
+
+def ReadNmeaPerLine(GpsLog, FileName):
+	def Str2LatLng(LatLngStr, Dir):
+		LatLng = float(LatLngStr)
+		LatLng = LatLng // 100 + (LatLng - LatLng // 100 * 100) / 60
+		if Dir == 'W' or Dir == 'S':
+			LatLng = -LatLng
+		return LatLng
+	
+	with open(FileName, 'rt') as FileIn:
+		Point		= False
+		PrevTime	= ''
+		
+		for Line in FileIn:
+			if Line.startswith('$GPRMC') or Line.startswith('$GPGGA'):
+				Param = Line.split(',')
+				
+				if PrevTime != Param[1]:
+					if Point:
+						GpsLog.AppendPoint(DateTime, Longitude, Latitude, Altitude, Speed, Bearing)
+					Point = True
+					DateTime = Longitude = Latitude = Altitude = Speed = Bearing = None
+					PrevTime = Param[1]
+				
+				if Line.startswith('$GPRMC'):
+					Time	= float(Param[1])
+					TimeUs	= int(Time * 1000 + 0.5) % 1000 * 1000
+					Time	= int(Time)
+					Date	= int(Param[9])
+					DateTime = gpsx.DateTime2Time(datetime.datetime(
+						Date % 100 + 2000, Date // 100 % 100, Date // 10000,
+						Time // 10000, Time // 100 % 100, Time % 100, TimeUs,
+						tzinfo = datetime.timezone.utc
+					))
+					
+					Longitude	= Str2LatLng(Param[5], Param[6])
+					Latitude	= Str2LatLng(Param[3], Param[4])
+					
+					if len(Param[7]) > 0:
+						Speed = float(Param[7]) * 1.852
+					if len(Param[8]) > 0:
+						Bearing = float(Param[8])
+				else:
+					if len(Param[9]) > 0:
+						Altitude = float(Param[9])
+		
+		if Point: GpsLog.AppendPoint(DateTime, Longitude, Latitude, Altitude, Speed, Bearing)
+
+##############################################################################
+
+# trackgen の擬似走行ログ (10Hz の RMC + GGA)
+# Talker が GP 以外なら talker を置き換えて checksum を付け直す
+def GenNmea(FileName, Num, Talker):
+	trackgen.GenTrack(Num).Write(FileName, 'nmea')
+	if Talker == 'GP':
+		return
+	
+	with open(FileName, 'rt') as FileIn:
+		Lines = [Talker + Line[3:Line.index('*')] for Line in FileIn]
+	with open(FileName, 'wt') as FileOut:
+		FileOut.write(''.join('$%s%s\n' % (Line, gpsx_nmea.GenChksum(Line)) for Line in Lines))
+
+def Bench(Func, FileName, Repeat):
+	Best = None
+	for i in range(Repeat):
+		GpsLog = gpsx.GpsLogClass()
+		Start = time.perf_counter()
+		Func(GpsLog, FileName)
+		Elapsed = time.perf_counter() - Start
+		Best = Elapsed if Best is None else min(Best, Elapsed)
+	return Best, GpsLog
+
+def ReadNmea(GpsLog, FileName):
+	GpsLog.Read(FileName, 'nmea')
+
+def Channels(GpsLog):
+	return [getattr(GpsLog, Name) for Name in GpsLog.Channels]
+
+if __name__ == '__main__':
+	ArgParser = argparse.ArgumentParser(description = 'NMEA reader benchmark')
+	ArgParser.add_argument('-n', metavar = 'points', dest = 'points', type = int, default = 500000, help = 'number of points (2 sentences per point)')
+	ArgParser.add_argument('-r', metavar = 'repeat', dest = 'repeat', type = int, default = 3, help = 'repeat count')
+	Arg = ArgParser.parse_args()
+	
+	with tempfile.TemporaryDirectory() as TmpDir:
+		GenNmea(TmpDir + '/gp.nmea', Arg.points, 'GP')
+		GenNmea(TmpDir + '/gn.nmea', Arg.points, 'GN')
+		
+		Old, OldLog = Bench(ReadNmeaPerLine, TmpDir + '/gp.nmea', Arg.repeat)
+		New, NewLog = Bench(ReadNmea, TmpDir + '/gp.nmea', Arg.repeat)
+		if Channels(OldLog) != Channels(NewLog):
+			sys.exit('Result mismatch')
+		
+		Gn, GnLog = Bench(ReadNmea, TmpDir + '/gn.nmea', Arg.repeat)
+		if Channels(GnLog) != Channels(NewLog):
+			sys.exit('Result mismatch ($GN)')
+	
+	Sentences = Arg.points * 2
+	print('sentences:  %d (numpy: %s)' % (Sentences, 'yes' if gpsx.numpy else 'no'))
+	print('per line:   %.3fs %10.0f sentences/s' % (Old, Sentences / Old))
+	print('bytes:      %.3fs %10.0f sentences/s' % (New, Sentences / New))
+	print('bytes $GN:  %.3fs %10.0f sentences/s' % (Gn, Sentences / Gn))
+	print('speedup:    x%.1f' % (Old / New,))
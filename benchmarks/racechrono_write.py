@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# RaceChrono writer (gpsx_racechrono.Write) benchmark
+# 1点毎に write() する従来の writer と比較し，出力が同一であることも確認する
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gpsx
+import gpsx_racechrono
+import trackgen
+
+##############################################################################
+# 従来の 1点毎 writer
+
+def WriteRaceChronoPerPoint(GpsLog, DirName):
+	os.makedirs(DirName, exist_ok=True)
+	
+	GpsLog.GenDistance()
+	GpsLog.GenSpeed()
+	GpsLog.GenAltitude()
+	GpsLog.GenBearing()
+	
+	with open(DirName + '/channel_1_100_0_1_1', 'wb') as FileOut:
+		for Time in GpsLog.Time:
+			FileOut.write(Time.to_bytes(8, 'little'))
+	
+	with open(DirName + '/channel_1_100_0_2_1', 'wb') as FileOut:
+		for Distance in GpsLog.Distance:
+			FileOut.write(int(Distance * 1000).to_bytes(8, 'little'))
+	
+	with open(DirName + '/channel_1_100_0_3_1', 'wb') as FileOut:
+		for i in range(len(GpsLog)):
+			FileOut.write(int(GpsLog.Latitude[i]  * 6000000).to_bytes(4, 'little', signed = True))
+			FileOut.write(int(GpsLog.Longitude[i] * 6000000).to_bytes(4, 'little', signed = True))
+	
+	with open(DirName + '/channel_1_100_0_4_0', 'wb') as FileOut:
+		for Speed in GpsLog.Speed:
+			FileOut.write(int(Speed * 277.7792).to_bytes(4, 'little'))
+	
+	with open(DirName + '/channel_1_100_0_5_0', 'wb') as FileOut:
+		for Altitude in GpsLog.Altitude:
+			FileOut.write(int(Altitude * 1000).to_bytes(4, 'little', signed = True))
+	
+	with open(DirName + '/channel_1_100_0_6_0', 'wb') as FileOut:
+		for Bearing in GpsLog.Bearing:
+			FileOut.write(int(Bearing * 1000).to_bytes(4, 'little', signed = True))
+
+##############################################################################
+
+def Bench(Func, GpsLog, DirName, Repeat):
+	Best = None
+	for i in range(Repeat):
+		Start = time.perf_counter()
+		Func(GpsLog, DirName)
+		Elapsed = time.perf_counter() - Start
+		Best = Elapsed if Best is None else min(Best, Elapsed)
+	return Best
+
+if __name__ == '__main__':
+	ArgParser = argparse.ArgumentParser(description = 'RaceChrono writer benchmark')
+	ArgParser.add_argument('-n', metavar = 'points', dest = 'points', type = int, default = 500000, help = 'number of points')
+	ArgParser.add_argument('-r', metavar = 'repeat', dest = 'repeat', type = int, default = 3, help = 'repeat count')
+	Arg = ArgParser.parse_args()
+	
+	GpsLog = trackgen.GenTrack(Arg.points)
+	
+	with tempfile.TemporaryDirectory() as TmpDir:
+		Old = Bench(WriteRaceChronoPerPoint, GpsLog, TmpDir + '/old', Arg.repeat)
+		New = Bench(gpsx_racechrono.Write, GpsLog, TmpDir + '/new', Arg.repeat)
+		
+		for Name, Size in gpsx_racechrono.ChannelFile:
+			with open(TmpDir + '/old/' + Name, 'rb') as fhOld, open(TmpDir + '/new/' + Name, 'rb') as fhNew:
+				if fhOld.read() != fhNew.read():
+					sys.exit('Output mismatch: ' + Name)
+	
+	print('points:     %d (numpy: %s)' % (Arg.points, 'yes' if gpsx.numpy else 'no'))
+	print('per point:  %.3fs %10.0f points/s' % (Old, Arg.points / Old))
+	print('packed:     %.3fs %10.0f points/s' % (New, Arg.points / New))
+	print('speedup:    x%.1f' % (Old / New,))
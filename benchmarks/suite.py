@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# 各 format の Reader / Writer と Gen* / ReduceSmart の benchmark suite
+# trackgen.py の擬似走行ログで各 format の読み込み, 書き出し, 往復 (書き出し → 読み込み) を
+# 計測し，points/s と peak memory (tracemalloc) を表示する．
+# -o で結果を JSON に保存し，-c で以前の結果と比較する．
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gpsx
+import trackgen
+
+# 読み込み / 書き出しできる format
+ReadFormats		= ('nmea', 'gpx', 'kml', 'kmltrack', 'vsd', 'json', 'records', 'RaceChrono', 'gpsx')
+WriteFormats	= ('nmea', 'gpx', 'kml', 'kmltrack', 'RaceChrono', 'gpsx')
+
+##############################################################################
+# 計測
+# 時間は tracemalloc 無しで Repeat 回の最小値，memory は tracemalloc 有りで 1回計測する
+
+def Measure(Func, Repeat):
+	Best = None
+	for i in range(Repeat):
+		Start = time.perf_counter()
+		Func()
+		Elapsed = time.perf_counter() - Start
+		Best = Elapsed if Best is None else min(Best, Elapsed)
+	
+	tracemalloc.start()
+	try:
+		Func()
+		Peak = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+	
+	return Best, Peak
+
+# trackgen の format → 読み込む時の format
+InputFormat = {
+	'kmltrack':	'kml',
+	'records':	'json',
+}
+
+def Read(FileName, Format):
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Read(FileName, InputFormat.get(Format, Format))
+	return GpsLog
+
+# Gen* は生成済みの値を作り直すよう force する
+def GenBench(GpsLog, Name):
+	if Name == 'GenXY':
+		def Func():
+			GpsLog.x = gpsx.array('d')
+			GpsLog.y = gpsx.array('d')
+			GpsLog.GenXY()
+		return Func
+	
+	Func = getattr(GpsLog, Name)
+	return lambda: Func(True)
+
+def ReduceBench(GpsLog):
+	def Func():
+		Copy = gpsx.GpsLogClass()
+		for Name in Copy.Channels:
+			setattr(Copy, Name, gpsx.array(getattr(GpsLog, Name).typecode, getattr(GpsLog, Name)))
+		Copy.ReduceSmart()
+	return Func
+
+def Run(Arg):
+	Result = []
+	
+	def Report(Name, Points, Elapsed, Peak):
+		Result.append({
+			'name':				Name,
+			'points':			Points,
+			'seconds':			Elapsed,
+			'points_per_sec':	Points / Elapsed if Elapsed else None,
+			'peak_bytes':		Peak,
+		})
+		print('%-22s %10.0f points/s %8.1f MiB' % (Name, Points / Elapsed if Elapsed else 0, Peak / (1 << 20)), flush = True)
+	
+	GpsLog = trackgen.GenTrack(Arg.points, Arg.seed)
+	Num = len(GpsLog)
+	
+	with tempfile.TemporaryDirectory() as TmpDir:
+		for Format in ReadFormats:
+			if Arg.format and Format not in Arg.format:
+				continue
+			
+			FileName = trackgen.WriteFormat(GpsLog, Format, TmpDir)
+			Report('read/' + Format, Num, *Measure(lambda: Read(FileName, Format), Arg.repeat))
+		
+		for Format in WriteFormats:
+			if Arg.format and Format not in Arg.format:
+				continue
+			
+			FileName = os.path.join(TmpDir, 'out_' + trackgen.Formats[Format])
+			Report('write/' + Format, Num, *Measure(lambda: GpsLog.Write(FileName, Format), Arg.repeat))
+			
+			# 往復で点数が変わらないことも確認する
+			def RoundTrip():
+				GpsLog.Write(FileName, Format)
+				if len(Read(FileName, Format)) != Num:
+					sys.exit('Round trip point count mismatch: ' + Format)
+			Report('roundtrip/' + Format, Num, *Measure(RoundTrip, Arg.repeat))
+	
+	if not Arg.format:
+		for Name in ('GenXY', 'GenSpeed', 'GenBearing', 'GenDistance', 'GenAltitude'):
+			Report(Name, Num, *Measure(GenBench(GpsLog, Name), Arg.repeat))
+		Report('ReduceSmart', Num, *Measure(ReduceBench(GpsLog), Arg.repeat))
+	
+	return Result
+
+##############################################################################
+
+def GitRevision():
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)),
+			stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True
+		).stdout.strip() or None
+	except OSError:
+		return None
+
+def Compare(Result, FileName):
+	with open(FileName, 'rt') as FileIn:
+		Old = {r['name']: r for r in json.load(FileIn)['results']}
+	
+	print('\n%-22s %10s %10s' % ('compare: ' + os.path.basename(FileName), 'speed', 'memory'))
+	for r in Result:
+		o = Old.get(r['name'])
+		if o and o['points_per_sec'] and r['points_per_sec'] and o['peak_bytes']:
+			print('%-22s %9.2fx %9.2fx' % (
+				r['name'], r['points_per_sec'] / o['points_per_sec'], r['peak_bytes'] / o['peak_bytes']
+			))
+
+if __name__ == '__main__':
+	ArgParser = argparse.ArgumentParser(description = 'gpsx benchmark suite')
+	ArgParser.add_argument('-n', metavar = 'points', dest = 'points', type = int, default = 100000, help = 'number of points')
+	ArgParser.add_argument('-r', metavar = 'repeat', dest = 'repeat', type = int, default = 3, help = 'repeat count')
+	ArgParser.add_argument('-s', metavar = 'seed', dest = 'seed', type = int, default = 1, help = 'random seed')
+	ArgParser.add_argument('-f', metavar = 'format', dest = 'format', action = 'append', choices = ReadFormats, help = 'benchmark only this format (Gen* and ReduceSmart are skipped)')
+	ArgParser.add_argument('-o', metavar = 'json', dest = 'output', help = 'save results to json')
+	ArgParser.add_argument('-c', metavar = 'json', dest = 'compare', help = 'compare with previous results')
+	Arg = ArgParser.parse_args()
+	
+	print('points: %d (numpy: %s)' % (Arg.points, gpsx.numpy.__version__ if gpsx.numpy else 'no'))
+	Result = Run(Arg)
+	
+	if Arg.output:
+		with open(Arg.output, 'wt') as FileOut:
+			json.dump({
+				'meta': {
+					'date':		datetime.datetime.now(datetime.timezone.utc).isoformat(),
+					'revision':	GitRevision(),
+					'python':	platform.python_version(),
+					'numpy':	gpsx.numpy.__version__ if gpsx.numpy else None,
+					'machine':	platform.machine(),
+					'points':	Arg.points,
+					'repeat':	Arg.repeat,
+					'seed':		Arg.seed,
+				},
+				'results': Result,
+			}, FileOut, indent = '\t')
+	
+	if Arg.compare:
+		Compare(Result, Arg.compare)
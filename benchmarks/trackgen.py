@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# 決定的な擬似走行ログ生成
+# 同じ点数・seed なら常に同じ軌跡を生成し，各 format の入力ファイルに出力する
+#
+# usage: trackgen.py [-n points] [-s seed] dir
+
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gpsx
+
+# 生成できる format → ファイル名
+Formats = {
+	'nmea':			'track.nmea',
+	'gpx':			'track.gpx',
+	'kml':			'track.kml',
+	'kmltrack':		'track_compact.kml',
+	'vsd':			'track.log',
+	'json':			'track.json',
+	'records':		'Records.json',
+	'RaceChrono':	'session',
+	'gpsx':			'track.gpsx',
+}
+
+START_TIME	= 1620086390000	# 2021-05-03T23:59:50Z
+INTERVAL	= 100			# 10Hz [ms]
+
+##############################################################################
+# 10Hz の車両の走行
+# 速度と進行方向をゆっくり変化させ，時々停止する
+
+def GenTrack(Num, Seed = 1):
+	Rand = random.Random(Seed)
+	GpsLog = gpsx.GpsLogClass()
+	
+	Lat		= 35.1
+	Lng		= 136.9
+	Alt		= 50.0
+	Speed	= 0.0		# [km/h]
+	Bearing	= 0.0		# [deg]
+	Target	= 60.0		# 目標速度
+	Turn	= 0.0		# 旋回速度 [deg/s]
+	
+	for i in range(Num):
+		# 10秒毎に目標速度と旋回を変える
+		if i % 100 == 0:
+			Target	= 0.0 if Rand.random() < 0.05 else Rand.uniform(20, 120)
+			Turn	= Rand.choice((0.0, 0.0, Rand.uniform(-20, 20)))
+		
+		Speed	= max(0.0, Speed + max(-1.0, min(1.0, Target - Speed)) * 0.5 + Rand.gauss(0, 0.1))
+		Bearing	= (Bearing + Turn * INTERVAL / 1000 * min(1.0, Speed / 20)) % 360
+		Alt		+= Rand.gauss(0, 0.05)
+		
+		Dist = Speed / 3.6 * INTERVAL / 1000
+		Lat += Dist * math.cos(math.radians(Bearing)) / 111320
+		Lng += Dist * math.sin(math.radians(Bearing)) / (111320 * math.cos(math.radians(Lat)))
+		
+		GpsLog.AppendPoint(
+			START_TIME + i * INTERVAL,
+			round(Lng, 8), round(Lat, 8), round(Alt, 2),
+			round(Speed, 3), round(Bearing, 2)
+		)
+	
+	return GpsLog
+
+##############################################################################
+# writer の無い format
+
+# VSD: GPS 行の間に他のセンサー行が入る
+def WriteVsd(GpsLog, FileName):
+	with open(FileName, 'wt') as FileOut:
+		for i in range(len(GpsLog)):
+			FileOut.write('GPS\t%s\t%.7f\t%.7f\t%.3f\t%.3f\n' % (
+				gpsx.Time2Iso(GpsLog.Time[i]).replace('+00:00', 'Z'),
+				GpsLog.Longitude[i], GpsLog.Latitude[i], GpsLog.Altitude[i], GpsLog.Speed[i]
+			))
+			FileOut.write('ACC\t%d\t%d\n' % (i % 7, i % 11))
+
+# Google Takeout の Timeline.json: 1分毎の semanticSegment の timelinePath
+def WriteGoogleTimeline(GpsLog, FileName):
+	with open(FileName, 'wt') as FileOut:
+		FileOut.write('{\n  "semanticSegments": [\n')
+		
+		for Start in range(0, len(GpsLog), 600):
+			End = min(Start + 600, len(GpsLog))
+			FileOut.write('    {\n      "startTime": "%s",\n      "endTime": "%s",\n      "timelinePath": [\n' % (
+				gpsx.Time2Iso(GpsLog.Time[Start]), gpsx.Time2Iso(GpsLog.Time[End - 1])
+			))
+			FileOut.write(',\n'.join(
+				'        {\n          "point": "%.7f°, %.7f°",\n          "time": "%s"\n        }' % (
+					GpsLog.Latitude[i], GpsLog.Longitude[i], gpsx.Time2Iso(GpsLog.Time[i])
+				) for i in range(Start, End)
+			))
+			FileOut.write('\n      ]\n    }%s\n' % (',' if End < len(GpsLog) else '',))
+		
+		FileOut.write('  ]\n}\n')
+
+# Google Takeout の Records.json: locations の配列
+# 緯度経度は 1e-7度の整数，速度 [m/s]・方位・高度は整数
+def WriteGoogleRecords(GpsLog, FileName):
+	with open(FileName, 'wt') as FileOut:
+		FileOut.write('{\n  "locations": [')
+		FileOut.write(', '.join(
+			'{\n    "latitudeE7": %d,\n    "longitudeE7": %d,\n    "accuracy": 5,\n    "velocity": %d,\n'
+			'    "heading": %d,\n    "altitude": %d,\n    "source": "GPS",\n    "timestamp": "%s"\n  }' % (
+				round(GpsLog.Latitude[i] * 1e7), round(GpsLog.Longitude[i] * 1e7),
+				round(GpsLog.Speed[i] / 3.6), round(GpsLog.Bearing[i]), round(GpsLog.Altitude[i]),
+				gpsx.Time2Iso(GpsLog.Time[i]).replace('+00:00', 'Z')
+			) for i in range(len(GpsLog))
+		))
+		FileOut.write(']\n}\n')
+
+# GpsLog を Format で Dir に出力し，ファイル名を返す
+def WriteFormat(GpsLog, Format, Dir):
+	FileName = os.path.join(Dir, Formats[Format])
+	
+	if Format == 'vsd':
+		WriteVsd(GpsLog, FileName)
+	elif Format == 'json':
+		WriteGoogleTimeline(GpsLog, FileName)
+	elif Format == 'records':
+		WriteGoogleRecords(GpsLog, FileName)
+	else:
+		GpsLog.Write(FileName, Format)
+	
+	return FileName
+
+if __name__ == '__main__':
+	ArgParser = argparse.ArgumentParser(description = 'synthetic track generator')
+	ArgParser.add_argument('dir', help = 'output directory')
+	ArgParser.add_argument('-n', metavar = 'points', dest = 'points', type = int, default = 100000, help = 'number of points')
+	ArgParser.add_argument('-s', metavar = 'seed', dest = 'seed', type = int, default = 1, help = 'random seed')
+	ArgParser.add_argument('-f', metavar = 'format', dest = 'format', action = 'append', choices = Formats.keys(), help = 'format (default: all)')
+	Arg = ArgParser.parse_args()
+	
+	os.makedirs(Arg.dir, exist_ok = True)
+	GpsLog = GenTrack(Arg.points, Arg.seed)
+	for Format in Arg.format or Formats:
+		print(WriteFormat(GpsLog, Format, Arg.dir))
+
@@ -1,35 +1,215 @@
 #!/usr/bin/env python3
 
-import argparse
+import bisect
+import collections.abc
 import datetime
 import sys
 import contextlib
 import os
 import gzip
+import heapq
+import importlib
+import io
+import itertools
+import operator
 import re
-from math import sin, cos, sqrt, atan2
+import threading
+import time
+from array import array
+from math import sin, cos, sqrt, atan2, inf, ceil, floor
+
+# script として実行した時も，format / 機能毎の module が import する gpsx をこの module にする
+sys.modules.setdefault('gpsx', sys.modules[__name__])
+
+##############################################################################
+# import に時間の掛かる module (numpy) は最初に使う時に import する
+# 使った時点で Globals[Name] を module (import できなければ None) に置き換えるので，
+# 以後は module を直接参照する．'if numpy:' で有無を判定できる
+
+class LazyModule:
+	
+	def __init__(self, Globals, Name):
+		self.Globals	= Globals
+		self.Name		= Name
+	
+	def Load(self):
+		try:
+			Module = importlib.import_module(self.Name)
+		except ImportError:
+			Module = None
+		
+		self.Globals[self.Name] = Module
+		return Module
+	
+	def __bool__(self):
+		return self.Load() is not None
+	
+	def __getattr__(self, Name):
+		return getattr(self.Load(), Name)
+
+numpy = LazyModule(globals(), 'numpy')
+
+##############################################################################
+# 機能毎の module に分けた class は，gpsx.ParseCacheClass 等で参照された時に import する
+
+_LazyClass = {
+	'ParseCacheClass':	'gpsx_cache',
+	'TimeIndexClass':	'gpsx_index',
+	'RangeFile':		'gpsx_index',
+	'LapTimerClass':	'gpsx_lap',
+	'WatchClass':		'gpsx_watch',
+	'WatchStateClass':	'gpsx_watch',
+	'InotifyClass':		'gpsx_watch',
+	'ProfileClass':		'gpsx_profile',
+}
+
+def __getattr__(Name):
+	if Name in _LazyClass:
+		return getattr(importlib.import_module(_LazyClass[Name]), Name)
+	raise AttributeError('module %r has no attribute %r' % (__name__, Name))
 
 ##############################################################################
 
+GZIP_LEVEL = 9
+
+# parse cache の上限 [byte]，時刻 index の間隔 [s]，--watch の確認間隔 [s] の既定値
+CACHE_SIZE		= 256 << 20
+INDEX_INTERVAL	= 60
+WATCH_INTERVAL	= 1
+
 @contextlib.contextmanager
-def smart_open(filename = None, mode = 'r'):
+def smart_open(filename = None, mode = 'r', level = GZIP_LEVEL, threads = 1):
 	
 	if filename is None or filename == '-':
 		if 'w' in mode:
 			fh = sys.stdout
 		else:
 			fh = sys.stdin
+		if 'b' in mode:
+			fh = fh.buffer
 	elif filename.endswith('.gz'):
-		fh = gzip.open(filename, mode, 9)
+		if 'w' in mode and threads != 1:
+			fh = GzipBlockWriter(filename, level, threads)
+			if 'b' not in mode:
+				fh = io.TextIOWrapper(fh)
+		else:
+			fh = gzip.open(filename, mode, level)
 	else:
 		fh = open(filename, mode)
 	
 	try:
 		yield fh
 	finally:
-		if fh is not sys.stdout and fh is not sys.stdin:
+		if fh not in (sys.stdout, sys.stdin, sys.stdout.buffer, sys.stdin.buffer):
 			fh.close()
 
+##############################################################################
+# pigz 風の並列 gzip 出力
+# BLOCK_SIZE 毎に独立した gzip member として worker thread で圧縮し，入力順に連結する
+# multi member の .gz は gzip.open / gunzip でそのまま読める
+# zlib は圧縮中 GIL を解放するので thread で並列化できる
+
+class GzipBlockWriter(io.BufferedIOBase):
+	
+	BLOCK_SIZE = 1 << 20
+	
+	def __init__(self, filename, level = GZIP_LEVEL, threads = 0):
+		self.Level		= level
+		self.Threads	= threads or os.cpu_count() or 1
+		self.Buf		= bytearray()
+		self.Pending	= collections.deque()
+		self.FileOut	= open(filename, 'wb')
+		
+		import concurrent.futures
+		self.Executor	= concurrent.futures.ThreadPoolExecutor(max_workers = self.Threads)
+	
+	def writable(self):
+		return True
+	
+	def write(self, Data):
+		if self.closed:
+			raise ValueError('write to closed file')
+		
+		self.Buf += Data
+		while len(self.Buf) >= self.BLOCK_SIZE:
+			self.Submit(bytes(self.Buf[:self.BLOCK_SIZE]))
+			del self.Buf[:self.BLOCK_SIZE]
+		
+		return len(Data)
+	
+	def Submit(self, Block):
+		self.Pending.append(self.Executor.submit(gzip.compress, Block, self.Level))
+		
+		# 圧縮待ちの block 数を制限してメモリを一定に保つ
+		while len(self.Pending) > self.Threads * 2:
+			self.FileOut.write(self.Pending.popleft().result())
+	
+	def close(self):
+		if self.closed:
+			return
+		
+		try:
+			if self.Buf or not self.Pending:
+				self.Submit(bytes(self.Buf))
+				self.Buf.clear()
+			
+			while self.Pending:
+				self.FileOut.write(self.Pending.popleft().result())
+		finally:
+			self.Executor.shutdown()
+			self.FileOut.close()
+			super().close()
+
+##############################################################################
+# 時刻変換
+# 内部の時刻は UTC epoch [ms] の int で保持する
+
+_Epoch = datetime.datetime(1970, 1, 1, tzinfo = datetime.timezone.utc)
+
+# timestamp() は μs を 10^6 で割って丸めた float なので，秒は floor() で正確に求まる．
+# ms は float を 1000倍せずに microsecond から求める (.123 が .122 にならないように)
+def DateTime2Time(DateTime):
+	# naive な datetime は UTC とみなす
+	if DateTime.tzinfo is None:
+		DateTime = DateTime.replace(tzinfo = datetime.timezone.utc)
+	return floor(DateTime.timestamp()) * 1000 + DateTime.microsecond // 1000
+
+def Time2DateTime(Time):
+	return _Epoch + datetime.timedelta(milliseconds = Time)
+
+def Hour2Time(Year, Month, Day, Hour):
+	global _HourCache
+	
+	# 連続する点はほぼ同じ時間帯なので，直前の日時 → epoch を cache する
+	Key = (Year, Month, Day, Hour)
+	if _HourCache[0] != Key:
+		_HourCache = (Key, DateTime2Time(datetime.datetime(
+			Year, Month, Day, Hour, tzinfo = datetime.timezone.utc
+		)))
+	return _HourCache[1]
+
+_HourCache = (None, 0)
+
+# datetime.fromisoformat() は C 実装で，文字列を slice して int() する方が遅いので
+# parse は cache しない．点毎に呼ばれるので DateTime2Time() を展開している
+def Iso2Time(Str):
+	DateTime = datetime.datetime.fromisoformat(Str.replace('Z', '+00:00'))
+	if DateTime.tzinfo is None:
+		DateTime = DateTime.replace(tzinfo = datetime.timezone.utc)
+	return floor(DateTime.timestamp()) * 1000 + DateTime.microsecond // 1000
+
+def Time2Iso(Time):
+	global _IsoFormatCache
+	
+	# 'YYYY-MM-DDTHH:' は時間が変わった時だけ生成する
+	Hour, Ms = divmod(Time, 3600000)
+	if _IsoFormatCache[0] != Hour:
+		_IsoFormatCache = (Hour, Time2DateTime(Hour * 3600000).strftime('%Y-%m-%dT%H:'))
+	
+	return '%s%02d:%02d.%03d+00:00' % (_IsoFormatCache[1], Ms // 60000, Ms // 1000 % 60, Ms % 1000)
+
+_IsoFormatCache = (None, '')
+
 ##############################################################################
 
 class PointClass:
@@ -56,33 +236,435 @@ class PointClass:
 			self.Altitude if self.Altitude is not None else -1,
 		)
 
+##############################################################################
+# GpsLogClass.Points の互換 view
+# アクセスされた時だけ PointClass を生成する
+
+class PointListClass(collections.abc.Sequence):
+	
+	def __init__(self, GpsLog):
+		self.GpsLog = GpsLog
+	
+	def __len__(self):
+		return len(self.GpsLog)
+	
+	def __getitem__(self, Index):
+		if isinstance(Index, slice):
+			return [self.GpsLog.GetPoint(i) for i in range(*Index.indices(len(self)))]
+		return self.GpsLog.GetPoint(Index)
+	
+	def __repr__(self):
+		return repr(list(self))
+
 ##############################################################################
 
 class GpsxException(Exception):
 	pass
 
+# 入力に点が無い
+class GpsxNoInputException(GpsxException):
+	pass
+
+# ProgressClass.Cancel() による中断
+class GpsxCancelException(GpsxException):
+	pass
+
+##############################################################################
+# format registry
+# format 名 → reader / writer と対応機能．reader / writer は 'module:関数名' か GpsLogClass の
+# method 名で指定し，最初に使う時に解決する (module はその時に import する)．
+# 組み込みの format も format 毎の module (gpsx_nmea 等) にあり，使う format の module だけを import する．
+# reader は Func(GpsLog, file, Range = None) で chunk 毎に yield する generator，
+# writer は Func(GpsLog, file)．
+# 外部 package は entry point group 'gpsx.formats' に FormatClass (またはそれを返す関数) を
+# 登録できる．entry point は登録されていない format が指定された時に初めて load する．
+
+FORMAT_ENTRY_POINT = 'gpsx.formats'
+
+class FormatClass:
+	
+	def __init__(
+		self, Name, Reader = None, Writer = None, Ext = None, OutputExt = None,
+		Stream = False, Append = False, Trailer = None
+	):
+		self.Name		= Name
+		self.Reader		= Reader	# None: 入力不可
+		self.Writer		= Writer	# None: 出力不可
+		self.Ext		= (Name.lower(),) if Ext is None else Ext		# 入力ファイルの拡張子 (小文字)
+		self.OutputExt	= Name if OutputExt is None else OutputExt	# 出力ファイルの拡張子 ('': 付けない)
+		self.Stream		= Stream	# 全点を読まずに chunk 毎に出力できる
+		self.Append		= Append	# 出力済みのファイルに追記できる
+		self.Trailer	= Trailer	# 追記前に消す末尾
+	
+	# GpsLog の reader / writer (None: 非対応)
+	def GetReader(self, GpsLog):
+		return self.Bind(GpsLog, self.Reader)
+	
+	def GetWriter(self, GpsLog):
+		return self.Bind(GpsLog, self.Writer)
+	
+	@staticmethod
+	def Bind(GpsLog, Func):
+		if Func is None:
+			return None
+		
+		if isinstance(Func, str):
+			if ':' not in Func:
+				return getattr(GpsLog, Func)
+			
+			(Module, Name) = Func.split(':', 1)
+			Func = importlib.import_module(Module)
+			for Attr in Name.split('.'):
+				Func = getattr(Func, Attr)
+		
+		return lambda *Args: Func(GpsLog, *Args)
+
+class FormatRegistryClass:
+	
+	def __init__(self):
+		self.Formats		= {}
+		self.EntryPoints	= None	# load していない entry point (None: 未検索)
+	
+	def Register(self, Format):
+		self.Formats[Format.Name] = Format
+		return Format
+	
+	# Name の FormatClass (無ければ None)
+	def Get(self, Name):
+		if Name not in self.Formats:
+			self.LoadPlugin(Name)
+		return self.Formats.get(Name)
+	
+	# 入力ファイルの拡張子 Ext の FormatClass (無ければ None)
+	# 無ければ拡張子と同名の entry point，全ての entry point の順に load して探す
+	def FromExt(self, Ext):
+		Format = self.FindExt(Ext)
+		if Format is None:
+			self.LoadPlugin(Ext)
+			Format = self.FindExt(Ext)
+		if Format is None:
+			self.LoadPlugin()
+			Format = self.FindExt(Ext)
+		return Format
+	
+	def FindExt(self, Ext):
+		return next((Format for Format in self.Formats.values() if Ext in Format.Ext), None)
+	
+	def List(self):
+		self.LoadPlugin()
+		return list(self.Formats.values())
+	
+	# entry point の format を load する (Name: その format だけ)
+	def LoadPlugin(self, Name = None):
+		if self.EntryPoints is None:
+			self.EntryPoints = {}
+			
+			try:
+				from importlib.metadata import entry_points
+			except ImportError:
+				return
+			
+			try:
+				EntryPoints = entry_points(group = FORMAT_ENTRY_POINT)
+			except TypeError:	# python < 3.10
+				EntryPoints = entry_points().get(FORMAT_ENTRY_POINT, ())
+			
+			for EntryPoint in EntryPoints:
+				self.EntryPoints.setdefault(EntryPoint.name, EntryPoint)
+		
+		for Key in list(self.EntryPoints) if Name is None else (Name,):
+			EntryPoint = self.EntryPoints.pop(Key, None)
+			if EntryPoint is None or Key in self.Formats:
+				continue
+			
+			# 壊れた plugin があっても他の format は使えるようにする
+			try:
+				# FormatClass を継承していない object も使えるよう，isinstance() でなく
+				# GetReader の有無で判定する
+				Format = EntryPoint.load()
+				if not hasattr(Format, 'GetReader'):
+					Format = Format()
+				if Format is not None:
+					self.Formats.setdefault(Format.Name, Format)
+			except Exception as Error:
+				print('Cannot load format plugin %s: %s' % (EntryPoint.value, Error), file = sys.stderr)
+
+FormatRegistry = FormatRegistryClass()
+
+def RegisterFormat(Name, Reader = None, Writer = None, **KwArgs):
+	return FormatRegistry.Register(FormatClass(Name, Reader, Writer, **KwArgs))
+
+RegisterFormat('nmea',			'gpsx_nmea:Read',		'gpsx_nmea:Write',			Stream = True, Append = True)
+RegisterFormat('gpx',			'gpsx_gpx:Read',		'gpsx_gpx:Write',			Stream = True, Append = True, Trailer = b'</trkseg></trk></gpx>\n')
+RegisterFormat('kml',			'gpsx_kml:Read',		'gpsx_kml:Write')
+RegisterFormat('kmltrack',		'gpsx_kml:Read',		'gpsx_kml:WriteTrack',		OutputExt = 'kml')
+RegisterFormat('log',			'gpsx_vsd:Read')
+RegisterFormat('vsd',			'gpsx_vsd:Read')
+RegisterFormat('RaceChrono',	'gpsx_racechrono:Read',	'gpsx_racechrono:Write',	Ext = (), OutputExt = '', Append = True)
+RegisterFormat('dbg',			None,					'gpsx_debug:Write')
+RegisterFormat('json',			'gpsx_takeout:Read')
+RegisterFormat('gpsx',			'gpsx_native:Read',		'gpsx_native:Write')
+
 ##############################################################################
 
 class GpsLogClass:
 	
+	# Flag: 値の有無 bitmask
+	HAS_ALTITUDE	= 1 << 0
+	HAS_SPEED		= 1 << 1
+	HAS_BEARING		= 1 << 2
+	HAS_DISTANCE	= 1 << 3
+	
+	# x, y 以外の channel
+	Channels = ('Time', 'Longitude', 'Latitude', 'Altitude', 'Speed', 'Bearing', 'Distance', 'Flag')
+	
+	# streaming 時の 1 chunk の点数
+	CHUNK_SIZE = 4096
+	
+	# 以下の設定・状態の初期値は class 属性とし，変更した instance だけが属性を持つ
+	# (GpsLogClass() は cursor 等で多数生成するので，__init__() では点の格納領域だけを作る)
+	
+	# streaming 状態
+	Source		= None	# chunk を生成する reader (None: 全点読み込み済み)
+	ChunkSize	= 0		# 0: streaming しない
+	Lookback	= 0		# 先頭の出力済みの点数
+	Trimmed		= 0		# Trim() で捨てた点数
+	
+	# .gz 出力の圧縮レベルと圧縮 thread 数 (1: gzip.open, 0: CPU 数)
+	GzipLevel	= GZIP_LEVEL
+	GzipThreads	= 1
+	
+	# 出力を追記で open する (WriteAppend() 中)
+	Appending	= False
+	
+	# 入力の parse 結果 cache (gpsx_cache.ParseCacheClass，None: 使用しない)
+	Cache		= None
+	
+	# 読み込む時刻範囲 [ms] (None: 制限なし) と時刻 index の間隔 [s] (0: index を使用しない)
+	StartTime	= None
+	EndTime		= None
+	TimeIndex	= 0
+	
+	# 処理段階毎の計測 (gpsx_profile.ProfileClass，None: 計測しない)
+	Profile		= None
+	
+	# 計時線の通過検出 (gpsx_lap.LapTimerClass，None: 検出しない)
+	LapTimer	= None
+	
+	# 進捗の通知と中断 (ProgressClass，None: 通知しない)
+	Progress	= None
+	
 	def __init__(self):
-		self.Points = []
+		self.Clear()
+	
+	##########################################################################
+	# Point 格納領域
+	# 1点毎の object は作らず，channel 毎の array に格納する
+	
+	def Clear(self):
+		self.Time		= array('q')	# UTC epoch [ms]
+		self.Longitude	= array('d')
+		self.Latitude	= array('d')
+		self.Altitude	= array('d')
+		self.Speed		= array('d')
+		self.Bearing	= array('d')
+		self.Distance	= array('d')
+		self.x			= array('d')	# GenXY() が生成
+		self.y			= array('d')
+		self.Flag		= array('B')	# HAS_* の bitmask
 		
 		self.NoAltitude	= 0
 		self.NoSpeed	= 0
 		self.NoBearing	= 0
 		self.NoDistance	= 0
+	
+	def __len__(self):
+		return len(self.Time)
+	
+	@property
+	def Points(self):
+		return PointListClass(self)
+	
+	def GetPoint(self, i):
+		if i < 0:
+			i += len(self)
 		
-		self.FuncTbl = {
-			'nmea':			(self.Read_nmea,			self.Write_nmea),
-			'gpx':			(self.Read_gpx,				self.Write_gpx),
-			'kml':			(self.Read_kml,				self.Write_kml),
-			'log':			(self.Read_vsd,				None),
-			'vsd':			(self.Read_vsd,				None),
-			'RaceChrono':	(self.Read_RaceChrono,		self.Write_RaceChrono),
-			'dbg':			(None,						self.Write_debug),
-			'json':			(self.Read_GoogleTimeline,	None),
-		}
+		Point = PointClass()
+		Flag = self.Flag[i]
+		
+		Point.DateTime	= Time2DateTime(self.Time[i])
+		Point.Longitude	= self.Longitude[i]
+		Point.Latitude	= self.Latitude[i]
+		if Flag & self.HAS_ALTITUDE:	Point.Altitude	= self.Altitude[i]
+		if Flag & self.HAS_SPEED:		Point.Speed		= self.Speed[i]
+		if Flag & self.HAS_BEARING:		Point.Bearing	= self.Bearing[i]
+		if Flag & self.HAS_DISTANCE:	Point.Distance	= self.Distance[i]
+		if i < len(self.x):
+			Point.x = self.x[i]
+			Point.y = self.y[i]
+		
+		return Point
+	
+	# Index に含まれる点だけを残す
+	def Compress(self, Index):
+		XYValid = len(self.x) == len(self)
+		
+		for Name in self.Channels:
+			Col = getattr(self, Name)
+			setattr(self, Name, array(Col.typecode, map(Col.__getitem__, Index)))
+		
+		if XYValid:
+			self.x = array('d', map(self.x.__getitem__, Index))
+			self.y = array('d', map(self.y.__getitem__, Index))
+		else:
+			self.x = array('d')
+			self.y = array('d')
+	
+	##########################################################################
+	# streaming
+	# reader は CHUNK_SIZE 点毎に yield する generator で，writer は Chunks() で
+	# 得た chunk を順に出力する．出力後の点は Trim() で捨てるが，派生データ生成の
+	# ため最後の 1点 (Lookback) は残す．
+	
+	def ChunkFull(self):
+		return self.ChunkSize and len(self.Time) - self.Lookback >= self.ChunkSize
+	
+	# 出力済みの点を捨てる
+	def Trim(self):
+		XYValid = len(self.x) == len(self)
+		self.Trimmed += len(self) - 1
+		
+		for Name in self.Channels:
+			del getattr(self, Name)[:-1]
+		
+		if XYValid:
+			del self.x[:-1]
+			del self.y[:-1]
+		else:
+			self.x = array('d')
+			self.y = array('d')
+		
+		self.Lookback = 1
+	
+	# 複数の入力を順に読む chunk source
+	def StreamSource(self, Files, Format):
+		for File in Files:
+			yield from self.Reader(File, Format)
+			if self.Trimmed + len(self) == 0:
+				raise GpsxNoInputException('No input read: %s' % (File,))
+	
+	# 複数の入力を時刻順に merge して読む
+	# 入力毎に 1 chunk ずつ読む GpsLogClass を cursor とし，heap で時刻順に取り出す．
+	# 使用 memory は入力数 × CHUNK_SIZE 点程度．各入力の中の点は時刻順であること．
+	# Dedup: 同じ時刻の点を first: 最初の入力の点だけ残す，last: 最後の入力の点だけ残す，none: 全て残す
+	
+	DEDUP = ('first', 'last', 'none')
+	
+	def MergeSource(self, Files, Format, Dedup = 'first'):
+		if Dedup not in self.DEDUP:
+			raise GpsxException('Unknown dedup mode: %s' % (Dedup,))
+		
+		Out			= []
+		PrevTime	= None
+		
+		for Row in heapq.merge(*[self.MergeRows(File, Format) for File in Files], key = operator.itemgetter(0)):
+			if Row[0] == PrevTime and Dedup != 'none':
+				if Dedup == 'last':
+					Out[-1] = Row
+				continue
+			PrevTime = Row[0]
+			
+			# last で置き換えられるよう，最後の点は残して追加する
+			Out.append(Row)
+			if len(Out) > self.CHUNK_SIZE:
+				self.AppendRows(Out[:-1])
+				del Out[:-1]
+				if self.ChunkFull(): yield
+		
+		self.AppendRows(Out)
+		yield
+	
+	# File を読み，点を (Time, Longitude, Latitude, ...) の順に返す
+	def MergeRows(self, File, Format):
+		Cursor = GpsLogClass()
+		for Name in ('Cache', 'StartTime', 'EndTime', 'TimeIndex', 'Profile'):
+			setattr(Cursor, Name, getattr(self, Name))
+		Cursor.ChunkSize = self.CHUNK_SIZE
+		
+		for _ in Cursor.Reader(File, Format):
+			self.NoAltitude	|= Cursor.NoAltitude
+			self.NoSpeed	|= Cursor.NoSpeed
+			self.NoBearing	|= Cursor.NoBearing
+			self.NoDistance	|= Cursor.NoDistance
+			
+			Rows = list(zip(*[getattr(Cursor, Name) for Name in self.Channels]))
+			
+			# 返した点は捨てる
+			Cursor.Trimmed += len(Cursor)
+			for Name in self.Channels:
+				del getattr(Cursor, Name)[:]
+			del Cursor.x[:]
+			del Cursor.y[:]
+			
+			yield from Rows
+		
+		# 時刻範囲の指定時は，範囲内の点が無い入力があってもよい
+		if Cursor.Trimmed == 0 and self.StartTime is None and self.EndTime is None:
+			raise GpsxNoInputException('No input read: %s' % (File,))
+	
+	def AppendRows(self, Rows):
+		for Name, Col in zip(self.Channels, zip(*Rows)):
+			getattr(self, Name).extend(Col)
+	
+	def ReadMerge(self, Files, Format, Dedup = 'first'):
+		for _ in self.LapSource(self.MergeSource(Files, Format, Dedup)):
+			pass
+		
+		if len(self) == 0:
+			raise GpsxNoInputException('No input read: %s' % (', '.join(Files),))
+	
+	def OpenStream(self, Files, Format, Dedup = None):
+		self.ChunkSize = self.CHUNK_SIZE
+		if Dedup and len(Files) > 1:
+			Source = self.MergeSource(Files, Format, Dedup)
+		else:
+			Source = self.StreamSource(Files, Format)
+		Source = self.LapSource(Source)
+		
+		# 入力エラーを出力 open 前に検出するため，先頭 chunk を先読みする
+		for _ in Source:
+			if len(self) > 0:
+				break
+		self.Source = itertools.chain((None,), Source)
+	
+	# Source の chunk 毎に，追加された点の計時線の通過を LapTimer で検出する
+	def LapSource(self, Source):
+		if self.LapTimer is None:
+			yield from Source
+			return
+		
+		Done = self.Trimmed + len(self)
+		for _ in Source:
+			with self.Profile.Stage('derive') if self.Profile else contextlib.nullcontext():
+				self.LapTimer.Feed(self, Done - self.Trimmed)
+			Done = self.Trimmed + len(self)
+			yield
+	
+	# writer 用 chunk iterator
+	# 各 chunk の出力対象は Lookback ～ len - 1 の点
+	def Chunks(self):
+		if self.Source is None:
+			yield
+			return
+		
+		for _ in self.Source:
+			# 先頭 chunk は GenBearing() の先読み用に 2点以上にする
+			if len(self) > max(self.Lookback, 1):
+				yield
+				self.Trim()
+		
+		if len(self) > self.Lookback:
+			yield
 	
 	##########################################################################
 	
@@ -97,641 +679,824 @@ class GpsLogClass:
 	def deg2rad(self, deg):
 		return deg * self._ToRad
 	
+	# 未生成の点の x, y を生成
+	# numpy があれば一括演算，無ければ (Pydroid 等) pure python で計算する．
+	# 両者の差は sin / cos / pow の丸め誤差のみで，x, y の相対誤差は 1e-12 以下
 	def GenXY(self):
-		if len(self.Points) == 0 or self.Points[0].x is not None:
+		Start = len(self.x)
+		if Start >= len(self):
 			return
 		
-		self.Points[0].x = 0
-		self.Points[0].y = 0
+		if Start == 0:
+			self.x.append(0)
+			self.y.append(0)
+			Start = 1
 		
-		for i in range(1, len(self.Points)):
-			_dy = self.deg2rad(self.Points[i].Latitude - self.Points[i - 1].Latitude)
-			_dx = self.deg2rad(self.Points[i].Longitude - self.Points[i - 1].Longitude)
-			_My = self.deg2rad((self.Points[i].Latitude + self.Points[i - 1].Latitude) / 2)
-			_W = sqrt(1 - self._e2 * sin(_My) ** 2)
+		if numpy:
+			Lat = numpy.frombuffer(self.Latitude)[Start - 1:]
+			Lng = numpy.frombuffer(self.Longitude)[Start - 1:]
+			
+			_dy = (Lat[1:] - Lat[:-1]) * self._ToRad
+			_dx = (Lng[1:] - Lng[:-1]) * self._ToRad
+			_My = (Lat[1:] + Lat[:-1]) / 2 * self._ToRad
+			_W = numpy.sqrt(1 - self._e2 * numpy.sin(_My) ** 2)
 			_M = self._Mnum / _W ** 3
 			_N = self._a / _W
 			
-			self.Points[i].x = self.Points[i - 1].x + _dx * _N * cos(_My)
-			self.Points[i].y = self.Points[i - 1].y + _dy * _M
+			# 逐次加算と同じ順序で積算するため，先頭に前回値を置いて cumsum する
+			x = numpy.cumsum(numpy.concatenate(((self.x[-1],), _dx * _N * numpy.cos(_My))))
+			y = numpy.cumsum(numpy.concatenate(((self.y[-1],), _dy * _M)))
+			self.x.frombytes(x[1:].tobytes())
+			self.y.frombytes(y[1:].tobytes())
+			return
+		
+		ToRad	= self._ToRad
+		e2		= self._e2
+		a		= self._a
+		Mnum	= self._Mnum
+		Lat		= self.Latitude
+		Lng		= self.Longitude
+		x		= self.x[-1]
+		y		= self.y[-1]
+		xAppend	= self.x.append
+		yAppend	= self.y.append
+		
+		for Lat0, Lat1, Lng0, Lng1 in zip(Lat[Start - 1:-1], Lat[Start:], Lng[Start - 1:-1], Lng[Start:]):
+			_My = (Lat1 + Lat0) / 2 * ToRad
+			_W = sqrt(1 - e2 * sin(_My) ** 2)
+			
+			x += (Lng1 - Lng0) * ToRad * (a / _W) * cos(_My)
+			y += (Lat1 - Lat0) * ToRad * (Mnum / _W ** 3)
+			xAppend(x)
+			yAppend(y)
 	
-	def Distance(self, p1, p2):
+	def CalcDistance(self, p1, p2):
 		return sqrt(
-			(self.Points[p2].x - self.Points[p1].x) ** 2 +
-			(self.Points[p2].y - self.Points[p1].y) ** 2
+			(self.x[p2] - self.x[p1]) ** 2 +
+			(self.y[p2] - self.y[p1]) ** 2
 		)
 	
-	def Bearing(self, p1, p2):
-		deg = atan2(self.Points[p2].x - self.Points[p1].x, self.Points[p2].y - self.Points[p1].y) / self._ToRad
+	def CalcBearing(self, p1, p2):
+		deg = atan2(self.x[p2] - self.x[p1], self.y[p2] - self.y[p1]) / self._ToRad
 		return deg if deg >= 0 else deg + 360
 	
+	# 点 i - 1 → i の区間距離 (i = 1 ～ len - 1)
+	def SegmentDistance(self):
+		self.GenXY()
+		
+		if numpy:
+			x = numpy.frombuffer(self.x)
+			y = numpy.frombuffer(self.y)
+			return numpy.sqrt((x[1:] - x[:-1]) ** 2 + (y[1:] - y[:-1]) ** 2)
+		
+		x = self.x
+		y = self.y
+		return [
+			sqrt((x1 - x0) ** 2 + (y1 - y0) ** 2)
+			for x0, x1, y0, y1 in zip(x, x[1:], y, y[1:])
+		]
+	
+	# 点 i - 1 → i の区間方位 [度] (i = 1 ～ len - 1)
+	def SegmentBearing(self):
+		self.GenXY()
+		
+		if numpy:
+			x = numpy.frombuffer(self.x)
+			y = numpy.frombuffer(self.y)
+			deg = numpy.arctan2(x[1:] - x[:-1], y[1:] - y[:-1]) / self._ToRad
+			deg[deg < 0] += 360
+			return deg
+		
+		ToRad	= self._ToRad
+		x		= self.x
+		y		= self.y
+		return [
+			deg if deg >= 0 else deg + 360
+			for deg in (
+				atan2(x1 - x0, y1 - y0) / ToRad
+				for x0, x1, y0, y1 in zip(x, x[1:], y, y[1:])
+			)
+		]
+	
 	##########################################################################
 	# Point 追加
-	def Append(self, Point):
+	def AppendPoint(self, Time, Longitude, Latitude, Altitude = None, Speed = None, Bearing = None, Distance = None):
 		
-		if Point.DateTime is None or Point.Longitude is None or Point.Latitude is None:
+		if Time is None or Longitude is None or Latitude is None:
 			return
 		
-		if Point.Speed    is None: self.NoSpeed    |= 1
-		if Point.Altitude is None: self.NoAltitude |= 1
-		if Point.Bearing  is None: self.NoBearing  |= 1
-		if Point.Distance is None: self.NoDistance |= 1
+		Flag = 0
+		if Altitude is None:	self.NoAltitude |= 1; Altitude = 0
+		else:					Flag |= self.HAS_ALTITUDE
+		if Speed is None:		self.NoSpeed    |= 1; Speed = 0
+		else:					Flag |= self.HAS_SPEED
+		if Bearing is None:		self.NoBearing  |= 1; Bearing = 0
+		else:					Flag |= self.HAS_BEARING
+		if Distance is None:	self.NoDistance |= 1; Distance = 0
+		else:					Flag |= self.HAS_DISTANCE
+		
+		self.Time.append(Time)
+		self.Longitude.append(Longitude)
+		self.Latitude.append(Latitude)
+		self.Altitude.append(Altitude)
+		self.Speed.append(Speed)
+		self.Bearing.append(Bearing)
+		self.Distance.append(Distance)
+		self.Flag.append(Flag)
+	
+	# 複数点を numpy 配列で一括追加する
+	# 値の無い channel は 0 を入れ，Flag で区別する
+	def AppendPoints(self, Time, Longitude, Latitude, Altitude, Speed, Bearing, Distance, Flag):
+		Flag = numpy.asarray(Flag, numpy.uint8)
+		
+		self.Time.frombytes(numpy.asarray(Time, numpy.int64).tobytes())
+		for Name, Value in (
+			('Longitude', Longitude), ('Latitude', Latitude), ('Altitude', Altitude),
+			('Speed', Speed), ('Bearing', Bearing), ('Distance', Distance)
+		):
+			getattr(self, Name).frombytes(numpy.asarray(Value, numpy.float64).tobytes())
+		self.Flag.frombytes(Flag.tobytes())
 		
-		self.Points.append(Point)
+		Missing = ~numpy.bitwise_and.reduce(Flag) if len(Flag) else 0
+		if Missing & self.HAS_ALTITUDE:	self.NoAltitude	|= 1
+		if Missing & self.HAS_SPEED:	self.NoSpeed	|= 1
+		if Missing & self.HAS_BEARING:	self.NoBearing	|= 1
+		if Missing & self.HAS_DISTANCE:	self.NoDistance	|= 1
+	
+	# PointClass 版 (互換用)
+	def Append(self, Point):
+		
+		if Point.DateTime is None:
+			return
+		
+		self.AppendPoint(
+			DateTime2Time(Point.DateTime), Point.Longitude, Point.Latitude,
+			Point.Altitude, Point.Speed, Point.Bearing, Point.Distance
+		)
 	
 	##########################################################################
 	# 欠落データ生成
+	# force でなければ，値の無い点だけを埋める
 	
 	def GenSpeed(self, force = False):
-		if len(self.Points) == 0 or not (force or self.NoSpeed): return
+		if len(self) == 0 or not (force or self.NoSpeed): return
 		
-		self.GenXY();
-		if force or self.Points[0].Speed is None:
-			self.Points[0].Speed = 0
+		Dist = self.SegmentDistance()
+		Flag = self.Flag
 		
-		for i in range(1, len(self.Points)):
-			if force or self.Points[i].Speed is None:
-				self.Points[i].Speed = self.Distance(i - 1, i) / (
-					self.Points[i].DateTime.timestamp() - self.Points[i - 1].DateTime.timestamp()
-				) * (3600 / 1000)
+		if force or not Flag[0] & self.HAS_SPEED:
+			self.Speed[0] = 0
+			Flag[0] |= self.HAS_SPEED
+		
+		# 時刻が同じ点の速度は 0 とする
+		if numpy:
+			Time	= numpy.frombuffer(self.Time, dtype = numpy.int64)
+			Speed	= numpy.frombuffer(self.Speed)[1:]
+			Flag	= numpy.frombuffer(self.Flag, dtype = numpy.uint8)[1:]
+			
+			dt = (Time[1:] - Time[:-1]) / 1000
+			with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+				Value = numpy.where(dt != 0, Dist / dt * (3600 / 1000), 0)
+			
+			if force:
+				Speed[:] = Value
+			else:
+				Target = (Flag & self.HAS_SPEED) == 0
+				Speed[Target] = Value[Target]
+			Flag |= self.HAS_SPEED
+			return
+		
+		Time	= self.Time
+		Speed	= self.Speed
+		HAS		= self.HAS_SPEED
+		
+		for i in range(1, len(self)):
+			if force or not Flag[i] & HAS:
+				dt = (Time[i] - Time[i - 1]) / 1000
+				Speed[i] = Dist[i - 1] / dt * (3600 / 1000) if dt else 0
+				Flag[i] |= HAS
 	
 	def GenBearing(self, force = False):
-		if len(self.Points) == 0 or not (force or self.NoBearing): return
+		if len(self) == 0 or not (force or self.NoBearing): return
 		
-		self.GenXY();
+		Value	= self.SegmentBearing()
+		Bearing	= self.Bearing
+		Flag	= self.Flag
 		
-		for i in range(1, len(self.Points)):
-			if force or self.Points[i].Bearing is None:
-				self.Points[i].Bearing = self.Bearing(i - 1, i)
+		if numpy:
+			BearingN	= numpy.frombuffer(Bearing)[1:]
+			FlagN		= numpy.frombuffer(Flag, dtype = numpy.uint8)[1:]
+			
+			if force:
+				BearingN[:] = Value
+			else:
+				Target = (FlagN & self.HAS_BEARING) == 0
+				BearingN[Target] = Value[Target]
+			FlagN |= self.HAS_BEARING
+		else:
+			HAS = self.HAS_BEARING
+			for i in range(1, len(self)):
+				if force or not Flag[i] & HAS:
+					Bearing[i] = Value[i - 1]
+					Flag[i] |= HAS
 		
-		if force or self.Points[0].Bearing is None:
-			self.Points[0].Bearing = self.Points[1].Bearing
+		# 1点だけなら方位は無いので 0 (GenSpeed() の先頭の点と同じ)
+		if force or not Flag[0] & self.HAS_BEARING:
+			Bearing[0] = Bearing[1] if len(self) > 1 else 0
+			Flag[0] |= self.HAS_BEARING
 	
 	def GenDistance(self, force = False):
-		if len(self.Points) == 0 or not (force or self.NoDistance): return
+		if len(self) == 0 or not (force or self.NoDistance): return
+		
+		Dist = self.SegmentDistance()
+		
+		# Lookback の点は出力済みなので，その距離から積算する
+		Start = self.Distance[0] if self.Lookback else 0.0
+		
+		if numpy:
+			# 逐次加算と同じ順序で積算するため，先頭に開始値を置いて cumsum する
+			numpy.frombuffer(self.Distance)[:] = numpy.cumsum(numpy.concatenate(((Start,), Dist)))
+			numpy.frombuffer(self.Flag, dtype = numpy.uint8)[:] |= self.HAS_DISTANCE
+			return
+		
+		Distance	= self.Distance
+		Flag		= self.Flag
 		
-		self.GenXY();
-		self.Points[0].Distance = 0
+		Distance[0] = Start
+		Flag[0] |= self.HAS_DISTANCE
 		
-		for i in range(1, len(self.Points)):
-			self.Points[i].Distance = self.Points[i - 1].Distance + self.Distance(i - 1, i)
+		for i in range(1, len(self)):
+			Distance[i] = Distance[i - 1] + Dist[i - 1]
+			Flag[i] |= self.HAS_DISTANCE
 	
 	def GenAltitude(self, force = False):
-		if len(self.Points) == 0 or not (force or self.NoAltitude): return
+		if len(self) == 0 or not (force or self.NoAltitude): return
 		
-		if force or self.Points[0].Altitude is None:
-			self.Points[0].Altitude = 0
+		Altitude	= self.Altitude
+		Flag		= self.Flag
 		
-		for i in range(1, len(self.Points)):
-			self.Points[i].Altitude = self.Points[i - 1].Altitude
+		if force or not Flag[0] & self.HAS_ALTITUDE:
+			Altitude[0] = 0
+			Flag[0] |= self.HAS_ALTITUDE
+		
+		for i in range(1, len(self)):
+			Altitude[i] = Altitude[i - 1]
+			Flag[i] |= self.HAS_ALTITUDE
 	
 	##########################################################################
 	# reader / writer auto detect
 	
-	def GetFormat(self, file, format):
-		if not format and file is not None and file != '-':
+	# format registry (FormatRegistry) に登録された format 名を返す
+	@classmethod
+	def GetFormat(cls, file, format):
+		Format = None
+		if format:
+			Format = FormatRegistry.Get(format)
+		elif file is not None and file != '-':
 			(file2, ext) = os.path.splitext(file)
 			if ext == '.gz':
 				(file2, ext) = os.path.splitext(file2)
 			
 			if len(ext) >= 2:
 				format = ext[1:].lower()
-				
-		if format in self.FuncTbl:
-			return format
+				Format = FormatRegistry.FromExt(format)
+		
+		if Format:
+			return Format.Name
 		
 		raise GpsxException('Unknown format: %s format=%s' % (str(file), str(format)))
 	
-	def Read(self, file, format):
+	# chunk 毎に yield する reader の generator を返す
+	# Range (gpsx_index.TimeIndexClass.Range() の形式) があれば，その範囲だけを読む
+	def Reader(self, file, format, Range = None):
 		format = self.GetFormat(file, format)
+		Read = FormatRegistry.Get(format).GetReader(self)
 		
-		if format not in self.FuncTbl or self.FuncTbl[format][0] is None:
+		if Read is None:
 			raise GpsxException('Format %s input not available: %s ' % (str(format), str(file)))
 		
-		self.FuncTbl[format][0](file)
-		if len(self.Points) == 0:
-			raise GpsxException('No input read: %s' % (file,))
+		Reader = None
+		if Range is not None:
+			Reader = Read(file, Range)
+		elif self.StartTime is not None or self.EndTime is not None:
+			# 時刻 index で読む範囲を絞る．一部だけ読むので cache しない
+			if self.TimeIndex:
+				from gpsx_index import TimeIndexClass
+				if format in TimeIndexClass.Pattern:
+					Range = TimeIndexClass(file, format, self.TimeIndex).Range(self.StartTime, self.EndTime)
+					if Range:
+						Reader = Read(file, Range)
+		
+		if Reader is None:
+			if self.Cache and format != 'gpsx':
+				Reader = self.CachedReader(file, format)
+			else:
+				Reader = Read(file)
+		
+		if self.StartTime is not None or self.EndTime is not None:
+			Reader = self.WindowReader(Reader)
+		if self.Progress:
+			Reader = self.Progress.Reader(self, file, Reader)
+		if self.Profile:
+			Reader = self.Profile.Reader(self, file, Reader)
+		return Reader
+	
+	# StartTime ～ EndTime 外の点を捨てる
+	def WindowReader(self, Reader):
+		Done = self.Trimmed + len(self)
+		
+		for _ in Reader:
+			self.Window(Done - self.Trimmed)
+			Done = self.Trimmed + len(self)
+			yield
+	
+	# Start 点目以降の StartTime ～ EndTime 外の点を捨てる
+	def Window(self, Start):
+		Min = -inf if self.StartTime is None else self.StartTime
+		Max = inf if self.EndTime is None else self.EndTime
+		
+		if numpy:
+			Time = numpy.frombuffer(self.Time, numpy.int64)[Start:]
+			Keep = numpy.flatnonzero((Time >= Min) & (Time <= Max)).tolist()
+			del Time	# buffer を解放しないと array を縮められない
+		else:
+			Keep = [i for i, t in enumerate(self.Time[Start:]) if Min <= t <= Max]
+		
+		if len(Keep) == len(self) - Start:
+			return
+		
+		for Name in self.Channels:
+			Col = getattr(self, Name)
+			Tail = Col[Start:]
+			del Col[Start:]
+			Col.extend(map(Tail.__getitem__, Keep))
+		
+		del self.x[Start:]
+		del self.y[Start:]
+	
+	# cache があれば reader を使わずに cache を読み，無ければ reader が追加した点を
+	# 別の GpsLogClass に写して読み終わったら cache に格納する
+	def CachedReader(self, file, format):
+		import gpsx_native
+		
+		Key = self.Cache.Key(file, format)
+		
+		if Key is not None:
+			CacheFile = self.Cache.Lookup(Key)
+			if CacheFile:
+				try:
+					yield from gpsx_native.Read(self, CacheFile)
+					if self.Profile:
+						self.Profile.CacheHit(CacheFile)
+					return
+				except (GpsxException, OSError):
+					pass
+		
+		Copy = GpsLogClass()
+		Done = self.Trimmed + len(self)	# 写し終わった点数 (Trim() 前からの通し番号)
+		
+		for _ in FormatRegistry.Get(format).GetReader(self)(file):
+			if Key is not None:
+				Start = Done - self.Trimmed
+				for Name in self.Channels:
+					getattr(Copy, Name).extend(getattr(self, Name)[Start:])
+			yield
+			
+			# yield 中に WindowReader() が範囲外の点を消すので，写した後の点数は戻ってから数える
+			Done = self.Trimmed + len(self)
+		
+		if Key is not None and len(Copy):
+			self.Cache.Store(Key, Copy)
+	
+	def Read(self, file, format):
+		for _ in self.LapSource(self.Reader(file, format)):
+			pass
+		
+		if len(self) == 0:
+			raise GpsxNoInputException('No input read: %s' % (file,))
+	
+	def IsStreamable(self, file, format):
+		return FormatRegistry.Get(self.GetFormat(file, format)).Stream
 	
 	def Write(self, file, format):
 		format = self.GetFormat(file, format)
+		Write = FormatRegistry.Get(format).GetWriter(self)
 		
-		if self.FuncTbl[format][1] is None:
+		if Write is None:
 			raise GpsxException('Format %s output not available: %s ' % (str(format), str(file)))
 		
-		self.FuncTbl[format][1](file)
+		if self.Progress:
+			self.Progress.Update('write', File = file)
+			Written = self.Progress.Written
+		
+		if not self.Profile:
+			Write(file)
+		else:
+			with self.Profile.Stage('write') as Record:
+				Write(file)
+			Record['points']	+= self.Trimmed + len(self)
+			Record['bytes']		+= PathSize(file)
+		
+		# text writer は chunk 毎にも加算するので，ここで書いた点数に揃える
+		if self.Progress:
+			self.Progress.Written = Written + (len(self) - self.Lookback if self.Appending else self.Trimmed + len(self))
+			self.Progress.Update('write', True)
+	
+	# 出力済みの file に Lookback 以降の点を追記する．末尾の閉じ tag 等は消してから書き直す
+	def WriteAppend(self, file, format):
+		format = self.GetFormat(file, format)
+		Format = FormatRegistry.Get(format)
+		
+		if not Format.Append:
+			raise GpsxException('Format %s append not available: %s ' % (str(format), str(file)))
+		
+		Trailer = Format.Trailer
+		if Trailer:
+			with open(file, 'r+b') as FileOut:
+				FileOut.seek(0, io.SEEK_END)
+				Size = FileOut.tell()
+				FileOut.seek(max(Size - len(Trailer), 0))
+				if file.endswith('.gz') or FileOut.read() != Trailer:
+					raise GpsxException('Cannot append to %s' % (file,))
+				FileOut.truncate(Size - len(Trailer))
+		
+		self.Appending = True
+		try:
+			self.Write(file, format)
+		finally:
+			self.Appending = False
+	
+	# writer の出力先．計測時は write() の時間 (gzip 圧縮を含む) を io として計測する
+	def OpenOutput(self, FileName, Mode):
+		if self.Appending:
+			Mode = Mode.replace('w', 'a')
+		Output = smart_open(FileName, Mode, self.GzipLevel, self.GzipThreads)
+		if self.Progress:
+			Output = self.Progress.Output(Output)
+		return self.Profile.Output(Output) if self.Profile else Output
+	
+	# reader の入力．進捗の通知時は読んだ byte 数 (.gz は展開後) を数える
+	@contextlib.contextmanager
+	def OpenInput(self, FileName, Mode, Range = None):
+		if Range is None:
+			Input = smart_open(FileName, Mode)
+		else:
+			from gpsx_index import TimeIndexClass
+			Input = TimeIndexClass.Open(FileName, Mode, Range)
+		
+		with Input as FileIn:
+			yield self.Progress.Input(FileIn) if self.Progress else FileIn
+	
+	# 以後の処理の進捗を Progress に通知し，Progress.Cancel() で中断できるようにする
+	def StartProgress(self, Progress):
+		self.Progress = Progress
+		
+		for Name in ('GenXY', 'GenSpeed', 'GenBearing', 'GenDistance', 'GenAltitude', 'Resample'):
+			setattr(self, Name, Progress.Wrap('derive', getattr(self, Name)))
+		self.Reduce = Progress.Wrap('reduce', self.Reduce)
+		
+		return Progress
+	
+	# 以後の処理を gpsx_profile.ProfileClass で計測する
+	def StartProfile(self, Profile = None):
+		from gpsx_profile import ProfileClass
+		self.Profile = Profile or ProfileClass()
+		
+		# Gen* と間引きは instance の method を置き換えて計測する
+		# Gen* の点数は実際に生成する点だけ数える (生成不要で何もしない呼び出しは 0 点)
+		Points = {
+			'GenXY':		lambda GpsLog: len(GpsLog) - len(GpsLog.x),
+			'GenSpeed':		lambda GpsLog: len(GpsLog) if GpsLog.NoSpeed else 0,
+			'GenBearing':	lambda GpsLog: len(GpsLog) if GpsLog.NoBearing else 0,
+			'GenDistance':	lambda GpsLog: len(GpsLog) if GpsLog.NoDistance else 0,
+			'GenAltitude':	lambda GpsLog: len(GpsLog) if GpsLog.NoAltitude else 0,
+		}
+		for Name, Func in Points.items():
+			setattr(self, Name, self.Profile.Wrap('derive', getattr(self, Name), Func))
+		self.Resample = self.Profile.Wrap('derive', self.Resample, len)
+		self.Reduce = self.Profile.Wrap('reduce', self.Reduce, len)
+		
+		return self.Profile
 	
 	##########################################################################
-	# NMEA reader/writer
-	
-	#		HHMMSS	   lat		   lng			knot bearing  ddmmyy
-	# 0	  1		  2 3		   4 5			6 7	  8	  9
-	# $GPRMC,210624.000,A,3401.234567,N,13501.234567,E,19.738,249.05,010912,,,A*60
-	#
-	#		HHMMSS	 lat		 lng		   sat hdop alt
-	# 0	  1		  2		 3 4		  5 6 7  8   9  10 11  12
-	# $GPGGA,085120.307,3541.1493,N,13945.3994,E,1,08,1.0,6.9,M,35.9,M,,0000*5E
-	
-	def NmeaStr2LatLng(self, LatLngStr, Dir):
-		LatLng = float(LatLngStr)
-		LatLng = LatLng // 100 + (LatLng - LatLng // 100 * 100) / 60
-		if Dir == 'W' or Dir == 'S':
-			LatLng = -LatLng
-		return LatLng
-	
-	def NmeaLatLng2Str(self, LatLng):
-		return str(int(LatLng) * 100 + (LatLng - int(LatLng)) * 60)
-	
-	def NmeaGenChksum(self, Str):
-		sum = ord('$')
-		
-		for c in Str:
-			sum ^= ord(c)
-		
-		return '*%02X' % (sum,)
-	
-	def Read_nmea(self, FileName):
-		with smart_open(FileName, 'rt') as FileIn:
-			Point		= None
-			PrevTime	= ''
-			
-			for Line in FileIn:
-				if Line.startswith('$GPRMC') or Line.startswith('$GPGGA'):
-					Param = Line.split(',')
-					
-					if PrevTime != Param[1]:
-						if Point: self.Append(Point)
-						Point = PointClass()
-						PrevTime = Param[1]
-					
-					if Line.startswith('$GPRMC'):
-						
-						Time	= float(Param[1])
-						TimeUs	= int(Time * 1000 + 0.5) % 1000 * 1000
-						Time	= int(Time)
-						Date	= int(Param[9])
-						Point.DateTime	= datetime.datetime(
-							Date % 100 + 2000, Date // 100 % 100, Date // 10000,
-							Time // 10000, Time // 100 % 100, Time % 100, TimeUs,
-							tzinfo = datetime.timezone.utc
-						)
-						
-						Point.Longitude	= self.NmeaStr2LatLng(Param[5], Param[6])
-						Point.Latitude	= self.NmeaStr2LatLng(Param[3], Param[4])
-						
-						if len(Param[7]) > 0:
-							Point.Speed = float(Param[7]) * 1.852
-						if len(Param[8]) > 0:
-							Point.Bearing = float(Param[8])
-						
-					else:
-						if len(Param[9]) > 0:
-							Point.Altitude = float(Param[9])
-			if Point: self.Append(Point)
-	
-	def Write_nmea(self, FileName):
-		with smart_open(FileName, 'wt') as FileOut:
-			
-			self.GenSpeed()
-			self.GenBearing()
-			
-			for Point in self.Points:
-				Time = Point.DateTime.strftime('%H%M%S') + ('.%03d' % (Point.DateTime.microsecond // 1000,))
-				Lat = '%.8f' % (Point.Latitude,)  + ',N' if Point.Latitude  >= 0 else ',S'
-				Lng = '%.8f' % (Point.Longitude,) + ',E' if Point.Longitude >= 0 else ',W'
-				
-				s = '$GPRMC,%s,A,%s,%s,%s,%s,%s,,,A' % (
-					Time, Lat, Lng,
-					'%.3f' % (Point.Speed / 1.852,) if Point.Speed is not None else '',
-					'%.2f' % (Point.Bearing,) if Point.Bearing is not None else '',
-					Point.DateTime.strftime('%d%m%y')
-				)
-				FileOut.write(s + self.NmeaGenChksum(s) + '\n')
-				
-				s = '$GPGGA,%s,%s,%s,1,08,1.0,%s,M,,,,' % (
-					Time, Lat, Lng,
-					'%.2f' % (Point.Altitude,) if Point.Altitude is not None else '',
-				)
-				FileOut.write(s + self.NmeaGenChksum(s) + '\n')
+	# text writer 共通
+	# 1点毎に format / write() せず，chunk 毎に channel の column (list) を作り，
+	# map() で全行を生成して 1回の write() で出力する
+	
+	# Chunks() の各 chunk で Gen の関数を呼び，出力対象の点を CHUNK_SIZE 点毎の
+	# [Start, End) で返す．全点読み込み済みでも一度に全行を生成しない
+	# 全点を複数回出力する writer (KML 等) は，2回目以降を Count = False にして
+	# 進捗の出力点数に重複して数えないようにする
+	def TextChunks(self, *Gen, Count = True):
+		for _ in self.Chunks():
+			for Func in Gen:
+				Func()
+			
+			for Start in range(self.Lookback, len(self), self.CHUNK_SIZE):
+				yield Start, min(Start + self.CHUNK_SIZE, len(self))
+				if self.Progress and Count:
+					self.Progress.Written += min(self.CHUNK_SIZE, len(self) - Start)
+					self.Progress.Update('write')
+	
+	# [Start, End) の点の channel．Div があれば割った値
+	def TextColumn(self, Name, Start, End, Div = None):
+		if numpy:
+			Value = numpy.frombuffer(getattr(self, Name), numpy.float64)[Start:End]
+			return (Value / Div if Div else Value).tolist()
+		
+		Value = getattr(self, Name)[Start:End]
+		return [v / Div for v in Value] if Div else Value
+	
+	# Format で整形した文字列．Has の値が無い点は ''
+	def TextFormat(self, Format, Value, Start = 0, Has = 0):
+		Str = list(map(Format.__mod__, Value))
+		
+		if Has:
+			Flag = self.Flag[Start:Start + len(Str)]
+			if any(not f & Has for f in set(Flag)):
+				Str = [s if f & Has else '' for s, f in zip(Str, Flag)]
+		return Str
+	
+	# 0 以上は Format で整形し，それ以外 (負, nan) は Neg
+	def TextSign(self, Value, Format, Neg):
+		Str = list(map(Format.__mod__, Value))
+		
+		if numpy:
+			for i in numpy.flatnonzero(~(numpy.array(Value) >= 0)).tolist():
+				Str[i] = Neg
+			return Str
+		return [s if v >= 0 else Neg for s, v in zip(Str, Value)]
+	
+	# [Start, End) の点の時刻を (Format 毎の文字列..., 分, 秒, ms) の column に分解する
+	# Format (strftime) の文字列は時間毎に 1回だけ生成する
+	def TextTime(self, Start, End, *Format):
+		if numpy:
+			Hour, Ms = numpy.divmod(numpy.frombuffer(self.Time, numpy.int64)[Start:End], 3600000)
+			Hour	= Hour.tolist()
+			Min		= (Ms // 60000).tolist()
+			Sec		= (Ms // 1000 % 60).tolist()
+			Ms		= (Ms % 1000).tolist()
+		else:
+			Hour, Ms = zip(*[divmod(t, 3600000) for t in self.Time[Start:End]]) if End > Start else ((), ())
+			Min		= [m // 60000 for m in Ms]
+			Sec		= [m // 1000 % 60 for m in Ms]
+			Ms		= [m % 1000 for m in Ms]
+		
+		Str = []
+		for f in Format:
+			Table = {h: Time2DateTime(h * 3600000).strftime(f) for h in set(Hour)}
+			Str.append(list(map(Table.__getitem__, Hour)))
+		
+		return (*Str, Min, Sec, Ms)
+	
+	# Template % (各 column の i 番目) の list
+	def TextLines(self, Template, *Column):
+		return list(map(Template.__mod__, zip(*Column)))
 	
 	##########################################################################
-	# GPX reader/writer
+	# 逐次 regex tokenizer
+	# ファイル全体を読まずに READ_SIZE 毎に読み，Pattern に match した順に返す．
+	# 最後の match 以降は，次の chunk とつながる途中の要素として最大 MaxLen 文字
+	# 持ち越す (MaxLen より長い要素は match しない)
 	
-	def Read_gpx(self, FileName):
-		with smart_open(FileName, 'rt') as FileIn:
-			for match in re.finditer('<trkpt.*?</trkpt>', FileIn.read(), flags = re.DOTALL):
-				Point = PointClass()
-				
-				str = match.group(0)
-				
-				m = re.search(r'<time>\s*(\S+?)\s*</', str)
-				if not m:
-					continue
-				Point.DateTime = datetime.datetime.fromisoformat(m.group(1).replace('Z', '+00:00'))
-				
-				m = re.search(r'lat="(.*?)"', str)
-				if not m:
-					continue
-				Point.Latitude = float(m.group(1))
-				
-				m = re.search(r'lon="(.*?)"', str)
-				if not m:
-					continue
-				Point.Longitude = float(m.group(1))
-				
-				m = re.search(r'<ele>\s*(\S+?)\s*</', str)
-				if m:
-					Point.Altitude = float(m.group(1))
-				
-				m = re.search(r'<speed>\s*(\S+?)\s*</', str)
-				if m:
-					Point.Speed = float(m.group(1)) * 3.6
-				
-				m = re.search(r'<course>\s*(\S+?)\s*</', str)
-				if m:
-					Point.Bearing = float(m.group(1))
-				
-				self.Append(Point)
+	READ_SIZE = 1 << 20
 	
-	def Write_gpx(self, FileName):
-		with smart_open(FileName, 'wt') as FileOut:
-			
-			FileOut.write(
-				'<?xml version="1.0"?><gpx version="1.0" creator="GPSLogger - http://gpslogger.mendhak.com/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="http://www.topografix.com/GPX/1/0" xsi:schemaLocation="http://www.topografix.com/GPX/1/0 http://www.topografix.com/GPX/1/0/gpx.xsd"><time>%s</time><bounds /><trk><trkseg>\n' % (
-					self.Points[0].DateTime.isoformat(timespec='milliseconds')
-				)
-			)
-			
-			self.GenSpeed()
-			self.GenAltitude()
-			self.GenBearing()
+	def IterMatch(self, FileIn, Pattern, MaxLen = 1 << 16):
+		Buf = ''
+		
+		while True:
+			Data = FileIn.read(self.READ_SIZE)
+			Buf += Data
 			
-			for Point in self.Points:
-				FileOut.write(
-					'<trkpt lat="%.8f" lon="%.8f"><ele>%.3f</ele><course>%.2f</course><speed>%.3f</speed><time>%s</time></trkpt>\n' % (
-						Point.Latitude, Point.Longitude, Point.Altitude,
-						Point.Bearing, Point.Speed / 3.6, Point.DateTime.isoformat(timespec='milliseconds')
-					)
-				)
+			End = 0
+			for Match in Pattern.finditer(Buf):
+				yield Match
+				End = Match.end()
 			
-			FileOut.write('</trkseg></trk></gpx>\n')
+			if not Data:
+				break
+			Buf = Buf[max(End, len(Buf) - MaxLen):]
 	
 	##########################################################################
-	# KML reader/writer
+	# 一定周期への resample
+	# 各点を挟む 2点から Rate [Hz] の時刻 (epoch からの Interval の倍数) の値を補間する．
+	# 間隔が MaxGap [s] を超える区間は補間せず，その間の点は生成しない．
+	# Method: linear: 線形補間，spline: 3次 Hermite spline (区間端は片側の傾き)
+	# 方位は 360°の折り返しを展開して補間し，距離は常に線形補間する．
 	
-	def Read_kml(self, FileName):
-		with smart_open(FileName, 'rt') as FileIn:
-			for match in re.finditer('<Placemark.*?</Placemark>', FileIn.read(), flags = re.DOTALL):
-				Point = PointClass()
-				
-				str = match.group(0)
-				
-				m = re.search(r'<when>\s*(\S+?)\s*</', str)
-				if not m:
-					continue
-				Point.DateTime = datetime.datetime.fromisoformat(m.group(1).replace('Z', '+00:00'))
-				
-				m = re.search(r'<coordinates>\s*([\d\.\-]+),([\d\.\-]+)\s*</', str)
-				if not m:
-					continue
-				Point.Longitude = float(m.group(1))
-				Point.Latitude  = float(m.group(2))
-				
-				self.Append(Point)
-	
-	def Write_kml(self, FileName):
-		with smart_open(FileName, 'wt') as FileOut:
-			
-			self.GenSpeed()
-			self.GenAltitude()
-			self.GenBearing()
-			self.GenDistance()
-			
-			FileOut.write('''\
-<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2"
-		xmlns:gx="http://www.google.com/kml/ext/2.2">
-	<Document>
-		<name>GPS device</name>
-		<snippet>Created {now}</snippet>
-		<LookAt>
-			<gx:TimeSpan>
-				<begin>{start}</begin>
-				<end>{end}</end>
-			</gx:TimeSpan>
-			<longitude>kml</longitude>
-			<latitude>{lat}</latitude>
-			<range>1300.000000</range>
-		</LookAt>
-<!-- Normal track style -->
-		<Style id="track_n">
-			<IconStyle>
-				<scale>.5</scale>
-				<Icon>
-					<href>http://earth.google.com/images/kml-icons/track-directional/track-none.png</href>
-				</Icon>
-			</IconStyle>
-			<LabelStyle>
-				<scale>0</scale>
-			</LabelStyle>
-		</Style>
-<!-- Highlighted track style -->
-		<Style id="track_h">
-			<IconStyle>
-				<scale>1.2</scale>
-				<Icon>
-					<href>http://earth.google.com/images/kml-icons/track-directional/track-none.png</href>
-				</Icon>
-			</IconStyle>
-		</Style>
-		<StyleMap id="track">
-			<Pair>
-				<key>normal</key>
-				<styleUrl>#track_n</styleUrl>
-			</Pair>
-			<Pair>
-				<key>highlight</key>
-				<styleUrl>#track_h</styleUrl>
-			</Pair>
-		</StyleMap>
-<!-- Normal waypoint style -->
-		<Style id="waypoint_n">
-			<IconStyle>
-				<Icon>
-					<href>http://maps.google.com/mapfiles/kml/pal4/icon61.png</href>
-				</Icon>
-			</IconStyle>
-		</Style>
-<!-- Highlighted waypoint style -->
-		<Style id="waypoint_h">
-			<IconStyle>
-				<scale>1.2</scale>
-				<Icon>
-					<href>http://maps.google.com/mapfiles/kml/pal4/icon61.png</href>
-				</Icon>
-			</IconStyle>
-		</Style>
-		<StyleMap id="waypoint">
-			<Pair>
-				<key>normal</key>
-				<styleUrl>#waypoint_n</styleUrl>
-			</Pair>
-			<Pair>
-				<key>highlight</key>
-				<styleUrl>#waypoint_h</styleUrl>
-			</Pair>
-		</StyleMap>
-		<Style id="lineStyle">
-			<LineStyle>
-				<color>FFFFFF00</color>
-				<width>1</width>
-			</LineStyle>
-		</Style>
-		<Folder>
-			<name>Tracks</name>
-			<Folder>
-				<snippet/>
-				<description>
-					<![CDATA[<table>
-						<tr><td><b>Distance</b>{dist}m</td></tr>
-						<tr><td><b>Start Time</b>{start}</td></tr>
-						<tr><td><b>End Time</b>{end}</td></tr>
-					</table>]]>
-				</description>
-				<TimeSpan>
-					<begin>{start}</begin>
-					<end>{end}</end>
-				</TimeSpan>
-				<Folder>
-					<name>Points</name>
-'''					.format(
-						now		= str(datetime.datetime.now()),
-						start	= self.Points[0].DateTime.isoformat(timespec='milliseconds'),
-						end		= self.Points[len(self.Points) - 1].DateTime.isoformat(timespec='milliseconds'),
-						lat		= '%.8f' % (self.Points[0].Latitude,),
-						lng		= '%.8f' % (self.Points[0].Longitude,),
-						dist	= '%.2f' % (self.Points[len(self.Points) - 1].Distance),
-					)
-				)
-			
-			for Point in self.Points:
-				FileOut.write('''\
-					<Placemark>
-						<snippet/>
-						<description><![CDATA[
-							<table>
-								<tr><td>Longitude: {lng}</td></tr>
-								<tr><td>Latitude: {lat}</td></tr>
-								<tr><td>Speed: {speed}km/h</td></tr>
-								<tr><td>Altitude: {alt}m</td></tr>
-								<tr><td>Heading: {dir}</td></tr>
-								<tr><td>Time: {time}</td></tr>
-							</table>
-						]]></description>
-						<LookAt>
-							<longitude>{lng}</longitude>
-							<latitude>{lat}</latitude>
-							<tilt>66</tilt>
-						</LookAt>
-						<TimeStamp><when>{time}</when></TimeStamp>
-						<styleUrl>#track</styleUrl>
-						<Point>
-							<coordinates>{lng},{lat}</coordinates>
-						</Point>
-					</Placemark>
-'''					.format(
-						time	= Point.DateTime.isoformat(timespec='milliseconds'),
-						lat		= '%.8f' % (Point.Latitude,),
-						lng		= '%.8f' % (Point.Longitude,),
-						speed	= '%.3f' % (Point.Speed,),
-						alt		= '%.3f' % (Point.Altitude,),
-						dir		= '%.2f' % (Point.Bearing,),
-					)
-				)
+	RESAMPLE			= ('linear', 'spline')
+	RESAMPLE_MAX_GAP	= 5
+	
+	def Resample(self, Rate, Method = 'linear', MaxGap = RESAMPLE_MAX_GAP):
+		if Method not in self.RESAMPLE:
+			raise GpsxException('Unknown resample method: %s' % (Method,))
+		if not Rate > 0:
+			raise GpsxException('Invalid resample rate: %s' % (Rate,))
+		
+		Stats = {
+			'Rate':		Rate,
+			'Method':	Method,
+			'MaxGap':	MaxGap,
+			'Input':	len(self),
+		}
+		
+		# 時刻順に並べ，同じ時刻の点は最初の点だけ残す
+		self.ResampleSort()
+		
+		if len(self) >= 2:
+			if numpy:
+				self.ResampleNumpy(1000 / Rate, MaxGap * 1000, Method == 'spline')
+			else:
+				self.ResamplePython(1000 / Rate, MaxGap * 1000, Method == 'spline')
+			self.x = array('d')
+			self.y = array('d')
+		
+		Stats['Output'] = len(self)
+		return Stats
+	
+	def ResamplePython(self, Interval, Gap, Spline):
+		Time, Index, Weight = self.ResampleGrid(Interval, Gap)
+		
+		# 方位は前の点からの差が ±180°以内になるよう展開する
+		Bearing = array('d', self.Bearing)
+		for i in range(1, len(Bearing)):
+			Bearing[i] = Bearing[i - 1] + (Bearing[i] - Bearing[i - 1] + 180) % 360 - 180
+		
+		Speed	= self.Interpolate(self.Speed, Index, Weight, Gap, Spline)
+		Bearing	= self.Interpolate(Bearing, Index, Weight, Gap, Spline)
+		Flag	= self.Flag
+		
+		self.Longitude	= array('d', self.Interpolate(self.Longitude, Index, Weight, Gap, Spline))
+		self.Latitude	= array('d', self.Interpolate(self.Latitude, Index, Weight, Gap, Spline))
+		self.Altitude	= array('d', self.Interpolate(self.Altitude, Index, Weight, Gap, Spline))
+		self.Speed		= array('d', (max(v, 0.0) for v in Speed))
+		self.Bearing	= array('d', (v % 360 for v in Bearing))
+		self.Distance	= array('d', self.Interpolate(self.Distance, Index, Weight, Gap, False))
+		self.Flag		= array('B', (
+			Flag[i] if w == 0 else Flag[i + 1] if w == 1 else Flag[i] & Flag[i + 1]
+			for i, w in zip(Index, Weight)
+		))
+		self.Time		= array('q', Time)
+	
+	def ResampleNumpy(self, Interval, Gap, Spline):
+		Time, Index, Weight = self.ResampleGridNumpy(Interval, Gap)
+		
+		Bearing = numpy.frombuffer(self.Bearing)
+		Bearing = numpy.cumsum(numpy.concatenate((Bearing[:1], (numpy.diff(Bearing) + 180) % 360 - 180)))
+		
+		Speed	= self.InterpolateNumpy(self.Speed, Index, Weight, Gap, Spline)
+		Bearing	= self.InterpolateNumpy(Bearing, Index, Weight, Gap, Spline)
+		Flag	= numpy.frombuffer(self.Flag, dtype = numpy.uint8)
+		Flag	= numpy.where(Weight == 0, Flag[Index], numpy.where(Weight == 1, Flag[Index + 1], Flag[Index] & Flag[Index + 1]))
+		
+		self.Longitude	= array('d', self.InterpolateNumpy(self.Longitude, Index, Weight, Gap, Spline).tobytes())
+		self.Latitude	= array('d', self.InterpolateNumpy(self.Latitude, Index, Weight, Gap, Spline).tobytes())
+		self.Altitude	= array('d', self.InterpolateNumpy(self.Altitude, Index, Weight, Gap, Spline).tobytes())
+		self.Speed		= array('d', numpy.maximum(Speed, 0.0).tobytes())
+		self.Bearing	= array('d', (Bearing % 360).tobytes())
+		self.Distance	= array('d', self.InterpolateNumpy(self.Distance, Index, Weight, Gap, False).tobytes())
+		self.Flag		= array('B', Flag.astype(numpy.uint8).tobytes())
+		self.Time		= array('q', Time.tobytes())
+	
+	def ResampleSort(self):
+		Time = self.Time
+		
+		if numpy:
+			TimeN = numpy.frombuffer(Time, dtype = numpy.int64)
+			if numpy.all(TimeN[1:] > TimeN[:-1]):
+				return
+			Index = numpy.unique(TimeN, return_index = True)[1].tolist()
+			del TimeN
+		else:
+			if all(t0 < t1 for t0, t1 in zip(Time, Time[1:])):
+				return
+			Index = sorted(range(len(Time)), key = Time.__getitem__)
+			Index = [i for n, i in enumerate(Index) if n == 0 or Time[i] != Time[Index[n - 1]]]
+		
+		self.Compress(Index)
+	
+	# 出力する時刻と，それを挟む点の index (左側) と重み
+	def ResampleGrid(self, Interval, Gap):
+		Time	= self.Time
+		Last	= len(Time) - 2
+		Grid	= []
+		Index	= []
+		Weight	= []
+		
+		Start = 0
+		for End in range(len(Time)):
+			if End < len(Time) - 1 and Time[End + 1] - Time[End] <= Gap:
+				continue
 			
-			FileOut.write('''\
-				</Folder>
-				<Placemark>
-					<name>Path</name>
-					<styleUrl>#lineStyle</styleUrl>
-					<LineString>
-						<tessellate>1</tessellate>
-						<coordinates>
-''')
-			
-			for Point in self.Points:
-				FileOut.write('							%.8f,%.8f\n' % (Point.Longitude, Point.Latitude))
-			
-			FileOut.write('''\
-						</coordinates>
-					</LineString>
-				</Placemark>
-			</Folder>
-		</Folder>
-	</Document>
-</kml>
-''')
+			for k in range(ceil(Time[Start] / Interval), floor(Time[End] / Interval) + 1):
+				t = round(k * Interval)
+				i = min(max(bisect.bisect_right(Time, t, Start, End + 1) - 1, 0), Last)
+				Grid.append(t)
+				Index.append(i)
+				Weight.append((t - Time[i]) / (Time[i + 1] - Time[i]))
+			Start = End + 1
+		
+		return Grid, Index, Weight
 	
-	##########################################################################
-	# RaceChrono reader/writer
-	# 1: ULONG epoch 時刻 [ms]
-	# 2: ULONG 走行距離 [1/1000m]
-	# 3: int latitude, int longitude [1/6000000度]
-	# 4: UINT 速度 [1/277.7792km/h, キリがいいのに近いのは 1/512knot?]
-	# 5: 高度 [1/1000m]
-	# 6: UINT bearing [1/1000度]
-	# 30002: 捕捉衛生数
-	# 30003: 位置特定品質 ($GPGGA)
-	# 30004: DOP 座標精度 [*1/1000]
-	# 30005: DOP 座標精度 [*1/1000], -128:データなし
-	# すべてリトルエンディアン
-	
-	def Read_RaceChrono(self, DirName):
-		if DirName == '-':
-			raise GpsxException("RaceChrono reader can't input from stdin")
-		
-		with open(DirName + '/channel_1_100_0_1_1', 'rb') as fhTime:
-			with open(DirName + '/channel_1_100_0_2_1', 'rb') as fhDistance:
-				with open(DirName + '/channel_1_100_0_3_1', 'rb') as fhLatLng:
-					with open(DirName + '/channel_1_100_0_4_0', 'rb') as fhSpeed:
-						with open(DirName + '/channel_1_100_0_5_0', 'rb') as fhAlt:
-							with open(DirName + '/channel_1_100_0_6_0', 'rb') as fhDir:
-								while True:
-									Point = PointClass()
-									
-									data = fhTime.read(8)
-									if len(data) < 8:
-										break
-									Point.DateTime = datetime.datetime.utcfromtimestamp(int.from_bytes(data, 'little') / 1000)
-									
-									data = fhDistance.read(8)
-									if len(data) < 8:
-										break
-									Point.Distance = int.from_bytes(data, 'little') / 1000
-									
-									data = fhLatLng.read(8)
-									if len(data) < 8:
-										break
-									Point.Longitude = int.from_bytes(data[4:8], 'little', signed = True) / 6000000
-									Point.Latitude  = int.from_bytes(data[0:4], 'little', signed = True) / 6000000
-									
-									data = fhSpeed.read(4)
-									if len(data) < 4:
-										break
-									Point.Speed = int.from_bytes(data, 'little') / 277.7792
-									
-									data = fhAlt.read(4)
-									if len(data) < 4:
-										break
-									Point.Altitude = int.from_bytes(data, 'little', signed = True) / 1000
-									
-									data = fhDir.read(4)
-									if len(data) < 4:
-										break
-									Point.Bearing = int.from_bytes(data, 'little') / 1000
-									
-									self.Append(Point)
-	
-	def Write_RaceChrono(self, DirName):
-		if DirName == '-':
-			raise GpsxException("RaceChrono writer can't output to stdout")
-		
-		# dir 作成
-		os.makedirs(DirName, exist_ok=True)
-		
-		with open(DirName + '/channel_1_100_0_1_1', 'wb') as FileOut:
-			for Point in self.Points:
-				FileOut.write(int(Point.DateTime.timestamp() * 1000).to_bytes(8, 'little'))
-		
-		self.GenDistance()
-		with open(DirName + '/channel_1_100_0_2_1', 'wb') as FileOut:
-			for Point in self.Points:
-				FileOut.write(int(Point.Distance * 1000).to_bytes(8, 'little'))
-		
-		with open(DirName + '/channel_1_100_0_3_1', 'wb') as FileOut:
-			for Point in self.Points:
-				FileOut.write(int(Point.Latitude  * 6000000).to_bytes(4, 'little', signed = True))
-				FileOut.write(int(Point.Longitude * 6000000).to_bytes(4, 'little', signed = True))
-		
-		self.GenSpeed()
-		with open(DirName + '/channel_1_100_0_4_0', 'wb') as FileOut:
-			for Point in self.Points:
-				FileOut.write(int(Point.Speed * 277.7792).to_bytes(4, 'little'))
-		
-		self.GenAltitude()
-		with open(DirName + '/channel_1_100_0_5_0', 'wb') as FileOut:
-			for Point in self.Points:
-				FileOut.write(int(Point.Altitude * 1000).to_bytes(4, 'little', signed = True))
-		
-		self.GenBearing()
-		with open(DirName + '/channel_1_100_0_6_0', 'wb') as FileOut:
-			for Point in self.Points:
-				FileOut.write(int(Point.Bearing * 1000).to_bytes(4, 'little', signed = True))
+	def ResampleGridNumpy(self, Interval, Gap):
+		Time	= numpy.frombuffer(self.Time, dtype = numpy.int64)
+		dt		= numpy.diff(Time)
+		
+		# 区間毎に先頭～末尾の時刻の格子点を並べる
+		Break	= numpy.flatnonzero(dt > Gap)
+		Start	= numpy.ceil(Time[numpy.concatenate(((0,), Break + 1))] / Interval).astype(numpy.int64)
+		End		= numpy.floor(Time[numpy.concatenate((Break, (len(Time) - 1,)))] / Interval).astype(numpy.int64)
+		Count	= numpy.maximum(End - Start + 1, 0)
+		k		= numpy.repeat(Start - (numpy.cumsum(Count) - Count), Count) + numpy.arange(Count.sum())
+		
+		Grid	= numpy.rint(k * Interval).astype(numpy.int64)
+		Index	= numpy.clip(numpy.searchsorted(Time, Grid, 'right') - 1, 0, len(Time) - 2)
+		Weight	= (Grid - Time[Index]) / dt[Index]
+		
+		return Grid, Index, Weight
 	
-	##########################################################################
-	# VSD reader
-	# 0		1							2			3			4		5
-	# GPS	2019-01-04T04:34:39.200Z	136.12345	35.12345	92.600	0.037
-	def Read_vsd(self, FileName):
-		with smart_open(FileName, 'rt') as FileIn:
-			PrevTime = ''
-			
-			for Line in FileIn:
-				if Line.startswith('GPS'):
-					Param = Line.split('\t')
-					
-					if PrevTime == Param[1]:
-						continue
-					PrevTime = Param[1]
-					
-					Point = PointClass()
-					
-					Point.DateTime	= datetime.datetime.fromisoformat(Param[1].replace('Z', '+00:00'))
-					Point.Longitude	= float(Param[2])
-					Point.Latitude	= float(Param[3])
-					Point.Altitude	= float(Param[4])
-					Point.Speed		= float(Param[5])
-					
-					self.Append(Point)
+	# 各点の傾き．両側の区間が有効なら前後の点の差分，片側なら片側の区間の傾き
+	def Tangent(self, Value, Gap):
+		Time	= self.Time
+		Num		= len(Time)
+		Slope	= [0.0] * Num
+		
+		for i in range(Num):
+			Sum = Span = 0
+			if i > 0 and Time[i] - Time[i - 1] <= Gap:
+				Sum		+= Value[i] - Value[i - 1]
+				Span	+= Time[i] - Time[i - 1]
+			if i < Num - 1 and Time[i + 1] - Time[i] <= Gap:
+				Sum		+= Value[i + 1] - Value[i]
+				Span	+= Time[i + 1] - Time[i]
+			if Span:
+				Slope[i] = Sum / Span
+		
+		return Slope
 	
-	##########################################################################
-	# Google Timeline
-	def Read_GoogleTimeline(self, FileName):
-		with smart_open(FileName, 'rt') as FileIn:
-			
-			PrevTime = ''
-			for Line in FileIn:
-				if 'timelinePath' in Line:
-					for Line in FileIn:
-						if ']' in Line: break
-						
-						match = re.search('point.*?([\d\.]+).*?([\d\.]+)', Line)
-						if match:
-							Point = PointClass()
-							Point.Longitude	= float(match.group(2))
-							Point.Latitude	= float(match.group(1))
-							continue
-						
-						match = re.search('time".*?"(.*)"', Line)
-						if match and PrevTime != match.group(1):
-							Point.DateTime	= datetime.datetime.fromisoformat(match.group(1))
-							PrevTime = match.group(1)
-							self.Append(Point)
+	def Interpolate(self, Value, Index, Weight, Gap, Spline):
+		if not Spline:
+			return [Value[i] + (Value[i + 1] - Value[i]) * w for i, w in zip(Index, Weight)]
+		
+		Time	= self.Time
+		Slope	= self.Tangent(Value, Gap)
+		Result	= []
+		
+		for i, w in zip(Index, Weight):
+			h	= Time[i + 1] - Time[i]
+			w2	= w * w
+			w3	= w2 * w
+			Result.append(
+				(2 * w3 - 3 * w2 + 1) * Value[i] + (w3 - 2 * w2 + w) * h * Slope[i] +
+				(-2 * w3 + 3 * w2) * Value[i + 1] + (w3 - w2) * h * Slope[i + 1]
+			)
+		
+		return Result
 	
-	##########################################################################
-	# Points dumper
-	def Write_debug(self, FileName):
-		with smart_open(FileName, 'wt') as FileOut:
-			FileOut.write(str(self.Points).replace(',', '\n'))
+	def InterpolateNumpy(self, Value, Index, Weight, Gap, Spline):
+		Value	= numpy.frombuffer(Value)
+		p0		= Value[Index]
+		p1		= Value[Index + 1]
+		
+		if not Spline:
+			return p0 + (p1 - p0) * Weight
+		
+		Time	= numpy.frombuffer(self.Time, dtype = numpy.int64)
+		dt		= numpy.diff(Time)
+		Valid	= dt <= Gap
+		
+		# 各点の左右の区間の値の差と時間 (gap の区間は 0)
+		dv = numpy.where(Valid, numpy.diff(Value), 0)
+		dt = numpy.where(Valid, dt, 0)
+		Sum		= numpy.concatenate(((0,), dv)) + numpy.concatenate((dv, (0,)))
+		Span	= numpy.concatenate(((0,), dt)) + numpy.concatenate((dt, (0,)))
+		with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+			Slope = numpy.where(Span != 0, Sum / Span, 0)
+		
+		h	= (Time[Index + 1] - Time[Index]).astype(numpy.float64)
+		w	= Weight
+		w2	= w * w
+		w3	= w2 * w
+		return (
+			(2 * w3 - 3 * w2 + 1) * p0 + (w3 - 2 * w2 + w) * h * Slope[Index] +
+			(-2 * w3 + 3 * w2) * p1 + (w3 - w2) * h * Slope[Index + 1]
+		)
 	
 	##########################################################################
-	# smart reduce point
+	# 点の間引き
+	# x, y 平面上で Douglas-Peucker または Visvalingam-Whyatt により間引く．
+	# Tolerance [m] 以内の誤差で間引き，MaxPoints 指定時はその点数以下にする．
+	
+	REDUCE_TOLERANCE = 5
+	
+	# 線分 p1-p3 と点 p2 の距離の 2乗
 	def DistanceLine2Pix(self, p1, p2, p3):
-		x1 = self.Points[p1].x
-		y1 = self.Points[p1].y
-		px = self.Points[p2].x
-		py = self.Points[p2].y
-		x2 = self.Points[p3].x
-		y2 = self.Points[p3].y
+		x1 = self.x[p1]
+		y1 = self.y[p1]
+		px = self.x[p2]
+		py = self.y[p2]
+		x2 = self.x[p3]
+		y2 = self.y[p3]
 		
 		a = x2 - x1
 		b = y2 - y1
@@ -739,7 +1504,7 @@ class GpsLogClass:
 		b2 = b * b
 		r2 = a2 + b2
 		tt = -(a * (x1 - px) + b * (y1 - py))
-		if tt < 0:
+		if tt <= 0:
 			return (x1 - px) * (x1 - px) + (y1 - py) * (y1 - py)
 		if tt > r2:
 			return (x2 - px) * (x2 - px) + (y2 - py) * (y2 - py)
@@ -747,37 +1512,151 @@ class GpsLogClass:
 		f1 = a * (y1 - py) - b * (x1 - px)
 		return f1 * f1 / r2
 	
-	def ReduceSmart(self):
+	# Start < i < End で線分 Start-End から最も遠い点と，その距離の 2乗
+	def FarthestPoint(self, Start, End):
+		if numpy and End - Start > 64:
+			x = numpy.frombuffer(self.x)
+			y = numpy.frombuffer(self.y)
+			
+			x1 = x[Start]
+			y1 = y[Start]
+			a = x[End] - x1
+			b = y[End] - y1
+			r2 = a * a + b * b
+			dx = x1 - x[Start + 1:End]
+			dy = y1 - y[Start + 1:End]
+			
+			tt = -(a * dx + b * dy)
+			with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+				Dist = numpy.where(
+					tt <= 0, dx * dx + dy * dy,
+					numpy.where(
+						tt > r2, (x[End] - x[Start + 1:End]) ** 2 + (y[End] - y[Start + 1:End]) ** 2,
+						(a * dy - b * dx) ** 2 / r2
+					)
+				)
+			
+			i = int(numpy.argmax(Dist))
+			return Start + 1 + i, float(Dist[i])
+		
+		Max = -1
+		Index = Start
+		for i in range(Start + 1, End):
+			Dist = self.DistanceLine2Pix(Start, i, End)
+			if Dist > Max:
+				Max = Dist
+				Index = i
+		return Index, Max
+	
+	# Douglas-Peucker
+	# 誤差が最大の区間から順に分割する (再帰しない)．残す点の index を返す
+	def SimplifyDP(self, Tolerance, MaxPoints = None):
+		self.GenXY()
+		Num = len(self)
+		if Num <= 2:
+			return list(range(Num))
+		
+		Tolerance2	= Tolerance ** 2
+		Keep		= bytearray(Num)
+		Keep[0]		= Keep[-1] = 1
+		Count		= 2
+		Heap		= []
+		
+		def Push(Start, End):
+			if End - Start >= 2:
+				Index, Dist = self.FarthestPoint(Start, End)
+				if Dist > Tolerance2:
+					heapq.heappush(Heap, (-Dist, Start, End, Index))
+		
+		Push(0, Num - 1)
+		while Heap and (MaxPoints is None or Count < MaxPoints):
+			Dist, Start, End, Index = heapq.heappop(Heap)
+			Keep[Index] = 1
+			Count += 1
+			Push(Start, Index)
+			Push(Index, End)
+		
+		return [i for i in range(Num) if Keep[i]]
+	
+	# Visvalingam-Whyatt
+	# 前後の点と成す三角形の面積が小さい点から順に削除する．
+	# 面積 Tolerance ** 2 [m^2] 未満の点を削除し，残す点の index を返す
+	def SimplifyVW(self, Tolerance, MaxPoints = None):
 		self.GenXY()
+		Num = len(self)
+		if Num <= 2:
+			return list(range(Num))
 		
-		st = 0
-		while st < len(self.Points) - 2:
-			ed = st + 2
-			del_ok = -1
+		x		= self.x
+		y		= self.y
+		Prev	= list(range(-1, Num - 1))
+		Next	= list(range(1, Num + 1))
+		Limit	= Tolerance ** 2
+		Count	= Num
+		
+		def CalcArea(i):
+			p = Prev[i]
+			n = Next[i]
+			return abs((x[p] - x[i]) * (y[n] - y[i]) - (x[n] - x[i]) * (y[p] - y[i])) / 2
+		
+		if numpy:
+			xn = numpy.frombuffer(x)
+			yn = numpy.frombuffer(y)
+			Area = (numpy.abs(
+				(xn[:-2] - xn[1:-1]) * (yn[2:] - yn[1:-1]) - (xn[2:] - xn[1:-1]) * (yn[:-2] - yn[1:-1])
+			) / 2).tolist()
+			del xn, yn
+		else:
+			Area = [CalcArea(i) for i in range(1, Num - 1)]
+		
+		Area = [inf] + Area + [inf]
+		Heap = [(Area[i], i) for i in range(1, Num - 1)]
+		heapq.heapify(Heap)
+		
+		while Heap:
+			a, i = heapq.heappop(Heap)
+			if a != Area[i]:
+				continue	# 更新済み
+			if a >= Limit and (MaxPoints is None or Count <= MaxPoints):
+				break
 			
-			for ed in range(st + 2, len(self.Points)):
-				md = (st + ed) // 2
-				
-				dist = self.Distance(st, ed)
-				if dist < 5 or self.DistanceLine2Pix(st, md, ed) < 5:
-					del_ok = ed
-				else:
-					break
-			
-			if del_ok > 0:
-				for i in range(st, ed):
-					self.Points[i].DateTime = None
-				st = del_ok
-			else:
-				st += 1
+			p = Prev[i]
+			n = Next[i]
+			Next[p] = n
+			Prev[n] = p
+			Area[i] = None
+			Count -= 1
+			
+			# 削除した点の面積より小さくはしない
+			for j in (p, n):
+				if 0 < j < Num - 1:
+					Area[j] = max(CalcArea(j), a)
+					heapq.heappush(Heap, (Area[j], j))
+		
+		return [i for i in range(Num) if Area[i] is not None]
+	
+	def Reduce(self, Method = 'dp', Tolerance = REDUCE_TOLERANCE, MaxPoints = None):
+		if Method == 'dp':
+			Index = self.SimplifyDP(Tolerance, MaxPoints)
+		elif Method == 'vw':
+			Index = self.SimplifyVW(Tolerance, MaxPoints)
+		else:
+			raise GpsxException('Unknown reduce method: %s' % (Method,))
 		
-		PointsNew = []
-		for Point in self.Points:
-			if Point.DateTime:
-				PointsNew.append(Point)
+		Stats = {
+			'Method':		Method,
+			'Tolerance':	Tolerance,
+			'MaxPoints':	MaxPoints,
+			'Input':		len(self),
+			'Output':		len(Index),
+		}
 		
-		print("%d/%d" % (len(PointsNew), len(self.Points),))
-		self.Points = PointsNew
+		if len(Index) < len(self):
+			self.Compress(Index)
+		return Stats
+	
+	def ReduceSmart(self):
+		return self.Reduce('dp', self.REDUCE_TOLERANCE)
 	
 	#########################################################################
 	# 対応 format 取得
@@ -786,16 +1665,166 @@ class GpsLogClass:
 	def GetAvailableFormat(cls):
 		Format = [[], []]
 		
-		c = cls()
-		for key in c.FuncTbl.keys():
-			if c.FuncTbl[key][0]:
-				Format[0].append(key)
+		for f in FormatRegistry.List():
+			if f.Reader is not None:
+				Format[0].append(f.Name)
 			
-			if c.FuncTbl[key][1]:
-				Format[1].append(key)
+			if f.Writer is not None:
+				Format[1].append(f.Name)
 		
 		return Format
 
+##############################################################################
+# Path の byte 数 (ディレクトリは直下のファイルの合計，stdin や読めなければ 0)
+
+def PathSize(Path):
+	if Path is None or Path == '-':
+		return 0
+	if os.path.isdir(Path):
+		return sum(e.stat().st_size for e in os.scandir(Path) if e.is_file())
+	try:
+		return os.path.getsize(Path)
+	except OSError:
+		return 0
+
+##############################################################################
+# Path A と B が同じファイルか (stdin や存在しなければ False)
+
+def SameFile(A, B):
+	if A in (None, '-') or B in (None, '-'):
+		return False
+	try:
+		return os.path.samefile(A, B)
+	except OSError:
+		return False
+
+##############################################################################
+# 進捗の通知と中断
+# 読み込み (点数・byte 数)，派生データ生成，書き出し (点数・byte 数) の各段階で Update() し，
+# INTERVAL [s] 毎に Callback(self) を呼ぶ．Callback は変換を実行している thread から呼ばれる．
+# Cancel() は別 thread から呼んでよく，次の Update() で GpsxCancelException を送出する．
+
+class ProgressClass:
+	
+	INTERVAL = 0.1
+	
+	def __init__(self, Callback = None, Interval = INTERVAL):
+		self.Callback	= Callback
+		self.Interval	= Interval
+		self.Cancelled	= threading.Event()
+		self.Last		= 0.0
+		
+		self.Stage			= None	# read, derive, reduce, write, done
+		self.File			= None	# 処理中のファイル
+		self.Points			= 0		# 読み込んだ点数
+		self.Written		= 0		# 書き出した点数
+		self.BytesRead		= 0
+		self.BytesTotal		= 0		# 入力ファイルの合計サイズ (0: 不明)
+		self.BytesWritten	= 0
+	
+	def Cancel(self):
+		self.Cancelled.set()
+	
+	# 入力の読み込み済みの割合 (0～1，不明なら None)
+	@property
+	def Fraction(self):
+		return min(self.BytesRead / self.BytesTotal, 1.0) if self.BytesTotal else None
+	
+	def Status(self):
+		return {
+			'stage':			self.Stage,
+			'file':				self.File,
+			'points':			self.Points,
+			'written':			self.Written,
+			'bytes_read':		self.BytesRead,
+			'bytes_total':		self.BytesTotal,
+			'bytes_written':	self.BytesWritten,
+			'fraction':			self.Fraction,
+		}
+	
+	# 中断されていれば例外．Force でなければ Callback は INTERVAL 毎
+	def Update(self, Stage, Force = False, File = None):
+		if self.Cancelled.is_set():
+			raise GpsxCancelException('Cancelled')
+		
+		self.Stage = Stage
+		if File is not None:
+			self.File = File
+		
+		Now = time.monotonic()
+		if self.Callback and (Force or Now - self.Last >= self.Interval):
+			self.Last = Now
+			self.Callback(self)
+	
+	def Wrap(self, Name, Func):
+		def Wrapper(*Args, **KwArgs):
+			self.Update(Name)
+			return Func(*Args, **KwArgs)
+		return Wrapper
+	
+	# reader の chunk 毎に読み込んだ点数を通知する．読み終えたら byte 数はファイルサイズにする
+	def Reader(self, GpsLog, FileName, Reader):
+		self.Update('read', True, FileName)
+		Done	= GpsLog.Trimmed + len(GpsLog)
+		Base	= self.BytesRead
+		
+		for _ in Reader:
+			self.Points += GpsLog.Trimmed + len(GpsLog) - Done
+			Done = GpsLog.Trimmed + len(GpsLog)
+			self.Update('read')
+			yield
+		
+		self.BytesRead = Base + PathSize(FileName)
+		self.Update('read', True)
+	
+	# 入力の read() / 行の iteration で読んだ量を数える
+	def Input(self, FileIn):
+		Progress = self
+		
+		class Reader:
+			Checked = 0
+			
+			def read(self, *Args):
+				Data = FileIn.read(*Args)
+				Progress.BytesRead += len(Data)
+				Progress.Update('read')
+				return Data
+			
+			def __iter__(self):
+				return self
+			
+			def __next__(self):
+				Line = next(FileIn)
+				Progress.BytesRead += len(Line)
+				
+				# 1行毎ではなく READ_SIZE 毎に通知する
+				if Progress.BytesRead - self.Checked >= GpsLogClass.READ_SIZE:
+					self.Checked = Progress.BytesRead
+					Progress.Update('read')
+				return Line
+			
+			def __getattr__(self, Name):
+				return getattr(FileIn, Name)
+		
+		return Reader()
+	
+	# 出力の write() の byte 数を数える
+	@contextlib.contextmanager
+	def Output(self, Output):
+		Progress = self
+		
+		with Output as fh:
+			class Writer:
+				def write(self, Data):
+					Progress.BytesWritten += len(Data)
+					Progress.Update('write')
+					return fh.write(Data)
+				
+				def __getattr__(self, Name):
+					return getattr(fh, Name)
+			
+			yield Writer()
+
 ##############################################################################
 # process all file
 
@@ -811,38 +1840,306 @@ def Convert(Arg):
 	if not hasattr(Arg, 'cat'):
 		Arg.cat = False
 	
+	if not hasattr(Arg, 'reduce'):
+		Arg.reduce = None
+	if not hasattr(Arg, 'tolerance'):
+		Arg.tolerance = GpsLogClass.REDUCE_TOLERANCE
+	if not hasattr(Arg, 'max_points'):
+		Arg.max_points = None
+	if not hasattr(Arg, 'jobs'):
+		Arg.jobs = 1
+	if not hasattr(Arg, 'gzip_level'):
+		Arg.gzip_level = GZIP_LEVEL
+	if not hasattr(Arg, 'gzip_threads'):
+		Arg.gzip_threads = 1
+	if not hasattr(Arg, 'cache'):
+		Arg.cache = None
+	if not hasattr(Arg, 'cache_size'):
+		Arg.cache_size = CACHE_SIZE >> 20
+	if not hasattr(Arg, 'start'):
+		Arg.start = None
+	if not hasattr(Arg, 'end'):
+		Arg.end = None
+	if not hasattr(Arg, 'index'):
+		Arg.index = None
+	if not hasattr(Arg, 'profile'):
+		Arg.profile = None
+	if not hasattr(Arg, 'dedup'):
+		Arg.dedup = 'first'
+	if not hasattr(Arg, 'rate'):
+		Arg.rate = None
+	if not hasattr(Arg, 'interp'):
+		Arg.interp = 'linear'
+	if not hasattr(Arg, 'max_gap'):
+		Arg.max_gap = GpsLogClass.RESAMPLE_MAX_GAP
+	if not hasattr(Arg, 'gate'):
+		Arg.gate = None
+	if not hasattr(Arg, 'laps'):
+		Arg.laps = None
+	if not hasattr(Arg, 'watch'):
+		Arg.watch = None
+	if not hasattr(Arg, 'append'):
+		Arg.append = False
+	if not hasattr(Arg, 'progress'):
+		Arg.progress = None
+	
+	if Arg.append and GpsLogClass.GetFormat(Arg.output_file, Arg.output_format) != 'RaceChrono':
+		raise GpsxException('--append is only available for RaceChrono output')
+	
+	if bool(Arg.gate) != bool(Arg.laps):
+		raise GpsxException('--gate and --laps must be specified together')
+	
+	# 入力の追記を監視して出力に追記し続ける
+	if Arg.watch:
+		from gpsx_watch import WatchClass
+		WatchClass(Arg, Arg.watch).Run()
+		return None
+	
+	# 点数指定のみの場合は Douglas-Peucker
+	if Arg.max_points and not Arg.reduce:
+		Arg.reduce = 'dp'
+	
+	# 進捗の割合は入力ファイルの合計サイズに対する読み込み済みの byte 数
+	Progress = Arg.progress
+	if Progress:
+		Progress.BytesTotal = sum(PathSize(input_file) for input_file in Arg.input_file)
+	
 	# 全入力を 1出力にまとめる
 	if Arg.cat:
-		GpsLog = GpsLogClass()
+		GpsLog = NewGpsLog(Arg, ','.join(Arg.input_file))
+		Load(GpsLog, Arg.input_file, Arg.output_file, Arg)
+		Save(GpsLog, Arg.output_file, Arg)
+		if Arg.laps:
+			from gpsx_lap import LapTimerClass
+			LapTimerClass.Write(Arg.laps, GpsLog.LapTimer.Laps())
+		if Progress:
+			Progress.Update('done', True)
+		return GpsLog.Profile
 	
+	# 出力ファイル名の重複は並列時に結果が不定になるのでエラー
+	OutputFiles = {}
 	for input_file in Arg.input_file:
-		if not Arg.cat:
-			GpsLog = GpsLogClass()
-			output_file = input_file
-			if output_file.endswith('.gz'):
-				output_file = output_file[:-3]
-			
-			output_file = os.path.splitext(output_file)[0]
-			if Arg.output_format != 'RaceChrono':
-				output_file += '.' + Arg.output_format
-		
-		GpsLog.Read(input_file, Arg.input_format)
+		output_file = OutputFileName(input_file, Arg.output_format)
+		if output_file in OutputFiles:
+			raise GpsxException('Output file conflict: %s and %s -> %s' % (OutputFiles[output_file], input_file, output_file))
+		OutputFiles[output_file] = input_file
+	
+	Jobs = Arg.jobs or os.cpu_count() or 1
+	Jobs = min(Jobs, len(Arg.input_file))
+	
+	# 計測結果は各ファイルの結果を合算し，lap は入力順に並べる
+	Profile	= None
+	Laps	= []
+	if Arg.profile:
+		from gpsx_profile import ProfileClass
+		Profile = ProfileClass()
+	
+	# stdin は子プロセスに渡せないので直列
+	if Jobs <= 1 or '-' in Arg.input_file:
+		Results = []
+		for input_file in Arg.input_file:
+			try:
+				Result, FileLaps = ConvertFile(input_file, Arg)
+				if Profile: Profile.Merge(Result)
+				Laps += FileLaps
+				Results.append(None)
+			except GpsxCancelException:
+				raise
+			except Exception as Error:
+				Results.append(Error)
+	else:
+		# GUI の SimpleArg 等は pickle できるとは限らないので Namespace に詰め直す
+		# 進捗は子プロセスから通知できないので，ファイル単位で通知する
+		import argparse
+		import concurrent.futures
 		
-		if not Arg.cat:
-			GpsLog.Write(output_file, Arg.output_format)
+		JobArg = argparse.Namespace(**vars(Arg))
+		JobArg.progress = None
+		with concurrent.futures.ProcessPoolExecutor(max_workers = Jobs) as Executor:
+			Futures = [Executor.submit(ConvertFile, input_file, JobArg) for input_file in Arg.input_file]
+			Results = []
+			for input_file, Future in zip(Arg.input_file, Futures):
+				if Progress:
+					try:
+						Progress.Update('read', True, input_file)
+					except GpsxCancelException:
+						for Future in Futures:
+							Future.cancel()
+						raise
+				Results.append(Future.exception())
+				if Progress:
+					Progress.BytesRead += PathSize(input_file)
+			
+			for Future, Error in zip(Futures, Results):
+				if Error is None:
+					Result, FileLaps = Future.result()
+					if Profile: Profile.Merge(Result)
+					Laps += FileLaps
 	
-	if Arg.cat:
-		GpsLog.Write(Arg.output_file, Arg.output_format)
+	if Arg.laps:
+		from gpsx_lap import LapTimerClass
+		LapTimerClass.Write(Arg.laps, Laps)
+	if Progress:
+		Progress.Update('done', True)
 	
+	# エラーは入力順に報告し，1ファイルの失敗で全体を中断しない
+	Failed = [(input_file, Error) for input_file, Error in zip(Arg.input_file, Results) if Error is not None]
+	for input_file, Error in Failed:
+		print('%s: %s' % (input_file, Error), file = sys.stderr)
+	
+	if Failed:
+		raise GpsxException('%d of %d files failed' % (len(Failed), len(Arg.input_file)))
+	
+	return Profile
+
+def OutputFileName(input_file, output_format):
+	output_file = input_file
+	if output_file.endswith('.gz'):
+		output_file = output_file[:-3]
+	
+	output_file = os.path.splitext(output_file)[0]
+	Format = FormatRegistry.Get(output_format) if output_format else None
+	Ext = Format.OutputExt if Format else output_format
+	if Ext:
+		output_file += '.' + Ext
+	
+	return output_file
+
+# 1入力 → 1出力の変換，ProcessPoolExecutor から呼ばれる
+def ConvertFile(input_file, Arg):
+	GpsLog = NewGpsLog(Arg, input_file)
+	output_file = OutputFileName(input_file, Arg.output_format)
+	Load(GpsLog, (input_file,), output_file, Arg)
+	Save(GpsLog, output_file, Arg)
+	
+	# 計測結果と lap は process 間で渡せる dict / list で返す
+	return (
+		GpsLog.Profile.Result() if GpsLog.Profile else None,
+		GpsLog.LapTimer.Laps() if GpsLog.LapTimer else []
+	)
+
+# Arg の設定を反映した GpsLogClass．Session は lap の出力に記録する名前
+def NewGpsLog(Arg, Session = None):
+	GpsLog = GpsLogClass()
+	GpsLog.GzipLevel	= Arg.gzip_level
+	GpsLog.GzipThreads	= Arg.gzip_threads
+	GpsLog.StartTime	= Iso2Time(Arg.start) if Arg.start else None
+	GpsLog.EndTime		= Iso2Time(Arg.end) if Arg.end else None
+	GpsLog.TimeIndex	= Arg.index or 0
+	if Arg.cache:
+		from gpsx_cache import ParseCacheClass
+		GpsLog.Cache = ParseCacheClass(Arg.cache, Arg.cache_size << 20)
+	if Arg.gate:
+		from gpsx_lap import LapTimerClass
+		GpsLog.LapTimer = LapTimerClass(Arg.gate, Session)
+	if Arg.progress:
+		GpsLog.StartProgress(Arg.progress)
+	if Arg.profile:
+		GpsLog.StartProfile()
+	return GpsLog
+
+# 出力が streaming 可能なら chunk 毎に，そうでなければ全点を読む
+# resample と間引きは全点が必要なので streaming しない．出力で入力を上書きする時も全点を読む
+# 複数入力は時刻順に merge する
+def Load(GpsLog, InputFiles, OutputFile, Arg):
+	# 追記時は出力済みの最後の点 (走行距離の基準) 以降だけを読む
+	Tail = None
+	if Arg.append and GpsLog.StartTime is None:
+		import gpsx_racechrono
+		Tail = gpsx_racechrono.SessionTail(OutputFile)
+		if Tail:
+			GpsLog.StartTime = Tail[0]
+	
+	# 出力が入力と同じファイルの時に streaming すると，読み終わる前に入力を切り詰めてしまう
+	Overwrite = any(SameFile(input_file, OutputFile) for input_file in InputFiles)
+	
+	if not Arg.reduce and not Arg.rate and not Overwrite and GpsLog.IsStreamable(OutputFile, Arg.output_format):
+		GpsLog.OpenStream(InputFiles, Arg.input_format, Arg.dedup)
+		return
+	
+	try:
+		if len(InputFiles) > 1:
+			GpsLog.ReadMerge(InputFiles, Arg.input_format, Arg.dedup)
+		else:
+			GpsLog.Read(InputFiles[0], Arg.input_format)
+	except GpsxNoInputException:
+		# 追記する新しい点が無い
+		if Tail is None:
+			raise
+		return
+	
+	if Arg.rate:
+		GpsLog.Resample(Arg.rate, Arg.interp, Arg.max_gap)
+	
+	if Arg.reduce:
+		GpsLog.Reduce(Arg.reduce, Arg.tolerance, Arg.max_points)
+
+# 計時線の文字列 (緯度1,経度1,緯度2,経度2)
+def ParseGate(Str):
+	try:
+		Gate = tuple(float(v) for v in Str.split(','))
+	except ValueError:
+		Gate = ()
+	
+	if len(Gate) != 4:
+		import argparse
+		raise argparse.ArgumentTypeError('invalid gate: %s (lat1,lng1,lat2,lng2)' % (Str,))
+	return Gate
+
+# 周期 [Hz] の文字列 (10Hz / 10)
+def ParseRate(Str):
+	Match = re.fullmatch(r'\s*([0-9.]+)\s*(?:hz)?\s*', Str, re.IGNORECASE)
+	try:
+		Rate = float(Match.group(1)) if Match else 0
+	except ValueError:
+		Rate = 0
+	
+	if not Rate > 0:
+		import argparse
+		raise argparse.ArgumentTypeError('invalid rate: %s' % (Str,))
+	return Rate
+
+# --append では既存の出力に新しい点だけを追記する
+def Save(GpsLog, OutputFile, Arg):
+	if Arg.append:
+		GpsLog.WriteAppend(OutputFile, Arg.output_format)
+	else:
+		GpsLog.Write(OutputFile, Arg.output_format)
+
 ##############################################################################
 # main
 if __name__ == '__main__':
 	
+	# GUI 等から import する時は使わないので，起動時間短縮のためここで import する
+	import argparse
+	
 	ArgParser = argparse.ArgumentParser(description = 'GPS log converter')
 	ArgParser.add_argument('input_file', nargs = '*', help = 'input files')
 	ArgParser.add_argument('-I', metavar = 'input_format', dest = 'input_format', help = 'input format')
 	ArgParser.add_argument('-O', metavar = 'output_format', dest = 'output_format', help = 'output format')
 	ArgParser.add_argument('-o', metavar = 'output_file', dest = 'output_file', help = 'output file')
+	ArgParser.add_argument('-r', '--reduce', choices = ('dp', 'vw'), help = 'reduce points (dp: Douglas-Peucker, vw: Visvalingam-Whyatt)')
+	ArgParser.add_argument('--tolerance', metavar = 'meter', type = float, default = GpsLogClass.REDUCE_TOLERANCE, help = 'reduce tolerance [m] (default: %(default)s)')
+	ArgParser.add_argument('--max-points', metavar = 'num', dest = 'max_points', type = int, help = 'reduce to at most num points')
+	ArgParser.add_argument('-j', '--jobs', metavar = 'N', type = int, default = 1, help = 'convert N files in parallel without -o (0: number of CPUs)')
+	ArgParser.add_argument('--gzip-level', metavar = 'level', dest = 'gzip_level', type = int, choices = range(10), default = GZIP_LEVEL, help = '.gz output compression level 0-9 (default: %(default)s)')
+	ArgParser.add_argument('--gzip-threads', metavar = 'N', dest = 'gzip_threads', type = int, default = 1, help = '.gz output compression threads (0: number of CPUs, default: %(default)s)')
+	ArgParser.add_argument('--cache', metavar = 'dir', help = 'cache parsed input in dir (gpsx format)')
+	ArgParser.add_argument('--cache-size', metavar = 'MiB', dest = 'cache_size', type = int, default = CACHE_SIZE >> 20, help = 'cache size limit [MiB] (default: %(default)s)')
+	ArgParser.add_argument('--start', metavar = 'time', help = 'read points at or after time (ISO 8601, default UTC)')
+	ArgParser.add_argument('--end', metavar = 'time', help = 'read points at or before time (ISO 8601, default UTC)')
+	ArgParser.add_argument('--index', metavar = 'sec', type = float, nargs = '?', const = INDEX_INTERVAL, help = 'seek nmea/vsd input by a sidecar time index every sec seconds (default: %(const)s)')
+	ArgParser.add_argument('--rate', metavar = 'Hz', type = ParseRate, help = 'resample to a fixed rate (e.g. 10Hz)')
+	ArgParser.add_argument('--interp', choices = GpsLogClass.RESAMPLE, default = 'linear', help = 'resample interpolation (default: %(default)s)')
+	ArgParser.add_argument('--max-gap', metavar = 'sec', dest = 'max_gap', type = float, default = GpsLogClass.RESAMPLE_MAX_GAP, help = 'do not resample across gaps longer than sec (default: %(default)s)')
+	ArgParser.add_argument('--gate', metavar = 'lat1,lng1,lat2,lng2', type = ParseGate, action = 'append', help = 'timing line; the first is start/finish, the rest split sectors (repeatable)')
+	ArgParser.add_argument('--laps', metavar = 'file', help = 'write lap and sector times to file (.json: JSON, otherwise CSV, -: stdout)')
+	ArgParser.add_argument('--watch', metavar = 'sec', type = float, nargs = '?', const = WATCH_INTERVAL, help = 'keep converting data appended to nmea/vsd input files or directories, checking every sec seconds (default: %(const)s)')
+	ArgParser.add_argument('--append', action = 'store_true', help = 'append only points newer than the existing RaceChrono session')
+	ArgParser.add_argument('--dedup', choices = GpsLogClass.DEDUP, default = 'first', help = 'with -o, merge inputs by time and keep the first / last / all points with the same time (default: %(default)s)')
+	ArgParser.add_argument('--profile', nargs = '?', const = 'table', choices = ('table', 'json'), help = 'print time, points, bytes and memory growth of each stage and the process peak RSS to stderr (default: table)')
 	Arg = ArgParser.parse_args()
 	
-	Convert(Arg)
+	Profile = Convert(Arg)
+	if Profile:
+		print(Profile.Report(Arg.profile), file = sys.stderr)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# 入力の parse 結果 cache
+# 入力ファイルのパス, サイズ, mtime, 内容の hash を key に，読み込んだ点を gpsx 形式で
+# Dir に保存する．合計サイズが MaxSize を超えたら最も古く使われたものから消す．
+# --cache を指定した時だけ import する
+
+import contextlib
+import hashlib
+import os
+
+import gpsx_native
+from gpsx import CACHE_SIZE
+
+class ParseCacheClass:
+	
+	MAX_SIZE = CACHE_SIZE
+	
+	def __init__(self, Dir, MaxSize = MAX_SIZE):
+		self.Dir		= Dir
+		self.MaxSize	= MaxSize
+		os.makedirs(Dir, exist_ok = True)
+	
+	# 通常ファイル以外 (stdin, RaceChrono のディレクトリ) は None
+	def Key(self, FileName, Format):
+		if FileName == '-' or not os.path.isfile(FileName):
+			return None
+		
+		Stat = os.stat(FileName)
+		Hash = hashlib.blake2b(digest_size = 20)
+		Hash.update(repr((os.path.abspath(FileName), Format, Stat.st_size, Stat.st_mtime_ns)).encode())
+		
+		with open(FileName, 'rb') as FileIn:
+			while True:
+				Data = FileIn.read(1 << 20)
+				if not Data:
+					break
+				Hash.update(Data)
+		
+		return Hash.hexdigest()
+	
+	def FileName(self, Key):
+		return os.path.join(self.Dir, Key + '.gpsx')
+	
+	# cache があればそのファイル名を返す．LRU のため mtime を更新する
+	def Lookup(self, Key):
+		FileName = self.FileName(Key)
+		try:
+			os.utime(FileName)
+		except OSError:
+			return None
+		return FileName
+	
+	def Store(self, Key, GpsLog):
+		FileName = self.FileName(Key)
+		TmpName = '%s.%d.tmp' % (FileName, os.getpid())
+		
+		# 並列変換時に書きかけを読まないよう rename で置き換える
+		try:
+			gpsx_native.Write(GpsLog, TmpName)
+			os.replace(TmpName, FileName)
+		except OSError:
+			with contextlib.suppress(OSError):
+				os.remove(TmpName)
+			return
+		
+		self.Evict()
+	
+	def Evict(self):
+		Entry = []
+		with os.scandir(self.Dir) as It:
+			for e in It:
+				if e.name.endswith('.gpsx') and e.is_file():
+					Stat = e.stat()
+					Entry.append((Stat.st_mtime_ns, Stat.st_size, e.path))
+		
+		Size = 0
+		for _, EntrySize, Path in sorted(Entry, reverse = True):
+			Size += EntrySize
+			if Size > self.MaxSize:
+				with contextlib.suppress(OSError):
+					os.remove(Path)
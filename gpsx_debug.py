@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+
+# Points dumper
+# gpsx の format registry に 'gpsx_debug:Write' (dbg) として登録する
+
+def Write(GpsLog, FileName):
+	with GpsLog.OpenOutput(FileName, 'wt') as FileOut:
+		FileOut.write(str(GpsLog.Points).replace(',', '\n'))
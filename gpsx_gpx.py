@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+# GPX reader/writer
+# gpsx の format registry に 'gpsx_gpx:Read' / 'gpsx_gpx:Write' として登録する
+
+import re
+
+from gpsx import Iso2Time, Time2Iso
+
+_Trkpt	= re.compile('<trkpt.*?</trkpt>', flags = re.DOTALL)
+_Time	= re.compile(r'<time>\s*(\S+?)\s*</')
+_Lat	= re.compile(r'lat="(.*?)"')
+_Lon	= re.compile(r'lon="(.*?)"')
+_Ele	= re.compile(r'<ele>\s*(\S+?)\s*</')
+_Speed	= re.compile(r'<speed>\s*(\S+?)\s*</')
+_Course	= re.compile(r'<course>\s*(\S+?)\s*</')
+
+def Read(GpsLog, FileName):
+	with GpsLog.OpenInput(FileName, 'rt') as FileIn:
+		for Match in GpsLog.IterMatch(FileIn, _Trkpt):
+			# match 部分をコピーせずに検索する
+			Param = (Match.string, Match.start(), Match.end())
+			
+			Time = _Time.search(*Param)
+			Lat  = _Lat.search(*Param)
+			Lon  = _Lon.search(*Param)
+			if not Time or not Lat or not Lon:
+				continue
+			
+			Ele		= _Ele.search(*Param)
+			Speed	= _Speed.search(*Param)
+			Course	= _Course.search(*Param)
+			
+			GpsLog.AppendPoint(
+				Iso2Time(Time.group(1)),
+				float(Lon.group(1)),
+				float(Lat.group(1)),
+				float(Ele.group(1)) if Ele else None,
+				float(Speed.group(1)) * 3.6 if Speed else None,
+				float(Course.group(1)) if Course else None,
+			)
+			if GpsLog.ChunkFull(): yield
+	yield
+
+def Write(GpsLog, FileName):
+	with GpsLog.OpenOutput(FileName, 'wt') as FileOut:
+		for Start, End in GpsLog.TextChunks(GpsLog.GenSpeed, GpsLog.GenAltitude, GpsLog.GenBearing):
+			
+			if Start == 0:
+				FileOut.write(
+					'<?xml version="1.0"?><gpx version="1.0" creator="GPSLogger - http://gpslogger.mendhak.com/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="http://www.topografix.com/GPX/1/0" xsi:schemaLocation="http://www.topografix.com/GPX/1/0 http://www.topografix.com/GPX/1/0/gpx.xsd"><time>%s</time><bounds /><trk><trkseg>\n' % (
+						Time2Iso(GpsLog.Time[0])
+					)
+				)
+			
+			FileOut.write(''.join(GpsLog.TextLines(
+				'<trkpt lat="%.8f" lon="%.8f"><ele>%.3f</ele><course>%.2f</course><speed>%.3f</speed><time>%s%02d:%02d.%03d+00:00</time></trkpt>\n',
+				GpsLog.TextColumn('Latitude', Start, End), GpsLog.TextColumn('Longitude', Start, End),
+				GpsLog.TextColumn('Altitude', Start, End), GpsLog.TextColumn('Bearing', Start, End),
+				GpsLog.TextColumn('Speed', Start, End, 3.6), *GpsLog.TextTime(Start, End, '%Y-%m-%dT%H:')
+			)))
+		
+		FileOut.write('</trkseg></trk></gpx>\n')
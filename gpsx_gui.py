@@ -5,12 +5,14 @@ from kivy.app import App
 from kivy.lang import Builder
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.popup import Popup
-from kivy.properties import ObjectProperty, StringProperty, BooleanProperty
+from kivy.properties import ObjectProperty, StringProperty, BooleanProperty, NumericProperty
 from kivy.uix.popup import Popup
 from kivy.clock import Clock
 
 import datetime
 import os
+import queue
+import threading
 import gpsx
 
 Builder.load_string('''
@@ -58,11 +60,48 @@ Builder.load_string('''
 		height: '100sp'
 		size_hint: 1.0, None
 	
-	Button:
+	BoxLayout:
+		orientation: 'horizontal'
 		height: '50sp'
-		size_hint: 1, None
-		text: 'Convert'
-		on_press: root.ConvertButtonPressed()
+		size_hint: 1.0, None
+		
+		Button:
+			text: 'Convert'
+			size_hint: 1, 1
+			on_press: root.ConvertButtonPressed()
+		
+		CheckBox:
+			id: profile
+			width: '30sp'
+			size_hint: None, 1.0
+		
+		Label:
+			text: 'Profile'
+			width: '70sp'
+			size_hint: None, 1.0
+	
+	BoxLayout:
+		orientation: 'horizontal'
+		height: '40sp'
+		size_hint: 1.0, None
+		
+		ProgressBar:
+			max: 1000
+			value: root.ProgressValue
+		
+		Button:
+			text: 'Cancel'
+			width: '100sp'
+			size_hint: None, 1.0
+			disabled: not root.Busy
+			on_press: root.CancelButtonPressed()
+	
+	Label:
+		text: root.Status
+		height: '30sp'
+		size_hint: 1.0, None
+		halign: 'left'
+		text_size: self.size
 	
 	Label:
 		text: 'Log'
@@ -159,12 +198,24 @@ class SimpleArg():
 		self.input_format	= None
 		self.output_file	= None
 		self.output_format	= None
+		self.profile		= None
+		self.progress		= None
 
 class MainWidget(BoxLayout):
-	Log			= StringProperty('* GPS log converter\n')
+	Log				= StringProperty('* GPS log converter\n')
+	Status			= StringProperty('')
+	ProgressValue	= NumericProperty(0)
+	Busy			= BooleanProperty(False)
 	
 	def __init__(self, **kwargs):
 		super(MainWidget, self).__init__(**kwargs)
+		
+		# 変換は worker thread で 1つずつ実行し，UI の更新は Clock で main thread に戻す
+		self.Jobs		= queue.Queue()
+		self.Current	= None	# 実行中の job の ProgressClass
+		self.Pending	= 0		# 投入して OnJobEnd() がまだの job 数 (main thread でだけ増減する)
+		threading.Thread(target = self.ConvertWorker, daemon = True).start()
+		
 		FormatList = gpsx.GpsLogClass.GetAvailableFormat()
 		FormatList[0].insert(0, 'auto')
 		FormatList[1].insert(0, 'auto')
@@ -238,18 +289,87 @@ class MainWidget(BoxLayout):
 		if Arg.output_format == 'auto':
 			Arg.output_format = None
 		
-		self.Log += ('* Start log converting...\n' +
+		if self.ids['profile'].active:
+			Arg.profile = 'table'
+		
+		self.Log += ('* Log converting queued\n' +
 			'  in: %s format=%s\n' +
 			'  out: %s format=%s\n') % (
 				Arg.input_file,  Arg.input_format,
 				Arg.output_file, Arg.output_format
 			)
 		
-		try:
-			gpsx.Convert(Arg)
-			self.Log += '* done.\n'
-		except Exception as Error:
-			self.Log += '* Error: ' + str(Error) + '\n'
+		self.Jobs.put(Arg)
+		self.Pending += 1
+		self.Busy = True
+		self.UpdateStatus()
+	
+	def CancelButtonPressed(self):
+		Progress = self.Current
+		if Progress:
+			Progress.Cancel()
+			self.Log += '* Cancelling...\n'
+	
+	##########################################################################
+	# worker thread
+	
+	def ConvertWorker(self):
+		while True:
+			Arg = self.Jobs.get()
+			Arg.progress = gpsx.ProgressClass(self.OnProgress)
+			self.Current = Arg.progress
+			self.Post(self.OnJobStart, Arg)
+			
+			try:
+				Profile = gpsx.Convert(Arg)
+				Log = '* done.\n'
+				if Profile:
+					Log += Profile.Table() + '\n'
+			except gpsx.GpsxCancelException:
+				Log = '* Cancelled.\n'
+			except Exception as Error:
+				Log = '* Error: ' + str(Error) + '\n'
+			
+			self.Current = None
+			self.Post(self.OnJobEnd, Log)
+	
+	# worker thread から Func(*Args) を main thread で呼ぶ
+	def Post(self, Func, *Args):
+		Clock.schedule_once(lambda dt: Func(*Args))
+	
+	# worker thread から呼ばれる
+	def OnProgress(self, Progress):
+		self.Post(self.UpdateStatus, Progress.Status())
+	
+	def OnJobStart(self, Arg):
+		self.Busy = True
+		self.ProgressValue = 0
+		self.Log += '* Start log converting...\n'
+		self.UpdateStatus()
+	
+	def OnJobEnd(self, Log):
+		self.Log += Log
+		
+		# Current / Jobs は worker thread が書き換え中のことがあるので見ない
+		self.Pending -= 1
+		self.Busy = self.Pending > 0
+		self.UpdateStatus()
+	
+	def UpdateStatus(self, Status = None):
+		Queued = self.Jobs.qsize()
+		Text = '(queued: %d)' % (Queued,) if Queued else ''
+		
+		if Status and self.Current:
+			if Status['fraction'] is not None:
+				self.ProgressValue = Status['fraction'] * 1000
+			Text = '%s %s: %d points, %.1f / %.1f MiB %s' % (
+				Status['stage'], os.path.basename(Status['file'] or ''), Status['points'],
+				Status['bytes_read'] / (1 << 20), Status['bytes_total'] / (1 << 20), Text
+			)
+		elif not self.Busy:
+			self.ProgressValue = 0
+		
+		self.Status = Text
 	
 class MyApp(App):
 	title = 'GPSX - gps log converter'
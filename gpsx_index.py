@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+# 時刻 index
+# Interval 秒毎に時刻 → 行頭の byte offset を記録し，FileName + '.gpsxidx' に保存する．
+# 入力のサイズ, mtime が変わったら作り直す．
+# .gz は gzip member の先頭からしか展開を再開できないので，行を含む member の
+# 圧縮 offset も記録する (gpsx の --gzip-threads 出力は 1MiB 毎の multi member)．
+#
+# index の 1要素: [時刻, 展開後の offset, 行を含む member の圧縮 offset, その member の展開後の offset]
+#
+# --index を指定した時 (と --watch で追記分を読む時) だけ import する
+
+import contextlib
+import gzip
+import io
+import json
+import os
+import re
+import zlib
+from math import inf
+
+from gpsx import GpsLogClass, INDEX_INTERVAL, Hour2Time, Iso2Time, smart_open
+
+# 入力の一部 (Size byte) だけを読む file object
+
+# fh は close しない
+class RangeFile(io.RawIOBase):
+	
+	def __init__(self, fh, Size = None):
+		self.fh		= fh
+		self.Remain	= Size
+	
+	def readable(self):
+		return True
+	
+	def readinto(self, Buf):
+		Size = len(Buf) if self.Remain is None else min(len(Buf), self.Remain)
+		if Size <= 0:
+			return 0
+		
+		Data = self.fh.read(Size)
+		Buf[:len(Data)] = Data
+		if self.Remain is not None:
+			self.Remain -= len(Data)
+		return len(Data)
+
+class TimeIndexClass:
+	
+	VERSION		= 1
+	INTERVAL	= INDEX_INTERVAL
+	
+	# format 毎の時刻を含む行
+	Pattern = {
+		'nmea':	re.compile(rb'^\$[A-Z]{2}RMC,(\d{6}(?:\.\d*)?),(?:[^,*\r\n]*,){7}(\d{6})', re.M),
+		'vsd':	re.compile(rb'^GPS\t([^\t\r\n]+)', re.M),
+		'log':	re.compile(rb'^GPS\t([^\t\r\n]+)', re.M),
+	}
+	
+	def __init__(self, FileName, Format, Interval):
+		self.FileName	= FileName
+		self.Format		= Format
+		self.Interval	= int(Interval * 1000)
+		self.Index		= None	# 時刻が単調増加でなければ None
+		
+		if FileName == '-' or not os.path.isfile(FileName):
+			return
+		
+		if not self.Load():
+			self.Build()
+			self.Save()
+	
+	def IndexFileName(self):
+		return self.FileName + '.gpsxidx'
+	
+	def Stat(self):
+		Stat = os.stat(self.FileName)
+		return {
+			'version':	self.VERSION,
+			'format':	self.Format,
+			'interval':	self.Interval,
+			'size':		Stat.st_size,
+			'mtime_ns':	Stat.st_mtime_ns,
+		}
+	
+	def Load(self):
+		try:
+			with open(self.IndexFileName(), 'rt') as FileIn:
+				Index = json.load(FileIn)
+		except (OSError, ValueError):
+			return False
+		
+		if Index.get('source') != self.Stat():
+			return False
+		
+		self.Index = Index['index']
+		return True
+	
+	def Save(self):
+		try:
+			with open(self.IndexFileName(), 'wt') as FileOut:
+				json.dump({'source': self.Stat(), 'index': self.Index}, FileOut, separators = (',', ':'))
+		except OSError:
+			pass
+	
+	# 行の時刻 [ms]
+	def Time(self, Match):
+		if self.Format == 'nmea':
+			Time	= float(Match.group(1))
+			Ms		= int(Time * 1000 + 0.5) % 1000
+			Time	= int(Time)
+			Date	= int(Match.group(2))
+			
+			return Hour2Time(
+				Date % 100 + 2000, Date // 100 % 100, Date // 10000, Time // 10000
+			) + Time // 100 % 100 * 60000 + Time % 100 * 1000 + Ms
+		
+		return Iso2Time(Match.group(1).decode())
+	
+	# 展開したデータを (Data, 先頭の展開後の offset, member の圧縮 offset, member の展開後の offset) 毎に返す
+	# 非圧縮ファイルでは member は None
+	def IterBlock(self):
+		with open(self.FileName, 'rb') as FileIn:
+			Pos = 0
+			
+			if not self.FileName.endswith('.gz'):
+				while True:
+					Data = FileIn.read(GpsLogClass.READ_SIZE)
+					if not Data:
+						return
+					yield Data, Pos, None, None
+					Pos += len(Data)
+			
+			Raw			= 0	# 読んだ圧縮データの byte 数
+			MemberRaw	= 0
+			MemberPos	= 0
+			Decomp		= zlib.decompressobj(31)
+			
+			while True:
+				Buf = FileIn.read(GpsLogClass.READ_SIZE)
+				if not Buf:
+					return
+				
+				while Buf:
+					try:
+						Data = Decomp.decompress(Buf)
+					except zlib.error:
+						# member 後の padding 等
+						return
+					
+					yield Data, Pos, MemberRaw, MemberPos
+					Pos += len(Data)
+					
+					if not Decomp.eof:
+						Raw += len(Buf)
+						break
+					
+					Raw += len(Buf) - len(Decomp.unused_data)
+					Buf = Decomp.unused_data
+					MemberRaw	= Raw
+					MemberPos	= Pos
+					Decomp		= zlib.decompressobj(31)
+	
+	def Build(self):
+		Pattern	= self.Pattern[self.Format]
+		Index	= []
+		Next	= -inf	# 次に記録する時刻
+		Prev	= -inf
+		Rest	= b''
+		RestMember = None
+		
+		for Data, Pos, MemberRaw, MemberPos in self.IterBlock():
+			Chunk	= Rest + Data
+			Base	= Pos - len(Rest)	# Chunk 先頭の展開後の offset
+			End		= Chunk.rfind(b'\n') + 1
+			
+			for Match in Pattern.finditer(Chunk, 0, End):
+				try:
+					Time = self.Time(Match)
+				except ValueError:
+					continue
+				
+				if Time < Prev:
+					self.Index = None
+					return
+				Prev = Time
+				
+				if Time >= Next:
+					Offset = Base + Match.start()
+					
+					# 前の block から持ち越した行は前の member に属する
+					if MemberRaw is None:
+						Member = (Offset, Offset)
+					elif Match.start() < len(Rest):
+						Member = RestMember
+					else:
+						Member = (MemberRaw, MemberPos)
+					
+					Index.append([Time, Offset, *Member])
+					Next = Time + self.Interval
+			
+			# 持ち越す行の先頭が今回の block にあれば今回の member
+			if End or not Rest:
+				RestMember = (MemberRaw, MemberPos)
+			Rest = Chunk[End:]
+		
+		self.Index = Index
+	
+	# StartTime ～ EndTime の点を読むための (member の圧縮 offset, 読み飛ばす byte 数, 読む byte 数)
+	# 読む byte 数が None なら最後まで．index が無ければ None
+	def Range(self, StartTime, EndTime):
+		if not self.Index:
+			return None
+		
+		# 先頭: StartTime より前の最後の index，末尾: EndTime より後の最初の index
+		Start = [0, 0, 0, 0]
+		End = None
+		for Entry in self.Index:
+			if StartTime is not None and Entry[0] < StartTime:
+				Start = Entry
+			if EndTime is not None and Entry[0] > EndTime:
+				End = Entry
+				break
+		
+		return (Start[2], Start[1] - Start[3], None if End is None else End[1] - Start[1])
+	
+	# Range の範囲を読む file object
+	@staticmethod
+	@contextlib.contextmanager
+	def Open(FileName, Mode, Range = None):
+		if Range is None:
+			with smart_open(FileName, Mode) as fh:
+				yield fh
+			return
+		
+		MemberRaw, Skip, Size = Range
+		
+		with contextlib.ExitStack() as Stack:
+			fh = Stack.enter_context(open(FileName, 'rb'))
+			fh.seek(MemberRaw)
+			
+			if FileName.endswith('.gz'):
+				fh = Stack.enter_context(gzip.GzipFile(fileobj = fh, mode = 'rb'))
+			
+			while Skip > 0:
+				Data = fh.read(min(Skip, GpsLogClass.READ_SIZE))
+				if not Data:
+					break
+				Skip -= len(Data)
+			
+			fh = io.BufferedReader(RangeFile(fh, Size), GpsLogClass.READ_SIZE)
+			if 'b' not in Mode:
+				fh = io.TextIOWrapper(fh)
+			
+			yield fh
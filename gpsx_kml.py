@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+# KML reader/writer
+# gpsx の format registry に 'gpsx_kml:Read' / 'gpsx_kml:Write' (kml)，
+# 'gpsx_kml:WriteTrack' (kmltrack) として登録する
+
+import datetime
+import re
+
+from gpsx import Iso2Time, Time2Iso
+
+# <Placemark> の <when>, <Point> の <coordinates> と，
+# gx:Track の <when>, <gx:coord>, ExtendedData の <gx:value> を token として読む
+_Token = re.compile(
+	r'<(/?)(Placemark|gx:Track)\b'										# 1, 2: 開始 / 終了
+	r'|<when>\s*(\S+?)\s*</'											# 3: 時刻
+	r'|<coordinates>\s*([\d\.\-]+),([\d\.\-]+)(?:,([\d\.\-]+))?\s*</'	# 4, 5, 6: 1点の座標
+	r'|<gx:coord>\s*([^\s<]+)\s+([^\s<]+)(?:\s+([^\s<]+))?\s*</'		# 7, 8, 9: gx:Track の座標
+	r'|<gx:SimpleArrayData\s+name="([^"]*)"'							# 10: ExtendedData の channel 名
+	r'|<gx:value>\s*([^<]*?)\s*</'										# 11: ExtendedData の値
+)
+
+# gx:Track の ExtendedData の channel 名 → AppendPoint() の引数位置 (経度 = 0)
+TrackChannel = {'speed': 3, 'bearing': 4}
+
+def Read(GpsLog, FileName):
+	with GpsLog.OpenInput(FileName, 'rt') as FileIn:
+		InTrack		= False
+		When		= None
+		Coord		= None
+		TrackTime	= []
+		TrackCoord	= []
+		TrackArray	= {}
+		Value		= None
+		
+		for m in GpsLog.IterMatch(FileIn, _Token):
+			if m.group(2) == 'gx:Track':
+				# ExtendedData は <gx:coord> の後にあるので，</gx:Track> で全点確定
+				if m.group(1):
+					for Point in TrackPoints(TrackTime, TrackCoord, TrackArray):
+						GpsLog.AppendPoint(*Point)
+						if GpsLog.ChunkFull(): yield
+				
+				InTrack = not m.group(1)
+				TrackTime	= []
+				TrackCoord	= []
+				TrackArray	= {}
+				Value		= None
+			
+			elif m.group(2):
+				# </Placemark> で 1点確定
+				if m.group(1) and When is not None and Coord is not None:
+					GpsLog.AppendPoint(When, *Coord)
+					if GpsLog.ChunkFull(): yield
+				When = Coord = None
+			
+			elif m.group(3):
+				if InTrack:
+					TrackTime.append(Iso2Time(m.group(3)))
+				elif When is None:
+					When = Iso2Time(m.group(3))
+			
+			elif m.group(4):
+				if Coord is None:
+					Coord = (
+						float(m.group(4)), float(m.group(5)),
+						float(m.group(6)) if m.group(6) else None
+					)
+			
+			elif not InTrack:
+				pass
+			
+			elif m.group(7):
+				TrackCoord.append((
+					float(m.group(7)), float(m.group(8)),
+					float(m.group(9)) if m.group(9) else None
+				))
+			
+			elif m.group(10) is not None:
+				Value = TrackArray.setdefault(m.group(10), []) if m.group(10) in TrackChannel else None
+			
+			elif Value is not None:
+				Value.append(float(m.group(11)) if m.group(11) else None)
+	yield
+
+# gx:Track の <when> と <gx:coord> を順に組にし，ExtendedData の値を付加する
+# 点数が一致しない ExtendedData の channel は無視する
+def TrackPoints(TrackTime, TrackCoord, TrackArray):
+	Num = min(len(TrackTime), len(TrackCoord))
+	Array = [
+		(TrackChannel[Name], Value) for Name, Value in TrackArray.items()
+		if len(Value) == Num
+	]
+	
+	for i in range(Num):
+		Point = [*TrackCoord[i], None, None]
+		for Pos, Value in Array:
+			Point[Pos] = Value[i]
+		yield (TrackTime[i], *Point)
+
+def Write(GpsLog, FileName):
+	with GpsLog.OpenOutput(FileName, 'wt') as FileOut:
+		
+		GpsLog.GenSpeed()
+		GpsLog.GenAltitude()
+		GpsLog.GenBearing()
+		GpsLog.GenDistance()
+		
+		FileOut.write('''\
+<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2"
+		xmlns:gx="http://www.google.com/kml/ext/2.2">
+	<Document>
+		<name>GPS device</name>
+		<snippet>Created {now}</snippet>
+		<LookAt>
+			<gx:TimeSpan>
+				<begin>{start}</begin>
+				<end>{end}</end>
+			</gx:TimeSpan>
+			<longitude>kml</longitude>
+			<latitude>{lat}</latitude>
+			<range>1300.000000</range>
+		</LookAt>
+<!-- Normal track style -->
+		<Style id="track_n">
+			<IconStyle>
+				<scale>.5</scale>
+				<Icon>
+					<href>http://earth.google.com/images/kml-icons/track-directional/track-none.png</href>
+				</Icon>
+			</IconStyle>
+			<LabelStyle>
+				<scale>0</scale>
+			</LabelStyle>
+		</Style>
+<!-- Highlighted track style -->
+		<Style id="track_h">
+			<IconStyle>
+				<scale>1.2</scale>
+				<Icon>
+					<href>http://earth.google.com/images/kml-icons/track-directional/track-none.png</href>
+				</Icon>
+			</IconStyle>
+		</Style>
+		<StyleMap id="track">
+			<Pair>
+				<key>normal</key>
+				<styleUrl>#track_n</styleUrl>
+			</Pair>
+			<Pair>
+				<key>highlight</key>
+				<styleUrl>#track_h</styleUrl>
+			</Pair>
+		</StyleMap>
+<!-- Normal waypoint style -->
+		<Style id="waypoint_n">
+			<IconStyle>
+				<Icon>
+					<href>http://maps.google.com/mapfiles/kml/pal4/icon61.png</href>
+				</Icon>
+			</IconStyle>
+		</Style>
+<!-- Highlighted waypoint style -->
+		<Style id="waypoint_h">
+			<IconStyle>
+				<scale>1.2</scale>
+				<Icon>
+					<href>http://maps.google.com/mapfiles/kml/pal4/icon61.png</href>
+				</Icon>
+			</IconStyle>
+		</Style>
+		<StyleMap id="waypoint">
+			<Pair>
+				<key>normal</key>
+				<styleUrl>#waypoint_n</styleUrl>
+			</Pair>
+			<Pair>
+				<key>highlight</key>
+				<styleUrl>#waypoint_h</styleUrl>
+			</Pair>
+		</StyleMap>
+		<Style id="lineStyle">
+			<LineStyle>
+				<color>FFFFFF00</color>
+				<width>1</width>
+			</LineStyle>
+		</Style>
+		<Folder>
+			<name>Tracks</name>
+			<Folder>
+				<snippet/>
+				<description>
+					<![CDATA[<table>
+						<tr><td><b>Distance</b>{dist}m</td></tr>
+						<tr><td><b>Start Time</b>{start}</td></tr>
+						<tr><td><b>End Time</b>{end}</td></tr>
+					</table>]]>
+				</description>
+				<TimeSpan>
+					<begin>{start}</begin>
+					<end>{end}</end>
+				</TimeSpan>
+				<Folder>
+					<name>Points</name>
+'''					.format(
+					now		= str(datetime.datetime.now()),
+					start	= Time2Iso(GpsLog.Time[0]),
+					end		= Time2Iso(GpsLog.Time[-1]),
+					lat		= '%.8f' % (GpsLog.Latitude[0],),
+					lng		= '%.8f' % (GpsLog.Longitude[0],),
+					dist	= '%.2f' % (GpsLog.Distance[-1]),
+				)
+			)
+		
+		# 点毎の Placemark
+		# {0}: 経度 {1}: 緯度 {2}: 速度 {3}: 高度 {4}: 方位 {5}: 時刻
+		for Start, End in GpsLog.TextChunks():
+			
+			FileOut.write(''.join(map('''\
+					<Placemark>
+						<snippet/>
+						<description><![CDATA[
+							<table>
+								<tr><td>Longitude: {0}</td></tr>
+								<tr><td>Latitude: {1}</td></tr>
+								<tr><td>Speed: {2}km/h</td></tr>
+								<tr><td>Altitude: {3}m</td></tr>
+								<tr><td>Heading: {4}</td></tr>
+								<tr><td>Time: {5}</td></tr>
+							</table>
+						]]></description>
+						<LookAt>
+							<longitude>{0}</longitude>
+							<latitude>{1}</latitude>
+							<tilt>66</tilt>
+						</LookAt>
+						<TimeStamp><when>{5}</when></TimeStamp>
+						<styleUrl>#track</styleUrl>
+						<Point>
+							<coordinates>{0},{1}</coordinates>
+						</Point>
+					</Placemark>
+'''.format,
+				GpsLog.TextFormat('%.8f', GpsLog.TextColumn('Longitude', Start, End)),
+				GpsLog.TextFormat('%.8f', GpsLog.TextColumn('Latitude', Start, End)),
+				GpsLog.TextFormat('%.3f', GpsLog.TextColumn('Speed', Start, End)),
+				GpsLog.TextFormat('%.3f', GpsLog.TextColumn('Altitude', Start, End)),
+				GpsLog.TextFormat('%.2f', GpsLog.TextColumn('Bearing', Start, End)),
+				GpsLog.TextLines('%s%02d:%02d.%03d+00:00', *GpsLog.TextTime(Start, End, '%Y-%m-%dT%H:'))
+			)))
+		
+		FileOut.write('''\
+				</Folder>
+				<Placemark>
+					<name>Path</name>
+					<styleUrl>#lineStyle</styleUrl>
+					<LineString>
+						<tessellate>1</tessellate>
+						<coordinates>
+''')
+		
+		for Start, End in GpsLog.TextChunks(Count = False):
+			FileOut.write(''.join(GpsLog.TextLines(
+				'							%.8f,%.8f\n',
+				GpsLog.TextColumn('Longitude', Start, End), GpsLog.TextColumn('Latitude', Start, End)
+			)))
+		
+		FileOut.write('''\
+						</coordinates>
+					</LineString>
+				</Placemark>
+			</Folder>
+		</Folder>
+	</Document>
+</kml>
+''')
+
+# 1本の gx:Track による compact な KML
+# 時刻 (<when>) と座標 (<gx:coord>) を並べ，入力に速度 / 方位があれば ExtendedData に出力する
+def WriteTrack(GpsLog, FileName):
+	with GpsLog.OpenOutput(FileName, 'wt') as FileOut:
+		
+		Has = 0
+		for Flag in set(GpsLog.Flag):
+			Has |= Flag
+		
+		# ExtendedData の channel: (名前, 表示名, channel, 書式)
+		Array = [
+			Field for Field, HasField in (
+				(('speed',		'Speed (km/h)',	'Speed',	'%.3f'), Has & GpsLog.HAS_SPEED),
+				(('bearing',	'Heading',		'Bearing',	'%.2f'), Has & GpsLog.HAS_BEARING),
+			) if HasField
+		]
+		
+		GpsLog.GenAltitude()
+		GpsLog.GenSpeed()
+		GpsLog.GenBearing()
+		
+		FileOut.write('''\
+<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">
+<Document>
+	<name>GPS device</name>
+	<Schema id="track">
+%s	</Schema>
+	<Placemark>
+		<name>Track</name>
+		<TimeSpan><begin>%s</begin><end>%s</end></TimeSpan>
+		<gx:Track>
+'''				% (
+				''.join(
+					'\t\t<gx:SimpleArrayField name="%s" type="float"><displayName>%s</displayName></gx:SimpleArrayField>\n' % Field[:2]
+					for Field in Array
+				),
+				Time2Iso(GpsLog.Time[0]),
+				Time2Iso(GpsLog.Time[-1]),
+			)
+		)
+		
+		for Start, End in GpsLog.TextChunks():
+			FileOut.write(''.join(GpsLog.TextLines(
+				'<when>%s%02d:%02d.%03d+00:00</when>\n', *GpsLog.TextTime(Start, End, '%Y-%m-%dT%H:')
+			)))
+		
+		for Start, End in GpsLog.TextChunks(Count = False):
+			FileOut.write(''.join(GpsLog.TextLines(
+				'<gx:coord>%.8f %.8f %.3f</gx:coord>\n',
+				GpsLog.TextColumn('Longitude', Start, End), GpsLog.TextColumn('Latitude', Start, End),
+				GpsLog.TextColumn('Altitude', Start, End)
+			)))
+		
+		if Array:
+			FileOut.write('\t\t\t<ExtendedData><SchemaData schemaUrl="#track">\n')
+			
+			for Name, _, Channel, Format in Array:
+				FileOut.write('\t\t\t\t<gx:SimpleArrayData name="%s">\n' % (Name,))
+				
+				for Start, End in GpsLog.TextChunks(Count = False):
+					FileOut.write(''.join(GpsLog.TextLines(
+						'<gx:value>' + Format + '</gx:value>\n', GpsLog.TextColumn(Channel, Start, End)
+					)))
+				
+				FileOut.write('\t\t\t\t</gx:SimpleArrayData>\n')
+			
+			FileOut.write('\t\t\t</SchemaData></ExtendedData>\n')
+		
+		FileOut.write('''\
+		</gx:Track>
+	</Placemark>
+</Document>
+</kml>
+''')
+
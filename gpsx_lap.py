@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+# 計時線の通過検出と lap / sector time
+# Gates は (緯度1, 経度1, 緯度2, 経度2) の計時線で，先頭が start / finish，以降が sector の区切り．
+# 点は先頭の計時線の端点を原点とする平面 [m] に投影し，CELL_SIZE [m] の格子の
+# 計時線が通る cell に入る segment (連続する 2点) だけを計時線と交差判定する．
+# 通過時刻は交点の位置で 2点の時刻を補間する．各計時線は最初の通過と同じ向きの通過だけを数え，
+# MIN_INTERVAL [s] 以内の再通過 (計時線付近での GPS の揺れ) は無視する．
+# --gate / --laps を指定した時だけ import する
+
+import csv
+import json
+from math import cos, floor
+
+import gpsx
+from gpsx import Time2Iso, smart_open
+
+numpy = gpsx.LazyModule(globals(), 'numpy')
+
+class LapTimerClass:
+	
+	CELL_SIZE		= 20
+	MIN_INTERVAL	= 10
+	
+	_ToRad	= 3.14159265358979 / 180
+	_a		= 6378137.0
+	
+	def __init__(self, Gates, Name = None, CellSize = CELL_SIZE):
+		self.Name		= Name
+		self.CellSize	= CellSize
+		self.Lat0		= Gates[0][0]
+		self.Lng0		= Gates[0][1]
+		self.Ky			= self._a * self._ToRad
+		self.Kx			= self.Ky * cos(self.Lat0 * self._ToRad)
+		
+		# 計時線の端点の座標と，計時線が通る cell の範囲
+		self.Gates	= []
+		self.Bound	= []
+		self.Grid	= {}	# cell → 計時線の番号
+		for g, (Lat1, Lng1, Lat2, Lng2) in enumerate(Gates):
+			x1, y1 = self.Project(Lat1, Lng1)
+			x2, y2 = self.Project(Lat2, Lng2)
+			self.Gates.append((x1, y1, x2, y2))
+			
+			Bound = (
+				floor(min(x1, x2) / CellSize), floor(min(y1, y2) / CellSize),
+				floor(max(x1, x2) / CellSize), floor(max(y1, y2) / CellSize)
+			)
+			self.Bound.append(Bound)
+			for cx in range(Bound[0], Bound[2] + 1):
+				for cy in range(Bound[1], Bound[3] + 1):
+					self.Grid.setdefault((cx, cy), []).append(g)
+		
+		if numpy:
+			self.CellKey = numpy.array([self.Key(cx, cy) for cx, cy in self.Grid], dtype = numpy.int64)
+		
+		self.Crossing	= [[] for Gate in Gates]	# 通過時刻 [ms]
+		self.Direction	= [None] * len(Gates)		# 最初の通過の向き
+	
+	def Project(self, Lat, Lng):
+		return (Lng - self.Lng0) * self.Kx, (Lat - self.Lat0) * self.Ky
+	
+	@staticmethod
+	def Key(cx, cy):
+		return cx * (1 << 32) + cy
+	
+	# GpsLog の Start 点目以降の点と，その前の点からの segment を調べる
+	def Feed(self, GpsLog, Start):
+		Start = max(Start - 1, 0)
+		if len(GpsLog) - Start < 2:
+			return
+		
+		if numpy:
+			Time	= numpy.frombuffer(GpsLog.Time, dtype = numpy.int64)[Start:].tolist()
+			x		= (numpy.frombuffer(GpsLog.Longitude)[Start:] - self.Lng0) * self.Kx
+			y		= (numpy.frombuffer(GpsLog.Latitude)[Start:] - self.Lat0) * self.Ky
+			Candidate = self.CandidateNumpy(x, y)
+			x = x.tolist()
+			y = y.tolist()
+		else:
+			Time	= GpsLog.Time[Start:]
+			x		= [(Lng - self.Lng0) * self.Kx for Lng in GpsLog.Longitude[Start:]]
+			y		= [(Lat - self.Lat0) * self.Ky for Lat in GpsLog.Latitude[Start:]]
+			Candidate = self.Candidate(x, y)
+		
+		for j, Gates in Candidate:
+			for g in Gates:
+				self.Cross(g, x[j], y[j], Time[j], x[j + 1], y[j + 1], Time[j + 1])
+	
+	# 計時線の cell に掛かる segment の番号と，その segment と交差し得る計時線
+	def Candidate(self, x, y):
+		Size	= self.CellSize
+		cx		= [floor(v / Size) for v in x]
+		cy		= [floor(v / Size) for v in y]
+		
+		for j in range(len(x) - 1):
+			if cx[j] == cx[j + 1] and cy[j] == cy[j + 1]:
+				Gates = self.Grid.get((cx[j], cy[j]))
+			else:
+				Gates = self.Overlap(cx[j], cy[j], cx[j + 1], cy[j + 1])
+			if Gates:
+				yield j, Gates
+	
+	def CandidateNumpy(self, x, y):
+		Size	= self.CellSize
+		cx		= numpy.floor(x / Size).astype(numpy.int64)
+		cy		= numpy.floor(y / Size).astype(numpy.int64)
+		
+		# 1 cell に収まる segment は cell の key で，複数の cell に掛かる segment は範囲で照合する
+		Single	= (cx[:-1] == cx[1:]) & (cy[:-1] == cy[1:])
+		Hit		= Single & numpy.isin(self.Key(cx[:-1], cy[:-1]), self.CellKey)
+		
+		x0 = numpy.minimum(cx[:-1], cx[1:])
+		x1 = numpy.maximum(cx[:-1], cx[1:])
+		y0 = numpy.minimum(cy[:-1], cy[1:])
+		y1 = numpy.maximum(cy[:-1], cy[1:])
+		for Bound in self.Bound:
+			Hit |= ~Single & (x0 <= Bound[2]) & (x1 >= Bound[0]) & (y0 <= Bound[3]) & (y1 >= Bound[1])
+		
+		for j in numpy.flatnonzero(Hit).tolist():
+			if Single[j]:
+				yield j, self.Grid[(int(cx[j]), int(cy[j]))]
+			else:
+				yield j, self.Overlap(int(cx[j]), int(cy[j]), int(cx[j + 1]), int(cy[j + 1]))
+	
+	# cell (cx0, cy0) ～ (cx1, cy1) の範囲に掛かる計時線
+	def Overlap(self, cx0, cy0, cx1, cy1):
+		x0, x1 = min(cx0, cx1), max(cx0, cx1)
+		y0, y1 = min(cy0, cy1), max(cy0, cy1)
+		return [
+			g for g, Bound in enumerate(self.Bound)
+			if x0 <= Bound[2] and x1 >= Bound[0] and y0 <= Bound[3] and y1 >= Bound[1]
+		]
+	
+	# segment (x0, y0) → (x1, y1) と計時線 g の交差判定
+	# 終点上の交点は次の segment の始点として数える
+	def Cross(self, g, x0, y0, t0, x1, y1, t1):
+		gx0, gy0, gx1, gy1 = self.Gates[g]
+		rx = x1 - x0
+		ry = y1 - y0
+		sx = gx1 - gx0
+		sy = gy1 - gy0
+		
+		d = rx * sy - ry * sx
+		if d == 0:
+			return
+		
+		qx = gx0 - x0
+		qy = gy0 - y0
+		t = (qx * sy - qy * sx) / d
+		u = (qx * ry - qy * rx) / d
+		if not (0 <= t < 1 and 0 <= u <= 1):
+			return
+		
+		Direction = d > 0
+		if self.Direction[g] is None:
+			self.Direction[g] = Direction
+		if Direction != self.Direction[g]:
+			return
+		
+		Time		= t0 + (t1 - t0) * t
+		Crossing	= self.Crossing[g]
+		if Crossing and Time - Crossing[-1] < self.MIN_INTERVAL * 1000:
+			return
+		Crossing.append(Time)
+	
+	# start / finish の通過毎の lap．sector time は通過しなかった sector が None
+	def Laps(self):
+		Start	= self.Crossing[0]
+		Laps	= []
+		
+		for Lap, (t0, t1) in enumerate(zip(Start, Start[1:]), 1):
+			Split = [t0] + [
+				next((t for t in Crossing if t0 < t < t1), None) for Crossing in self.Crossing[1:]
+			] + [t1]
+			
+			Laps.append({
+				'session':	self.Name,
+				'lap':		Lap,
+				'start':	Time2Iso(round(t0)),
+				'time':		round(t1 - t0) / 1000,
+				'sectors':	[
+					round(b - a) / 1000 if a is not None and b is not None and a < b else None
+					for a, b in zip(Split, Split[1:])
+				] if len(Split) > 2 else [],
+			})
+		
+		return Laps
+	
+	# Laps を .json なら JSON，それ以外は CSV で出力する
+	@staticmethod
+	def Write(FileName, Laps):
+		with smart_open(FileName, 'wt') as FileOut:
+			if FileName.endswith('.json'):
+				json.dump(Laps, FileOut, indent = '\t')
+				FileOut.write('\n')
+				return
+			
+			Sectors = max((len(Lap['sectors']) for Lap in Laps), default = 0)
+			Writer = csv.writer(FileOut, lineterminator = '\n')
+			Writer.writerow(['session', 'lap', 'start', 'time'] + ['sector%d' % (i + 1,) for i in range(Sectors)])
+			for Lap in Laps:
+				Writer.writerow(
+					[Lap['session'], Lap['lap'], Lap['start'], '%.3f' % (Lap['time'],)] +
+					['' if Sector is None else '%.3f' % (Sector,) for Sector in Lap['sectors']]
+				)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# gpsx native reader/writer
+# gpsx の format registry に 'gpsx_native:Read' / 'gpsx_native:Write' として登録する．
+# parse cache (gpsx_cache) の保存形式でもある
+#
+# channel 毎の array をそのまま並べた columnar binary．parse せずに mmap から読む
+#
+# header:	magic 'GPSX', version, channel 数, 点数, 値の無い点がある channel の HAS_* mask
+# table:	channel 毎に名前, array typecode, data の offset
+# data:		channel 毎に全点の値 (little endian，8byte 境界)
+
+import contextlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from gpsx import GpsxException
+
+Magic		= b'GPSX'
+Version		= 1
+Header		= struct.Struct('<4sHHQI')
+Table		= struct.Struct('<16s1s7xQ')
+
+def Read(GpsLog, FileName):
+	with contextlib.ExitStack() as Stack:
+		if FileName == '-' or FileName.endswith('.gz'):
+			Buf = Stack.enter_context(GpsLog.OpenInput(FileName, 'rb')).read()
+		else:
+			fh = Stack.enter_context(open(FileName, 'rb'))
+			
+			# 空ファイルは mmap できない
+			if os.fstat(fh.fileno()).st_size == 0:
+				Buf = b''
+			else:
+				Buf = Stack.enter_context(mmap.mmap(fh.fileno(), 0, access = mmap.ACCESS_READ))
+		
+		Buf = Stack.enter_context(memoryview(Buf))
+		Offset, Num, Missing = ParseHeader(GpsLog, Buf, FileName)
+		
+		if Missing & GpsLog.HAS_ALTITUDE:	GpsLog.NoAltitude	|= 1
+		if Missing & GpsLog.HAS_SPEED:	GpsLog.NoSpeed	|= 1
+		if Missing & GpsLog.HAS_BEARING:	GpsLog.NoBearing	|= 1
+		if Missing & GpsLog.HAS_DISTANCE:	GpsLog.NoDistance	|= 1
+		
+		# 全 channel の検証後に追加する
+		Step = GpsLog.ChunkSize or Num
+		for Start in range(0, Num, Step):
+			End = min(Start + Step, Num)
+			
+			for Name in GpsLog.Channels:
+				Col = getattr(GpsLog, Name)
+				Size = Col.itemsize
+				
+				if sys.byteorder == 'big':
+					Data = array(Col.typecode, Buf[Offset[Name] + Start * Size:Offset[Name] + End * Size])
+					Data.byteswap()
+					Col.extend(Data)
+				else:
+					Col.frombytes(Buf[Offset[Name] + Start * Size:Offset[Name] + End * Size])
+			
+			if GpsLog.ChunkFull(): yield
+	
+	yield
+
+# header と table を検証し，(channel 名 → offset, 点数, Missing) を返す
+def ParseHeader(GpsLog, Buf, FileName):
+	if len(Buf) < Header.size:
+		raise GpsxException('Invalid gpsx file: %s' % (FileName,))
+	
+	FileMagic, FileVersion, ChNum, Num, Missing = Header.unpack_from(Buf)
+	if FileMagic != Magic or FileVersion != Version:
+		raise GpsxException('Invalid gpsx file: %s' % (FileName,))
+	
+	Offset = {}
+	for i in range(ChNum):
+		Pos = Header.size + Table.size * i
+		if Pos + Table.size > len(Buf):
+			raise GpsxException('Invalid gpsx file: %s' % (FileName,))
+		
+		Name, TypeCode, Off = Table.unpack_from(Buf, Pos)
+		Offset[Name.rstrip(b'\0').decode()] = (TypeCode.decode(), Off)
+	
+	for Name in GpsLog.Channels:
+		Col = getattr(GpsLog, Name)
+		if (
+			Name not in Offset or Offset[Name][0] != Col.typecode or
+			Offset[Name][1] + Num * Col.itemsize > len(Buf)
+		):
+			raise GpsxException('Invalid gpsx file: %s' % (FileName,))
+		Offset[Name] = Offset[Name][1]
+	
+	return Offset, Num, Missing
+
+def Write(GpsLog, FileName):
+	All = 0xFF
+	for Flag in set(GpsLog.Flag):
+		All &= Flag
+	Missing = ~All & (GpsLog.HAS_ALTITUDE | GpsLog.HAS_SPEED | GpsLog.HAS_BEARING | GpsLog.HAS_DISTANCE)
+	
+	Offset = []
+	Pos = Header.size + Table.size * len(GpsLog.Channels)
+	for Name in GpsLog.Channels:
+		Pos = (Pos + 7) & ~7
+		Offset.append(Pos)
+		Pos += len(GpsLog) * getattr(GpsLog, Name).itemsize
+	
+	with GpsLog.OpenOutput(FileName, 'wb') as FileOut:
+		FileOut.write(Header.pack(
+			Magic, Version, len(GpsLog.Channels), len(GpsLog), Missing
+		))
+		for Name, Off in zip(GpsLog.Channels, Offset):
+			FileOut.write(Table.pack(Name.encode(), getattr(GpsLog, Name).typecode.encode(), Off))
+		
+		Pos = Header.size + Table.size * len(GpsLog.Channels)
+		for Name, Off in zip(GpsLog.Channels, Offset):
+			FileOut.write(bytes(Off - Pos))
+			
+			Col = getattr(GpsLog, Name)
+			if sys.byteorder == 'big':
+				Col = array(Col.typecode, Col)
+				Col.byteswap()
+			FileOut.write(memoryview(Col).cast('B'))
+			Pos = Off + len(Col) * Col.itemsize
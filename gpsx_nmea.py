@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+
+# NMEA reader/writer
+# gpsx の format registry に 'gpsx_nmea:Read' / 'gpsx_nmea:Write' として登録し，
+# nmea を最初に読み書きする時に import する
+
+import itertools
+
+import gpsx
+from gpsx import Hour2Time
+
+numpy = gpsx.LazyModule(globals(), 'numpy')
+
+#		HHMMSS	   lat		   lng			knot bearing  ddmmyy
+# 0	  1		  2 3		   4 5			6 7	  8	  9
+# $GPRMC,210624.000,A,3401.234567,N,13501.234567,E,19.738,249.05,010912,,,A*60
+#
+#		HHMMSS	 lat		 lng		   sat hdop alt
+# 0	  1		  2		 3 4		  5 6 7  8   9  10 11  12
+# $GPGGA,085120.307,3541.1493,N,13945.3994,E,1,08,1.0,6.9,M,35.9,M,,0000*5E
+
+# sentence ID (talker 以降の 3文字) → 使う field 番号
+# numpy 版は chunk 毎に必要な field だけ取り出し，numpy 無し版は 1行毎に split() して最後の
+# field まである文だけを使う．talker ($GP, $GN, $GL ...) は問わない
+Sentence = {
+	b'RMC':	(1, 3, 4, 5, 6, 7, 8, 9),
+	b'GGA':	(1, 9),
+}
+
+# checksum の16進1桁 → 値 (-1: 16進でない)
+_Hex = [-1] * 256
+for i, c in enumerate(b'0123456789ABCDEF'):
+	_Hex[c] = _Hex[c | 0x20] = i
+del i, c
+
+# XOR 0x24: '$' を含めた checksum → '$' を除いた checksum
+_Dollar = bytes(i ^ 0x24 for i in range(256))
+
+def Str2LatLng(LatLngStr, Dir):
+	LatLng = float(LatLngStr)
+	LatLng = LatLng // 100 + (LatLng - LatLng // 100 * 100) / 60
+	if Dir == b'W' or Dir == b'S':
+		LatLng = -LatLng
+	return LatLng
+
+def LatLng2Str(LatLng):
+	return str(int(LatLng) * 100 + (LatLng - int(LatLng)) * 60)
+
+def GenChksum(Str):
+	return '*%02X' % (Chksum([Str.lstrip('$').encode()])[0],)
+
+# 各文の '$' と '*' の間の XOR をまとめて計算する
+# numpy があれば '\n' で連結した累積 XOR の差分で計算する．無ければ全文を同じ長さ (8byte 単位) に
+# 0 で埋めて連結し，8byte 毎の列を 1個の int にして XOR した後，32, 16, 8bit ずらして XOR すると
+# 各文の先頭 byte に XOR が残る (NMEA の 1文は最大 82文字．128byte を超える文は 1byte ずつ XOR する)
+def Chksum(Body):
+	if numpy and Body:
+		Buf	= numpy.frombuffer(b'\n'.join(Body), numpy.uint8)
+		Acc	= numpy.concatenate(([0], numpy.bitwise_xor.accumulate(Buf)))
+		End	= numpy.append(numpy.flatnonzero(Buf == 0x0A), len(Buf))
+		return (Acc[End] ^ Acc[numpy.concatenate(([0], End[:-1] + 1))]).astype(numpy.uint8).tobytes()
+	
+	if not Body:
+		return bytearray()
+	
+	Long = [i for i, b in enumerate(Body) if len(b) > 128] if max(map(len, Body)) > 128 else []
+	if Long:
+		Body = [b'' if len(b) > 128 else b for b in Body]
+	
+	Width	= (max(map(len, Body)) + 7) & ~7 or 8
+	Step	= Width >> 3
+	Buf		= memoryview(b''.join([b.ljust(Width, b'\0') for b in Body])).cast('Q')
+	
+	x = 0
+	for i in range(Step):
+		x ^= int.from_bytes(Buf[i::Step].tobytes(), 'little')
+	x ^= x >> 32; x ^= x >> 16; x ^= x >> 8
+	
+	Sum = bytearray(x.to_bytes(len(Body) * 8, 'little')[::8])
+	for i in Long:
+		for c in Body[i]:
+			Sum[i] ^= c
+	return Sum
+
+# Chunk から Sentence の文の行を取り出す
+# talker ('$' + 英大文字2文字) は行毎に調べず，chunk 内の行頭の種類毎に調べる
+def Filter(Chunk):
+	Id		= {Id + b',' for Id in Sentence}
+	Line	= [l for l in Chunk.split(b'\n') if l[3:7] in Id]
+	
+	Bad = [
+		Talker for Talker in {l[:3] for l in Line}
+		if not (Talker[:1] == b'$' and Talker[1:].isalpha() and Talker[1:].isupper())
+	]
+	if Bad:
+		Bad = set(Bad)
+		Line = [l for l in Line if l[:3] not in Bad]
+	return Line
+
+# '*hh' があれば checksum を検証し，不一致の文を除く
+# Part: 1行毎の (body, '*', checksum) (body は '$' から)
+def Verify(Part):
+	Sum = Chksum([p[0] for p in Part]).translate(_Dollar)
+	
+	# 全文正しければ 1回の比較で済ませる
+	try:
+		if bytes.fromhex(b''.join([p[2][:2] for p in Part]).decode()) == Sum:
+			return Part
+	except ValueError:
+		pass
+	
+	Hex		= _Hex
+	Valid	= []
+	
+	for i, p in enumerate(Part):
+		Given = p[2]
+		if not p[1]:
+			p = (p[0].rstrip(b'\r'), b'', b'')
+		elif (
+			len(Given) < 2 or (Hex[Given[0]] | Hex[Given[1]]) < 0 or
+			Sum[i] != Hex[Given[0]] << 4 | Hex[Given[1]]
+		):
+			continue
+		Valid.append(p)
+	
+	return Valid
+
+# 同じ時刻の RMC / GGA は 1点にまとめるので，chunk の最後の時刻の文は
+# 次の chunk に持ち越す．持ち越し開始位置を返す
+def LastTime(Line):
+	def Time(l):
+		return l.split(b',', 2)[1:2]
+	
+	i = len(Line)
+	if i:
+		Last = Time(Line[-1])
+		while i > 0 and Time(Line[i - 1]) == Last:
+			i -= 1
+	return i
+
+# Filter() した行の checksum を検証し，点として追加する
+# RMC: 時刻，緯度経度，速度，方位  GGA: 高度
+# 1点毎に AppendPoint() せず，channel 順の tuple (AppendRows() の形式) にまとめて追加する．
+# 組み立て中の点は list にせず local 変数に持つ
+def Append(GpsLog, Line):
+	HAS_SPEED	= GpsLog.HAS_SPEED
+	HAS_BEARING	= GpsLog.HAS_BEARING
+	HAS_ALTITUDE	= GpsLog.HAS_ALTITUDE
+	
+	# 最後の field (の次の ',') まである文だけを使う
+	Last	= max(max(Fields) for Fields in Sentence.values())
+	
+	# (日付, 時) → その時の 00:00 の時刻 (Hour2Time() は 1時間に 1回だけ呼ぶ)
+	HourTime	= {}
+	
+	Rows		= []
+	PrevTime	= None
+	Time		= None	# None: RMC がまだ無い
+	
+	for p in Verify([l.partition(b'*') for l in Line]):
+		s = p[0].split(b',', Last + 1)
+		if len(s) <= Last:
+			continue
+		
+		if PrevTime != s[1]:
+			# 前の時刻の点を確定する (RMC の無い点は捨てる)
+			if Time is not None:
+				Rows.append((Time, Lng, Lat, Alt, Speed, Bearing, 0, Flag))
+			PrevTime	= s[1]
+			Time		= None
+			Alt = Speed = Bearing = 0
+			Flag		= 0
+		
+		try:
+			Id = s[0][3:]
+			if Id == b'RMC':
+				Sec		= float(s[1])
+				Ms		= int(Sec * 1000 + 0.5) % 1000
+				Sec		= int(Sec)
+				
+				Key		= (s[9], Sec // 10000)
+				Hour	= HourTime.get(Key)
+				if Hour is None:
+					Date = int(s[9])
+					Hour = HourTime[Key] = Hour2Time(
+						Date % 100 + 2000, Date // 100 % 100, Date // 10000, Sec // 10000
+					)
+				
+				# ddmm.mmmm → 度 (Str2LatLng() の展開)
+				LatDeg = float(s[3])
+				LngDeg = float(s[5])
+				LatDeg = LatDeg // 100 + (LatDeg - LatDeg // 100 * 100) / 60
+				LngDeg = LngDeg // 100 + (LngDeg - LngDeg // 100 * 100) / 60
+				
+				# 時刻・緯度経度が全て読めてから点を更新する
+				Time	= Hour + Sec // 100 % 100 * 60000 + Sec % 100 * 1000 + Ms
+				Lat		= -LatDeg if s[4] == b'S' else LatDeg
+				Lng		= -LngDeg if s[6] == b'W' else LngDeg
+				
+				if s[7]:
+					Speed = float(s[7]) * 1.852
+					Flag |= HAS_SPEED
+				if s[8]:
+					Bearing = float(s[8])
+					Flag |= HAS_BEARING
+			
+			elif Id == b'GGA' and s[9]:
+				Alt = float(s[9])
+				Flag |= HAS_ALTITUDE
+		
+		except ValueError:
+			# 空・壊れた field の文は無視
+			pass
+	
+	if Time is not None:
+		Rows.append((Time, Lng, Lat, Alt, Speed, Bearing, 0, Flag))
+	if not Rows:
+		return
+	
+	GpsLog.AppendRows(Rows)
+	
+	Missing = ~0
+	for Flag in {Row[7] for Row in Rows}:
+		Missing &= Flag
+	Missing = ~Missing
+	if Missing & GpsLog.HAS_ALTITUDE:	GpsLog.NoAltitude	|= 1
+	if Missing & GpsLog.HAS_SPEED:		GpsLog.NoSpeed		|= 1
+	if Missing & GpsLog.HAS_BEARING:	GpsLog.NoBearing	|= 1
+	GpsLog.NoDistance |= 1
+
+# numpy 版 tokenizer
+# 1文毎の object は作らず，chunk 内の改行・','・'*' の位置から Sentence の field を
+# 固定長 bytes の配列として切り出す．checksum も累積 XOR でまとめて検証する
+# 戻り値: (行頭位置, {sentence ID: (行番号, {field 番号: bytes 配列})})
+def Tokenize(Chunk):
+	Buf		= numpy.frombuffer(Chunk, numpy.uint8)
+	End		= numpy.flatnonzero(Buf == 0x0A)
+	if Buf[-1] != 0x0A:
+		End = numpy.append(End, len(Buf))
+	Start	= numpy.concatenate(([0], End[:-1] + 1))
+	
+	# '\r' を除いた行末
+	End		= End - ((End > Start) & (Buf[End - 1] == 0x0D))
+	
+	# 行内に '*' があれば body はその手前まで
+	Star	= numpy.flatnonzero(Buf == 0x2A)
+	Star	= numpy.append(Star, len(Buf))[numpy.searchsorted(Star, Start)]
+	HasStar	= Star < End
+	Body	= numpy.where(HasStar, Star, End)
+	
+	# '$' + talker 2文字 + ID 3文字 + ','
+	Line	= numpy.flatnonzero((Body - Start >= 7) & (Buf[Start] == 0x24))
+	Begin	= Start[Line]
+	Talker	= (Buf[Begin + 1] - 0x41 < 26) & (Buf[Begin + 2] - 0x41 < 26)
+	
+	# 累積 XOR の差分が '$' と '*' の間の XOR
+	Hex		= numpy.array(_Hex, numpy.int16)
+	Acc		= numpy.bitwise_xor.accumulate(Buf)
+	Star	= Star[Line]
+	Digit	= numpy.minimum(Star[:, None] + (1, 2), len(Buf) - 1)
+	Digit	= numpy.where(Digit < End[Line, None], Hex[Buf[Digit]], -1)
+	Valid	= ~HasStar[Line] | (
+		(Digit.min(axis = 1) >= 0) &
+		(Digit[:, 0] * 16 + Digit[:, 1] == Acc[Star - 1] ^ Acc[Begin])
+	)
+	
+	Line	= Line[Talker & Valid]
+	Begin	= Start[Line]
+	Body	= Body[Line]
+	Id		= Buf[Begin + 3].astype(numpy.int32) << 16 | Buf[Begin + 4].astype(numpy.int32) << 8 | Buf[Begin + 5]
+	Comma	= numpy.append(numpy.flatnonzero(Buf == 0x2C), len(Buf))
+	
+	# 行末を越えて切り出せるように 0 を足した buffer の sliding window から取り出す
+	Pad = numpy.concatenate((Buf, numpy.zeros(256, numpy.uint8)))
+	
+	def Field(Begin, Stop):
+		Len		= Stop - Begin
+		Width	= min(max(int(Len.max()), 1), 256)
+		Field	= numpy.lib.stride_tricks.sliding_window_view(Pad, Width)[Begin]
+		Field[numpy.arange(Width) >= Len[:, None]] = 0
+		return Field.view('S%d' % (Width,)).ravel()
+	
+	Token = {}
+	for SentenceId, Fields in Sentence.items():
+		Row	= numpy.flatnonzero(Id == int.from_bytes(SentenceId, 'big'))
+		
+		# ID 直後の ',' から数えて最後の field まで ',' がある文だけ
+		First	= numpy.searchsorted(Comma, Begin[Row])
+		Last	= numpy.minimum(First + max(Fields) - 1, len(Comma) - 1)
+		Row		= Row[(Comma[First] == Begin[Row] + 6) & (Comma[Last] < Body[Row])]
+		First	= numpy.searchsorted(Comma, Begin[Row])
+		
+		Token[SentenceId] = (Line[Row], {
+			n: Field(Comma[First + n - 1] + 1, numpy.minimum(Comma[numpy.minimum(First + n, len(Comma) - 1)], Body[Row]))
+			for n in Fields
+		} if len(Row) else {n: numpy.array([], 'S1') for n in Fields})
+	
+	return Start, Token
+
+# Chunk の点を追加し，処理した byte 数を返す
+# Final でなければ最後の時刻の文は次の chunk に持ち越す
+def AppendNumpy(GpsLog, Chunk, Final):
+	if not Chunk:
+		return 0
+	
+	Start, Token = Tokenize(Chunk)
+	RmcLine, Rmc = Token[b'RMC']
+	GgaLine, Gga = Token[b'GGA']
+	
+	if len(RmcLine) + len(GgaLine) == 0:
+		return len(Chunk)
+	
+	# 同じ時刻の文の group 番号
+	Order	= numpy.argsort(numpy.concatenate((RmcLine, GgaLine)), kind = 'stable')
+	Time	= numpy.concatenate((Rmc[1], Gga[1]))[Order]
+	Group	= numpy.empty(len(Order), numpy.int64)
+	Group[Order] = numpy.concatenate(([0], numpy.cumsum(Time[1:] != Time[:-1])))
+	
+	RmcGroup = Group[:len(RmcLine)]
+	GgaGroup = Group[len(RmcLine):]
+	
+	Pos = len(Chunk)
+	if not Final:
+		Carry	= Group[Order[-1]]
+		Pos		= int(Start[numpy.concatenate((RmcLine, GgaLine))[Order][numpy.searchsorted(Group[Order], Carry)]])
+	else:
+		Carry	= Group[Order[-1]] + 1
+	
+	try:
+		def Float(c):
+			Has = c != b''
+			Value = numpy.zeros(len(c))
+			Value[Has] = c[Has].astype(numpy.float64)
+			return Value, Has
+		
+		# group 内の最後の GGA 高度
+		Alt, HasAlt	= Float(Gga[9])
+		GroupAlt	= numpy.full(Carry + 1, numpy.nan)
+		GroupAlt[GgaGroup[HasAlt]] = Alt[HasAlt]
+		
+		# group 内の最後の RMC が 1点
+		# 時刻や緯度経度が空の RMC (測位無効) は捨てる
+		Row = (
+			numpy.append(RmcGroup[1:] != RmcGroup[:-1], True) & (RmcGroup < Carry) &
+			(Rmc[1] != b'') & (Rmc[9] != b'') & (Rmc[3] != b'') & (Rmc[5] != b'')
+		)
+		if not Row.any():
+			return Pos
+		
+		Rmc		= {n: c[Row] for n, c in Rmc.items()}
+		Alt		= GroupAlt[RmcGroup[Row]]
+		HasAlt	= ~numpy.isnan(Alt)
+		
+		# 時刻
+		Time	= Rmc[1].astype(numpy.float64)
+		Ms		= (Time * 1000 + 0.5).astype(numpy.int64) % 1000
+		Time	= Time.astype(numpy.int64)
+		Date	= Rmc[9].astype(numpy.int64)
+		
+		DateHour, Inverse = numpy.unique(Date * 100 + Time // 10000, return_inverse = True)
+		Base	= numpy.array([
+			Hour2Time(d // 100 % 100 + 2000, d // 10000 % 100, d // 1000000, d % 100)
+			for d in DateHour.tolist()
+		], numpy.int64)
+		Time	= Base[Inverse.ravel()] + Time // 100 % 100 * 60000 + Time % 100 * 1000 + Ms
+		
+		# 緯度経度
+		def LatLng(c, Dir, Neg):
+			v = c.astype(numpy.float64)
+			v = v // 100 + (v - v // 100 * 100) / 60
+			return numpy.where(Dir == Neg, -v, v)
+		
+		Longitude	= LatLng(Rmc[5], Rmc[6], b'W')
+		Latitude	= LatLng(Rmc[3], Rmc[4], b'S')
+		Speed, HasSpeed		= Float(Rmc[7])
+		Bearing, HasBearing	= Float(Rmc[8])
+	
+	except ValueError:
+		# 壊れた field を含む chunk は 1文ずつ処理する
+		Append(GpsLog, Filter(Chunk[:Pos]))
+		return Pos
+	
+	GpsLog.AppendPoints(
+		Time, Longitude, Latitude,
+		numpy.where(HasAlt, Alt, 0), Speed * 1.852, Bearing, numpy.zeros(len(Time)),
+		HasAlt * GpsLog.HAS_ALTITUDE | HasSpeed * GpsLog.HAS_SPEED | HasBearing * GpsLog.HAS_BEARING
+	)
+	return Pos
+
+def Read(GpsLog, FileName, Range = None):
+	Rest	= b''
+	Carry	= []
+	
+	with GpsLog.OpenInput(FileName, 'rb', Range) as FileIn:
+		while True:
+			Data = FileIn.read(GpsLog.READ_SIZE)
+			
+			# 行の途中までは次の chunk に持ち越す
+			Chunk = Rest + Data
+			if Data:
+				Pos		= Chunk.rfind(b'\n') + 1
+				Rest	= Chunk[Pos:]
+				Chunk	= Chunk[:Pos]
+			
+			if numpy:
+				Pos		= AppendNumpy(GpsLog, Chunk, not Data)
+				Rest	= Chunk[Pos:] + Rest
+			else:
+				Line	= Carry + Filter(Chunk)
+				Pos		= len(Line) if not Data else LastTime(Line)
+				Carry	= Line[Pos:]
+				Append(GpsLog, Line[:Pos])
+			
+			if not Data:
+				break
+			if GpsLog.ChunkFull(): yield
+	yield
+
+def Write(GpsLog, FileName):
+	with GpsLog.OpenOutput(FileName, 'wt') as FileOut:
+		for Start, End in GpsLog.TextChunks(GpsLog.GenSpeed, GpsLog.GenBearing):
+			
+			Time	= GpsLog.TextTime(Start, End, '%H', '%d%m%y')
+			Hour, Date, Min, Sec, Ms = Time
+			Lat		= GpsLog.TextSign(GpsLog.TextColumn('Latitude', Start, End), '%.8f,N', ',S')
+			Lng		= GpsLog.TextSign(GpsLog.TextColumn('Longitude', Start, End), '%.8f,E', ',W')
+			
+			# '$' と '*hh' を除いた文
+			Rmc = GpsLog.TextLines(
+				'GPRMC,%s%02d%02d.%03d,A,%s,%s,%s,%s,%s,,,A',
+				Hour, Min, Sec, Ms, Lat, Lng,
+				GpsLog.TextFormat('%.3f', GpsLog.TextColumn('Speed', Start, End, 1.852), Start, GpsLog.HAS_SPEED),
+				GpsLog.TextFormat('%.2f', GpsLog.TextColumn('Bearing', Start, End), Start, GpsLog.HAS_BEARING),
+				Date
+			)
+			Gga = GpsLog.TextLines(
+				'GPGGA,%s%02d%02d.%03d,%s,%s,1,08,1.0,%s,M,,,,',
+				Hour, Min, Sec, Ms, Lat, Lng,
+				GpsLog.TextFormat('%.2f', GpsLog.TextColumn('Altitude', Start, End), Start, GpsLog.HAS_ALTITUDE)
+			)
+			
+			FileOut.write(''.join(itertools.chain.from_iterable(zip(
+				Lines(GpsLog, Rmc), Lines(GpsLog, Gga)
+			))))
+
+# '$' + 文 + '*hh\n'
+def Lines(GpsLog, Body):
+	Sum = Chksum('\n'.join(Body).encode().split(b'\n'))
+	return GpsLog.TextLines('$%s*%02X\n', Body, Sum)
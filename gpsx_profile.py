@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+# 処理段階毎の計測
+# 段階 (read, derive, reduce, write, io) 毎に実時間, 呼び出し回数, 点数, byte 数,
+# process の peak RSS の増分と tracemalloc の peak (python -X tracemalloc 等で tracing 中のみ)
+# を記録する．peak RSS (ru_maxrss) は process 全体の値なので，段階毎にはその段階の間に
+# 増えた量を計上し，process の peak は全体で 1つだけ記録する．
+# 段階は入れ子になる (streaming の write 中の read 等) ので，時間は最も内側の段階に計上する．
+# --profile を指定した時だけ import する
+
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+
+from gpsx import PathSize
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+class ProfileClass:
+	
+	Stages = ('read', 'derive', 'reduce', 'write', 'io')
+	
+	def __init__(self):
+		self.Record = {
+			Name: {
+				'stage':			Name,
+				'calls':			0,
+				'seconds':			0.0,
+				'points':			0,
+				'bytes':			0,
+				'cache_hits':		0,
+				'rss_growth':		0,
+				'peak_tracemalloc':	0,
+			} for Name in self.Stages
+		}
+		self.Stack		= []
+		self.Start		= time.perf_counter()
+		self.Last		= self.Start
+		self.PeakRss	= self.MaxRss()
+		self.CacheFile	= None	# 読み込み中の入力の代わりに読んだ cache ファイル
+	
+	# process の peak RSS [byte] (取得できなければ 0)
+	@staticmethod
+	def MaxRss():
+		if not resource:
+			return 0
+		Rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return Rss if sys.platform == 'darwin' else Rss * 1024
+	
+	# 前回からの時間と memory を実行中の段階に計上する
+	def Switch(self):
+		Now = time.perf_counter()
+		
+		if self.Stack:
+			Record = self.Record[self.Stack[-1]]
+			Record['seconds'] += Now - self.Last
+			
+			Rss = self.MaxRss()
+			Record['rss_growth'] += Rss - self.PeakRss
+			self.PeakRss = Rss
+			
+			if tracemalloc.is_tracing():
+				Record['peak_tracemalloc'] = max(Record['peak_tracemalloc'], tracemalloc.get_traced_memory()[1])
+				tracemalloc.reset_peak()
+		
+		self.Last = Now
+	
+	@contextlib.contextmanager
+	def Stage(self, Name):
+		self.Switch()
+		self.Stack.append(Name)
+		self.Record[Name]['calls'] += 1
+		try:
+			yield self.Record[Name]
+		finally:
+			self.Switch()
+			self.Stack.pop()
+	
+	# Func を Name の段階として計測する．Points(self) があれば呼び出し時の点数を計上する
+	# 同じ段階の中から呼ばれた時 (GenSpeed() 中の GenXY() 等) は点数を重ねて数えない
+	def Wrap(self, Name, Func, Points = None):
+		def Wrapper(*Args, **KwArgs):
+			Nested = Name in self.Stack
+			with self.Stage(Name) as Record:
+				if Points and not Nested:
+					Record['points'] += Points(Func.__self__)
+				return Func(*Args, **KwArgs)
+		return Wrapper
+	
+	# reader の generator を read として計測する
+	# byte 数は読み終えたファイルのサイズ．cache から読んだ時は入力ではなく cache ファイルの
+	# サイズを計上し，cache_hits に数える
+	def Reader(self, GpsLog, FileName, Reader):
+		Done = GpsLog.Trimmed + len(GpsLog)
+		self.CacheFile = None
+		
+		while True:
+			with self.Stage('read') as Record:
+				try:
+					next(Reader)
+				except StopIteration:
+					Record['bytes'] += PathSize(self.CacheFile or FileName)
+					if self.CacheFile:
+						Record['cache_hits'] += 1
+					self.CacheFile = None
+					return
+				finally:
+					Record['points'] += GpsLog.Trimmed + len(GpsLog) - Done
+					Done = GpsLog.Trimmed + len(GpsLog)
+			yield
+	
+	# GpsLogClass.CachedReader() が入力の代わりに CacheFile を読んだ
+	def CacheHit(self, CacheFile):
+		self.CacheFile = CacheFile
+	
+	# 出力ファイルの write() と close() を io として計測する
+	@contextlib.contextmanager
+	def Output(self, Output):
+		with self.Stage('io'):
+			fh = Output.__enter__()
+		
+		Profile = self
+		class Writer:
+			def write(self, Data):
+				with Profile.Stage('io') as Record:
+					Record['bytes'] += len(Data)
+					return fh.write(Data)
+			
+			def __getattr__(self, Name):
+				return getattr(fh, Name)
+		
+		try:
+			yield Writer()
+		except BaseException:
+			if not Output.__exit__(*sys.exc_info()):
+				raise
+		else:
+			with self.Stage('io'):
+				Output.__exit__(None, None, None)
+	
+	# 別 process の Result() を合算する
+	def Merge(self, Result):
+		for r in Result['stages']:
+			Record = self.Record[r['stage']]
+			for Key in ('calls', 'seconds', 'points', 'bytes', 'cache_hits', 'rss_growth'):
+				Record[Key] += r[Key]
+			Record['peak_tracemalloc'] = max(Record['peak_tracemalloc'], r['peak_tracemalloc'])
+		self.PeakRss = max(self.PeakRss, Result['process_peak_rss'])
+	
+	def Result(self):
+		return {
+			'wall_seconds':		time.perf_counter() - self.Start,
+			'process_peak_rss':	max(self.PeakRss, self.MaxRss()),
+			'stages':			[dict(Record) for Record in self.Record.values() if Record['calls']],
+		}
+	
+	def Json(self):
+		return json.dumps(self.Result(), indent = '\t')
+	
+	def Table(self):
+		Result = self.Result()
+		Lines = ['%-7s %6s %9s %10s %12s %12s %6s %9s %9s' % (
+			'stage', 'calls', 'time[s]', 'points', 'points/s', 'bytes', 'cached', 'RSS+[MiB]', 'heap[MiB]'
+		)]
+		
+		for r in Result['stages']:
+			Lines.append('%-7s %6d %9.3f %10s %12s %12s %6s %9.1f %9s' % (
+				r['stage'], r['calls'], r['seconds'],
+				r['points'] or '-',
+				'%.0f' % (r['points'] / r['seconds'],) if r['points'] and r['seconds'] else '-',
+				r['bytes'] or '-',
+				r['cache_hits'] or '-',
+				r['rss_growth'] / (1 << 20),
+				'%.1f' % (r['peak_tracemalloc'] / (1 << 20),) if r['peak_tracemalloc'] else '-',
+			))
+		
+		# RSS+: 段階の間の process の peak RSS の増分．total の行は process の peak RSS
+		Lines.append('%-7s %6s %9.3f %10s %12s %12s %6s %9.1f' % (
+			'total', '', Result['wall_seconds'], '', '', '', '', Result['process_peak_rss'] / (1 << 20)
+		))
+		return '\n'.join(Lines)
+	
+	def Report(self, Format = 'table'):
+		return self.Json() if Format == 'json' else self.Table()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+# RaceChrono reader/writer
+# gpsx の format registry に 'gpsx_racechrono:Read' / 'gpsx_racechrono:Write' として登録する
+#
+# 1: ULONG epoch 時刻 [ms]
+# 2: ULONG 走行距離 [1/1000m]
+# 3: int latitude, int longitude [1/6000000度]
+# 4: UINT 速度 [1/277.7792km/h, キリがいいのに近いのは 1/512knot?]
+# 5: 高度 [1/1000m]
+# 6: UINT bearing [1/1000度]
+# 30002: 捕捉衛生数
+# 30003: 位置特定品質 ($GPGGA)
+# 30004: DOP 座標精度 [*1/1000]
+# 30005: DOP 座標精度 [*1/1000], -128:データなし
+# すべてリトルエンディアン
+
+import bisect
+import contextlib
+import io
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import gpsx
+from gpsx import GpsLogClass, GpsxException
+
+numpy = gpsx.LazyModule(globals(), 'numpy')
+
+# channel file 名, 1点のバイト数
+ChannelFile = (
+	('channel_1_100_0_1_1', 8),	# 時刻
+	('channel_1_100_0_2_1', 8),	# 走行距離
+	('channel_1_100_0_3_1', 8),	# latitude, longitude
+	('channel_1_100_0_4_0', 4),	# 速度
+	('channel_1_100_0_5_0', 4),	# 高度
+	('channel_1_100_0_6_0', 4),	# bearing
+)
+
+def Read(GpsLog, DirName):
+	if DirName == '-':
+		raise GpsxException("RaceChrono reader can't input from stdin")
+	
+	with contextlib.ExitStack() as Stack:
+		Buf = []
+		for Name, Size in ChannelFile:
+			fh = Stack.enter_context(open(DirName + '/' + Name, 'rb'))
+			
+			# 空ファイルは mmap できない
+			if os.fstat(fh.fileno()).st_size == 0:
+				Buf.append(b'')
+			else:
+				Buf.append(Stack.enter_context(mmap.mmap(fh.fileno(), 0, access = mmap.ACCESS_READ)))
+		
+		# 点数が違う場合は最短の channel に合わせる
+		Num = min(len(b) // Size for b, (Name, Size) in zip(Buf, ChannelFile))
+		Step = GpsLog.ChunkSize or Num
+		
+		for Start in range(0, Num, Step):
+			Decode(GpsLog, Buf, Start, min(Start + Step, Num))
+			if GpsLog.ChunkFull(): yield
+	yield
+
+# channel データの Start ～ End - 1 点目を追加
+def Decode(GpsLog, Buf, Start, End):
+	Num = End - Start
+	
+	if numpy:
+		def Channel(Ch, Type, Mul = 1):
+			return numpy.frombuffer(Buf[Ch], dtype = Type, count = Num * Mul, offset = Start * numpy.dtype(Type).itemsize * Mul)
+		
+		LatLng = Channel(2, '<i4', 2)
+		GpsLog.Time.frombytes(Channel(0, '<u8').astype(numpy.int64).tobytes())
+		GpsLog.Distance.frombytes((Channel(1, '<u8') / 1000).tobytes())
+		GpsLog.Latitude.frombytes((LatLng[0::2] / 6000000).tobytes())
+		GpsLog.Longitude.frombytes((LatLng[1::2] / 6000000).tobytes())
+		GpsLog.Speed.frombytes((Channel(3, '<u4') / 277.7792).tobytes())
+		GpsLog.Altitude.frombytes((Channel(4, '<i4') / 1000).tobytes())
+		GpsLog.Bearing.frombytes((Channel(5, '<u4') / 1000).tobytes())
+	else:
+		def Channel(Ch, TypeCode, Size, Mul = 1):
+			Data = array(TypeCode, Buf[Ch][Start * Size * Mul:End * Size * Mul])
+			if sys.byteorder == 'big':
+				Data.byteswap()
+			return Data
+		
+		LatLng = Channel(2, 'i', 4, 2)
+		GpsLog.Time.extend(Channel(0, 'q', 8))
+		GpsLog.Distance.extend([v / 1000 for v in Channel(1, 'Q', 8)])
+		GpsLog.Latitude.extend([v / 6000000 for v in LatLng[0::2]])
+		GpsLog.Longitude.extend([v / 6000000 for v in LatLng[1::2]])
+		GpsLog.Speed.extend([v / 277.7792 for v in Channel(3, 'I', 4)])
+		GpsLog.Altitude.extend([v / 1000 for v in Channel(4, 'i', 4)])
+		GpsLog.Bearing.extend([v / 1000 for v in Channel(5, 'I', 4)])
+	
+	GpsLog.Flag.frombytes(bytes((
+		GpsLog.HAS_ALTITUDE | GpsLog.HAS_SPEED | GpsLog.HAS_BEARING | GpsLog.HAS_DISTANCE,
+	)) * Num)
+
+def Write(GpsLog, DirName):
+	if DirName == '-':
+		raise GpsxException("RaceChrono writer can't output to stdout")
+	
+	# dir 作成
+	os.makedirs(DirName, exist_ok=True)
+	
+	# 追記時は保存済みの最後の点より後の点だけを書く．無ければ派生データも作らない
+	Tail	= SessionTail(DirName) if GpsLog.Appending else None
+	Start	= bisect.bisect_right(GpsLog.Time, Tail[0]) if Tail else 0
+	if Start >= len(GpsLog):
+		return
+	
+	GpsLog.GenDistance()
+	GpsLog.GenSpeed()
+	GpsLog.GenAltitude()
+	GpsLog.GenBearing()
+	
+	if Tail:
+		AppendDistance(GpsLog, Tail, Start)
+	
+	# channel 毎に 1つのバッファに encode し，6ファイルを並列に書く
+	def WriteChannel(Ch):
+		Data = Encode(GpsLog, Ch, Start)
+		with open(DirName + '/' + ChannelFile[Ch][0], 'ab' if GpsLog.Appending else 'wb') as FileOut:
+			FileOut.write(Data)
+	
+	import concurrent.futures
+	with concurrent.futures.ThreadPoolExecutor(max_workers = len(ChannelFile)) as Executor:
+		for Future in [Executor.submit(WriteChannel, Ch) for Ch in range(len(ChannelFile))]:
+			Future.result()
+
+# channel Ch の Start 点目以降を encode
+def Encode(GpsLog, Ch, Start = 0):
+	if numpy:
+		def Channel(Value, Mul, Type):
+			return (numpy.frombuffer(Value)[Start:] * Mul).astype(Type)
+		
+		if Ch == 0:
+			return numpy.frombuffer(GpsLog.Time, dtype = numpy.int64)[Start:].astype('<u8').tobytes()
+		if Ch == 1:
+			return Channel(GpsLog.Distance, 1000, '<u8').tobytes()
+		if Ch == 2:
+			LatLng = numpy.empty((len(GpsLog) - Start) * 2, dtype = '<i4')
+			LatLng[0::2] = Channel(GpsLog.Latitude,  6000000, '<i4')
+			LatLng[1::2] = Channel(GpsLog.Longitude, 6000000, '<i4')
+			return LatLng.tobytes()
+		if Ch == 3:
+			return Channel(GpsLog.Speed, 277.7792, '<u4').tobytes()
+		if Ch == 4:
+			return Channel(GpsLog.Altitude, 1000, '<i4').tobytes()
+		return Channel(GpsLog.Bearing, 1000, '<i4').tobytes()
+	
+	def Pack(TypeCode, Value):
+		Data = array(TypeCode, Value)
+		if sys.byteorder == 'big':
+			Data.byteswap()
+		return Data.tobytes()
+	
+	if Ch == 0:
+		return Pack('Q', GpsLog.Time[Start:])
+	if Ch == 1:
+		return Pack('Q', [int(v * 1000) for v in GpsLog.Distance[Start:]])
+	if Ch == 2:
+		LatLng = [0] * ((len(GpsLog) - Start) * 2)
+		LatLng[0::2] = [int(v * 6000000) for v in GpsLog.Latitude[Start:]]
+		LatLng[1::2] = [int(v * 6000000) for v in GpsLog.Longitude[Start:]]
+		return Pack('i', LatLng)
+	if Ch == 3:
+		return Pack('I', [int(v * 277.7792) for v in GpsLog.Speed[Start:]])
+	if Ch == 4:
+		return Pack('i', [int(v * 1000) for v in GpsLog.Altitude[Start:]])
+	return Pack('i', [int(v * 1000) for v in GpsLog.Bearing[Start:]])
+
+# 保存済みの session の最後の点の (時刻, 走行距離, latitude, longitude)
+# session が無い・空なら None．channel 毎の点数が違う等，壊れていれば例外
+def SessionTail(DirName):
+	Exist	= [os.path.isfile(DirName + '/' + Name) for Name, Size in ChannelFile]
+	if not any(Exist):
+		return None
+	if not all(Exist):
+		raise GpsxException('RaceChrono session has missing channel files: %s' % (DirName,))
+	
+	Num = set()
+	for Name, Size in ChannelFile:
+		FileSize = os.path.getsize(DirName + '/' + Name)
+		if FileSize % Size:
+			raise GpsxException('RaceChrono channel file is truncated: %s/%s' % (DirName, Name))
+		Num.add(FileSize // Size)
+	
+	if len(Num) != 1:
+		raise GpsxException('RaceChrono channel files have different record counts: %s' % (DirName,))
+	if Num == {0}:
+		return None
+	
+	def Last(Ch, Format):
+		Name, Size = ChannelFile[Ch]
+		with open(DirName + '/' + Name, 'rb') as FileIn:
+			FileIn.seek(-Size, io.SEEK_END)
+			return struct.unpack(Format, FileIn.read(Size))
+	
+	Lat, Lng = Last(2, '<ii')
+	return Last(0, '<Q')[0], Last(1, '<Q')[0] / 1000, Lat / 6000000, Lng / 6000000
+
+# 追記する Start 点目 (保存済みの最後の点 Tail より後) 以降の走行距離を，
+# 保存済みの最後の点の走行距離からの続きにする
+def AppendDistance(GpsLog, Tail, Start):
+	LastTime, LastDistance, LastLat, LastLng = Tail
+	
+	# 最後の点が読み込まれていればその走行距離，無ければ最後の点からの距離を基準にする
+	# 読み込んだ最後の点の走行距離が保存済みの値と一致すれば (同じ入力の続き)，
+	# 追記毎に 1/1000m 未満の切り捨てが累積しないよう，そのまま続ける
+	if Start > 0 and GpsLog.Time[Start - 1] == LastTime:
+		if int(GpsLog.Distance[Start - 1] * 1000) == round(LastDistance * 1000):
+			return
+		Base = GpsLog.Distance[Start - 1]
+	else:
+		Gap = GpsLogClass()
+		Gap.AppendPoint(LastTime, LastLng, LastLat)
+		Gap.AppendPoint(GpsLog.Time[Start], GpsLog.Longitude[Start], GpsLog.Latitude[Start])
+		Base = GpsLog.Distance[Start] - Gap.SegmentDistance()[0]
+	
+	Offset = LastDistance - Base
+	if numpy:
+		numpy.frombuffer(GpsLog.Distance)[Start:] += Offset
+	else:
+		for i in range(Start, len(GpsLog)):
+			GpsLog.Distance[i] += Offset
+
+
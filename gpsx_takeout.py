@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Google Takeout の位置情報 JSON reader
+# gpsx の format registry に 'gpsx_takeout:Read' (json) として登録する
+#
+# - Timeline.json 等:	"timelinePath": [{"point": "35.1°, 136.9°", "time": ...}, ...]
+#						(iOS 版は "geo:35.1,136.9" と startTime からの "durationMinutesOffsetFromStartTime")
+# - Records.json:		"locations": [{"latitudeE7": ..., "longitudeE7": ..., "timestamp": ...}, ...]
+#
+# 数 GB の JSON 全体を json.load() せずに READ_SIZE 毎に読む．object は key 単位で辿り，
+# 配列の要素は 1つずつ json の C decoder で decode するので，使用 memory は最大の要素程度．
+
+import codecs
+import json
+import re
+
+from gpsx import GpsxException, Iso2Time
+
+_JsonDecoder	= json.JSONDecoder()
+_JsonSpace		= re.compile(r'[\s,:]*')
+_LatLng			= re.compile(r'(-?[\d.]+)[^\d\-.]+(-?[\d.]+)')
+
+def Read(GpsLog, FileName):
+	with GpsLog.OpenInput(FileName, 'rb') as FileIn:
+		Decoder	= codecs.getincrementaldecoder('utf-8')()
+		Buf		= ''
+		Pos		= 0
+		Eof		= False
+		Stack	= []	# [配列なら True, 配列 / object の key, object で次が key なら True]
+		Key		= None
+		Prev	= [None]	# 直前の点の時刻
+		
+		while True:
+			Pos = _JsonSpace.match(Buf, Pos).end()
+			
+			# 値の途中で終わっていれば続きを読む
+			if Pos >= len(Buf) - 1 and not Eof:
+				Data = FileIn.read(GpsLog.READ_SIZE)
+				Eof = not Data
+				Buf = Buf[Pos:] + Decoder.decode(Data, Eof)
+				Pos = 0
+				continue
+			
+			if Pos >= len(Buf):
+				break
+			
+			c = Buf[Pos]
+			if c in '}]':
+				Stack.pop()
+				Pos += 1
+				continue
+			
+			Top = Stack[-1] if Stack else None
+			
+			# object の key
+			if Top and not Top[0] and Top[2]:
+				try:
+					Key, Pos = json.decoder.scanstring(Buf, Pos + 1)
+				except ValueError:
+					if Eof:
+						raise GpsxException('Invalid JSON: %s' % (FileName,))
+					Data = FileIn.read(GpsLog.READ_SIZE)
+					Eof = not Data
+					Buf = Buf[Pos:] + Decoder.decode(Data, Eof)
+					Pos = 0
+					continue
+				
+				Top[2] = False
+				continue
+			
+			# object の値の object / 配列は要素毎に辿る
+			if c in '{[' and not (Top and Top[0]):
+				Stack.append([c == '[', Key, True])
+				if Top:
+					Top[2] = True
+				Pos += 1
+				continue
+			
+			# 配列の要素とその他の値は丸ごと decode する
+			# 数値等が Buf の末尾にある場合は途中で切れている可能性があるので続きを読む
+			try:
+				Value, End = _JsonDecoder.raw_decode(Buf, Pos)
+				if End >= len(Buf) and not Eof:
+					raise ValueError
+			except ValueError:
+				if Eof:
+					raise GpsxException('Invalid JSON: %s' % (FileName,))
+				Data = FileIn.read(GpsLog.READ_SIZE)
+				Eof = not Data
+				Buf = Buf[Pos:] + Decoder.decode(Data, Eof)
+				Pos = 0
+				continue
+			
+			Pos = End
+			if Top and not Top[0]:
+				Top[2] = True
+			
+			if isinstance(Value, (dict, list)):
+				Walk(GpsLog, Value, Top[1] if Top else None, Prev)
+				if GpsLog.ChunkFull(): yield
+	yield
+
+# decode した値から点を探して追加する
+def Walk(GpsLog, Value, Key, Prev, StartTime = None):
+	if isinstance(Value, list):
+		for v in Value:
+			if isinstance(v, (dict, list)):
+				Walk(GpsLog, v, Key, Prev, StartTime)
+		return
+	
+	if Key == 'locations':
+		AppendRecord(GpsLog, Value, Prev)
+		return
+	
+	if Key == 'timelinePath':
+		AppendPath(GpsLog, Value, Prev, StartTime)
+		return
+	
+	StartTime = Value.get('startTime', StartTime)
+	for k, v in Value.items():
+		if isinstance(v, (dict, list)):
+			Walk(GpsLog, v, k, Prev, StartTime)
+
+# Records.json の locations の要素
+def AppendRecord(GpsLog, Record, Prev):
+	try:
+		if 'timestamp' in Record:
+			Time = Iso2Time(Record['timestamp'])
+		else:
+			Time = int(Record['timestampMs'])
+		
+		if Time == Prev[0]:
+			return
+		Prev[0] = Time
+		
+		Speed = Record.get('velocity')
+		GpsLog.AppendPoint(
+			Time,
+			Record['longitudeE7'] / 10000000,
+			Record['latitudeE7'] / 10000000,
+			Record.get('altitude'),
+			Speed * 3.6 if Speed is not None else None,
+			Record.get('heading'),
+		)
+	except (KeyError, TypeError, ValueError):
+		pass
+
+# timelinePath の要素
+def AppendPath(GpsLog, Point, Prev, StartTime):
+	try:
+		if 'time' in Point:
+			Time = Iso2Time(Point['time'])
+		else:
+			Time = Iso2Time(StartTime) + int(float(Point['durationMinutesOffsetFromStartTime']) * 60000)
+		
+		if Time == Prev[0]:
+			return
+		Prev[0] = Time
+		
+		Match = _LatLng.search(Point['point'])
+		GpsLog.AppendPoint(Time, float(Match.group(2)), float(Match.group(1)))
+	except (KeyError, TypeError, ValueError, AttributeError):
+		pass
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+# VSD reader
+# gpsx の format registry に 'gpsx_vsd:Read' として登録する
+#
+# 0		1							2			3			4		5
+# GPS	2019-01-04T04:34:39.200Z	136.12345	35.12345	92.600	0.037
+
+import re
+from array import array
+
+from gpsx import Iso2Time
+
+# 1行毎に AppendPoint() せず，READ_SIZE 毎に GPS 行をまとめて channel に追加する
+_Gps = re.compile(r'^GPS\t([^\t\n]*)\t([^\t\n]*)\t([^\t\n]*)\t([^\t\n]*)\t([^\t\r\n]*)', re.M)
+
+def Read(GpsLog, FileName, Range = None):
+	with GpsLog.OpenInput(FileName, 'rt', Range) as FileIn:
+		Rest		= ''
+		PrevTime	= ''
+		
+		while True:
+			Data = FileIn.read(GpsLog.READ_SIZE)
+			
+			# 行の途中までは次の chunk に持ち越す
+			Chunk = Rest + Data
+			if Data:
+				Pos		= Chunk.rfind('\n') + 1
+				Rest	= Chunk[Pos:]
+				Chunk	= Chunk[:Pos]
+			
+			# 同じ時刻の行は最初の行だけ
+			Rows = []
+			for Row in _Gps.findall(Chunk):
+				if PrevTime != Row[0]:
+					PrevTime = Row[0]
+					Rows.append(Row)
+			
+			if Rows:
+				Append(GpsLog, Rows)
+			
+			if not Data:
+				break
+			if GpsLog.ChunkFull(): yield
+	yield
+
+def Append(GpsLog, Rows):
+	(Time, Longitude, Latitude, Altitude, Speed) = zip(*Rows)
+	
+	# 全 channel を変換してから追加する (壊れた値で途中まで追加されないように)
+	Col = [array('q', map(Iso2Time, Time))] + [
+		array('d', map(float, c)) for c in (Longitude, Latitude, Altitude, Speed)
+	]
+	
+	Num = len(Rows)
+	for Name, c in zip(('Time', 'Longitude', 'Latitude', 'Altitude', 'Speed'), Col):
+		getattr(GpsLog, Name).extend(c)
+	
+	GpsLog.Bearing.frombytes(bytes(8 * Num))
+	GpsLog.Distance.frombytes(bytes(8 * Num))
+	GpsLog.Flag.frombytes(bytes((GpsLog.HAS_ALTITUDE | GpsLog.HAS_SPEED,)) * Num)
+	GpsLog.NoBearing	|= 1
+	GpsLog.NoDistance	|= 1
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# 追記されるログの監視
+# 入力 (ファイルまたはディレクトリ内の nmea / vsd) 毎に読み込み済みの byte 位置を記録し，
+# 追記された完結した行だけを読んで出力に追記する．変換の時間は追記された量だけに比例する．
+# 出力済みの最後の点は GpsLog に残し (Lookback)，速度・方位・距離の生成に使う．
+# Linux では inotify で更新を待ち，それ以外は Interval [s] 毎に poll する．
+# --watch を指定した時だけ import する
+
+import os
+import re
+import select
+import sys
+import time
+
+import gpsx_nmea
+from gpsx import FormatRegistry, GpsLogClass, GpsxCancelException, GpsxException, NewGpsLog, OutputFileName, WATCH_INTERVAL
+
+class WatchClass:
+	
+	INTERVAL	= WATCH_INTERVAL
+	Formats		= ('nmea', 'vsd', 'log')
+	
+	def __init__(self, Arg, Interval = INTERVAL):
+		self.Arg		= Arg
+		self.Interval	= Interval
+		self.State		= {}	# 入力ファイル → WatchStateClass
+		
+		if '-' in Arg.input_file:
+			raise GpsxException('--watch cannot read stdin')
+		if Arg.output_file and (len(Arg.input_file) != 1 or os.path.isdir(Arg.input_file[0])):
+			raise GpsxException('--watch with -o needs a single input file')
+		
+		Format = GpsLogClass.GetFormat(Arg.output_file, Arg.output_format)
+		if not FormatRegistry.Get(Format).Append:
+			raise GpsxException('Format %s append not available' % (Format,))
+	
+	# 監視する入力ファイル
+	def Scan(self):
+		for Path in self.Arg.input_file:
+			if not os.path.isdir(Path):
+				yield Path
+				continue
+			
+			for Entry in sorted(os.scandir(Path), key = lambda Entry: Entry.name):
+				if Entry.is_file() and os.path.splitext(Entry.name)[1][1:].lower() in self.Formats:
+					yield Entry.path
+	
+	def Run(self, Count = None):
+		Notify = InotifyClass.Open(
+			[Path if os.path.isdir(Path) else os.path.dirname(Path) or '.' for Path in self.Arg.input_file]
+		)
+		
+		try:
+			while Count is None or Count > 0:
+				if self.Arg.progress:
+					self.Arg.progress.Update('read', True)
+				
+				for File in self.Scan():
+					try:
+						self.Update(File)
+					except GpsxCancelException:
+						raise
+					except Exception as Error:
+						# 次回は最初から変換し直す
+						print('%s: %s' % (File, Error), file = sys.stderr)
+						self.State.pop(File, None)
+				
+				if Count is not None:
+					Count -= 1
+					if Count == 0:
+						break
+				
+				if Notify:
+					Notify.Wait(self.Interval)
+				else:
+					time.sleep(self.Interval)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			if Notify:
+				Notify.close()
+	
+	# File の追記分を変換する
+	def Update(self, File):
+		try:
+			Size = os.path.getsize(File)
+		except OSError:
+			self.State.pop(File, None)
+			return
+		
+		State = self.State.get(File)
+		if State is None or Size < State.Offset:
+			# 新しいファイル，または切り詰められたファイルは最初から変換する
+			State = self.State[File] = WatchStateClass(self.Arg, File)
+			if State.Output == File:
+				raise GpsxException('Output file is the same as input file')
+		
+		End = self.LineEnd(File, State.Offset, Size)
+		if GpsLogClass.GetFormat(File, self.Arg.input_format) == 'nmea':
+			End = self.NmeaEnd(File, State.Offset, End)
+		if End <= State.Offset:
+			return
+		
+		GpsLog = State.GpsLog
+		for _ in GpsLog.Reader(File, self.Arg.input_format, (State.Offset, 0, End - State.Offset)):
+			pass
+		State.Offset = End
+		
+		# 出力済みの点以前の時刻の点は捨てる
+		if GpsLog.Lookback:
+			Stale = 1
+			while Stale < len(GpsLog) and GpsLog.Time[Stale] <= GpsLog.Time[0]:
+				Stale += 1
+			for Name in GpsLog.Channels:
+				del getattr(GpsLog, Name)[1:Stale]
+		
+		# 最初の出力は方位の生成に 2点以上必要
+		if len(GpsLog) < (2 if State.Written == 0 else GpsLog.Lookback + 1):
+			return
+		
+		if State.Written:
+			GpsLog.WriteAppend(State.Output, self.Arg.output_format)
+		else:
+			GpsLog.Write(State.Output, self.Arg.output_format)
+		State.Written += len(GpsLog) - GpsLog.Lookback
+		GpsLog.Trim()
+		
+		print('%s: %d points -> %s' % (File, State.Written, State.Output), file = sys.stderr)
+	
+	# Start ～ Size の最後の改行の次の位置 (書き込み途中の行は読まない)
+	@staticmethod
+	def LineEnd(File, Start, Size):
+		with open(File, 'rb') as FileIn:
+			End = Size
+			while End > Start:
+				Pos = max(End - GpsLogClass.READ_SIZE, Start)
+				FileIn.seek(Pos)
+				Newline = FileIn.read(End - Pos).rfind(b'\n')
+				if Newline >= 0:
+					return Pos + Newline + 1
+				End = Pos
+		return Start
+	
+	# nmea は同じ時刻の文 (RMC, GGA) を 1点にまとめるので，最後の時刻の文は揃っていない
+	# かもしれない．Start ～ End の最後の時刻の最初の文の位置を返し，次の時刻の文が
+	# 追記されてから読む (高度の無い点を出力すると，以降の高度が全て生成値になる)
+	_NmeaTime = None
+	
+	@classmethod
+	def NmeaEnd(cls, File, Start, End):
+		if cls._NmeaTime is None:
+			cls._NmeaTime = re.compile(
+				rb'^\$[A-Z]{2}(?:' + b'|'.join(gpsx_nmea.Sentence) + rb'),([^,*\r\n]*)', re.M
+			)
+		
+		Pos = max(End - GpsLogClass.READ_SIZE, Start)
+		with open(File, 'rb') as FileIn:
+			FileIn.seek(Pos)
+			Match = list(cls._NmeaTime.finditer(FileIn.read(End - Pos)))
+		
+		if not Match:
+			return End
+		
+		i = len(Match) - 1
+		while i > 0 and Match[i - 1].group(1) == Match[-1].group(1):
+			i -= 1
+		return Pos + Match[i].start()
+
+class WatchStateClass:
+	def __init__(self, Arg, File):
+		self.GpsLog		= NewGpsLog(Arg, File)
+		self.Output		= Arg.output_file or OutputFileName(File, Arg.output_format)
+		self.Offset		= 0		# 読み込み済みの byte 数
+		self.Written	= 0		# 出力済みの点数
+
+# Linux の inotify (ctypes)．使えなければ Open() が None を返す
+class InotifyClass:
+	
+	IN_MODIFY		= 0x00000002
+	IN_CLOSE_WRITE	= 0x00000008
+	IN_MOVED_TO		= 0x00000080
+	IN_CREATE		= 0x00000100
+	
+	@classmethod
+	def Open(cls, Paths):
+		try:
+			import ctypes
+			Libc = ctypes.CDLL(None, use_errno = True)
+			Fd = Libc.inotify_init1(os.O_NONBLOCK)
+		except (ImportError, OSError, AttributeError):
+			return None
+		
+		if Fd < 0:
+			return None
+		
+		Notify = cls(Fd)
+		for Path in Paths:
+			Libc.inotify_add_watch(
+				Fd, os.fsencode(Path), cls.IN_MODIFY | cls.IN_CLOSE_WRITE | cls.IN_MOVED_TO | cls.IN_CREATE
+			)
+		return Notify
+	
+	def __init__(self, Fd):
+		self.Fd = Fd
+	
+	# 更新があるか Timeout [s] 経つまで待つ
+	def Wait(self, Timeout):
+		if select.select([self.Fd], [], [], Timeout)[0]:
+			try:
+				while os.read(self.Fd, 1 << 16):
+					pass
+			except BlockingIOError:
+				pass
+	
+	def close(self):
+		os.close(self.Fd)
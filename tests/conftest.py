@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+Root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, Root)
+sys.path.insert(0, os.path.join(Root, 'benchmarks'))
+
+import trackgen
+
+# trackgen の擬似走行ログを tmp_path に Format で出力し，(GpsLog, ファイル名) を返す
+@pytest.fixture
+def WriteTrack(tmp_path):
+	def WriteTrack(Num, Format = 'nmea', Seed = 1):
+		GpsLog = trackgen.GenTrack(Num, Seed)
+		return GpsLog, trackgen.WriteFormat(GpsLog, Format, str(tmp_path))
+	return WriteTrack
@@ -0,0 +1,69 @@
+import argparse
+import os
+from array import array
+
+import pytest
+
+import gpsx
+import gpsx_racechrono
+
+def Convert(InputFile, Session, Append):
+	gpsx.Convert(argparse.Namespace(
+		input_file = [InputFile], input_format = None,
+		output_file = Session, output_format = 'RaceChrono', append = Append
+	))
+
+def Channels(Session):
+	Data = {}
+	for Name, Size in gpsx_racechrono.ChannelFile:
+		with open(os.path.join(Session, Name), 'rb') as FileIn:
+			Data[Name] = FileIn.read()
+	return Data
+
+# 走行距離は保存済みの最後の点 (1/1000m 未満切り捨て) からの続きなので 1/1000m ずれ得る
+def AssertSession(Session, Expected):
+	A = Channels(Session)
+	B = Channels(Expected)
+	Name = gpsx_racechrono.ChannelFile[1][0]
+	DistanceA = array('Q', A.pop(Name))
+	DistanceB = array('Q', B.pop(Name))
+	
+	assert A == B
+	assert len(DistanceA) == len(DistanceB)
+	assert max(abs(a - b) for a, b in zip(DistanceA, DistanceB)) <= 1
+
+# 前半を変換した session に全体を追記すると全体を変換した session と同じになり，
+# 同じ入力で繰り返し追記しても変わらない (vsd は方位を生成する)
+@pytest.mark.parametrize('Format', ('nmea', 'vsd'))
+def test_AppendRepeat(WriteTrack, tmp_path, Format):
+	_, FileName = WriteTrack(3000, Format)
+	Ext = os.path.splitext(FileName)[1]
+	with open(FileName, 'rt') as FileIn:
+		Lines = FileIn.readlines()
+	with open(tmp_path / ('half' + Ext), 'wt') as FileOut:
+		FileOut.writelines(Lines[:len(Lines) // 2])
+	
+	Full = str(tmp_path / 'full')
+	Convert(FileName, Full, False)
+	
+	Session = str(tmp_path / 'session')
+	Convert(str(tmp_path / ('half' + Ext)), Session, True)
+	Convert(FileName, Session, True)
+	AssertSession(Session, Full)
+	
+	for i in range(2):
+		Convert(FileName, Session, True)
+		AssertSession(Session, Full)
+	
+	# 入力が session の最後の点だけ
+	with open(tmp_path / ('last' + Ext), 'wt') as FileOut:
+		FileOut.writelines(Lines[-2:])
+	Convert(str(tmp_path / ('last' + Ext)), Session, True)
+	AssertSession(Session, Full)
+
+def test_GenBearingOnePoint():
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.AppendPoint(0, 137.0, 35.0)
+	GpsLog.GenSpeed()
+	GpsLog.GenBearing()
+	assert list(GpsLog.Bearing) == [0] and list(GpsLog.Speed) == [0]
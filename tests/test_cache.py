@@ -0,0 +1,80 @@
+import pytest
+
+import gpsx
+import gpsx_nmea
+import trackgen
+
+def Channels(GpsLog):
+	return [list(getattr(GpsLog, Name)) for Name in GpsLog.Channels]
+
+def Missing(GpsLog):
+	return (GpsLog.NoAltitude, GpsLog.NoSpeed, GpsLog.NoBearing, GpsLog.NoDistance)
+
+def Read(FileName, Format, Cache = None):
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Cache = Cache
+	GpsLog.Read(FileName, Format)
+	return GpsLog
+
+def test_GpsxRoundTrip(WriteTrack, tmp_path):
+	Src, FileName = WriteTrack(3000)
+	Src.GenDistance()
+	Src.Write(str(tmp_path / 'copy.gpsx'), 'gpsx')
+	
+	Dst = Read(str(tmp_path / 'copy.gpsx'), 'gpsx')
+	assert Channels(Dst) == Channels(Src)
+
+def test_ParseCacheHit(WriteTrack, tmp_path, monkeypatch):
+	_, FileName = WriteTrack(10000)
+	Cache = gpsx.ParseCacheClass(str(tmp_path / 'cache'))
+	
+	Plain	= Read(FileName, 'nmea')
+	Miss	= Read(FileName, 'nmea', Cache)
+	assert len(list((tmp_path / 'cache').glob('*.gpsx'))) == 1
+	
+	# 2回目は NMEA を parse せず cache から読む
+	def Fail(GpsLog, *Args):
+		raise AssertionError('input parsed again')
+	monkeypatch.setattr(gpsx_nmea, 'Read', Fail)
+	
+	Hit = Read(FileName, 'nmea', Cache)
+	assert Channels(Miss) == Channels(Plain)
+	assert Channels(Hit) == Channels(Plain)
+	assert Missing(Hit) == Missing(Plain)
+
+def test_ParseCacheStale(WriteTrack, tmp_path):
+	Src, FileName = WriteTrack(2000)
+	Cache = gpsx.ParseCacheClass(str(tmp_path / 'cache'))
+	Read(FileName, 'nmea', Cache)
+	
+	# 入力が変わったら cache は使わない
+	Src = trackgen.GenTrack(1500, 2)
+	Src.Write(FileName, 'nmea')
+	assert Channels(Read(FileName, 'nmea', Cache)) == Channels(Read(FileName, 'nmea'))
+
+# magic / version の違う gpsx は読まない
+@pytest.mark.parametrize('Offset, Value', ((0, b'XPSG'), (4, b'\x02\x00')))
+def test_GpsxBadHeader(WriteTrack, tmp_path, Offset, Value):
+	Src, _ = WriteTrack(1000)
+	FileName = str(tmp_path / 'bad.gpsx')
+	Src.Write(FileName, 'gpsx')
+	with open(FileName, 'r+b') as FileOut:
+		FileOut.seek(Offset)
+		FileOut.write(Value)
+	
+	with pytest.raises(gpsx.GpsxException):
+		Read(FileName, 'gpsx')
+
+# 壊れた cache は使わず入力を読み直す
+def test_ParseCacheBroken(WriteTrack, tmp_path):
+	_, FileName = WriteTrack(2000)
+	Cache = gpsx.ParseCacheClass(str(tmp_path / 'cache'))
+	Plain = Read(FileName, 'nmea', Cache)
+	
+	(CacheFile,) = (tmp_path / 'cache').glob('*.gpsx')
+	with open(CacheFile, 'r+b') as FileOut:
+		FileOut.write(b'XPSG')
+		FileOut.seek(-64, 2)
+		FileOut.write(b'\xff' * 64)
+	
+	assert Channels(Read(FileName, 'nmea', Cache)) == Channels(Plain)
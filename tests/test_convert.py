@@ -0,0 +1,29 @@
+import argparse
+import shutil
+
+import pytest
+
+import gpsx
+
+def Channels(FileName, Format):
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Read(FileName, Format)
+	return [list(getattr(GpsLog, Name)) for Name in GpsLog.Channels]
+
+# 出力で入力を上書きしても，全点を読んでから書き出す
+@pytest.mark.parametrize('Format', ('nmea', 'gpx'))
+@pytest.mark.parametrize('Cat', (False, True))
+def test_OverwriteInput(WriteTrack, tmp_path, Format, Cat):
+	_, FileName = WriteTrack(20000, Format)
+	Expected = str(tmp_path / 'expected') + '.' + Format
+	shutil.copy(FileName, Expected)
+	gpsx.Convert(argparse.Namespace(
+		input_file = [Expected], input_format = None, output_file = Expected + '.out', output_format = Format
+	))
+	
+	gpsx.Convert(argparse.Namespace(
+		input_file = [FileName], input_format = None,
+		output_file = FileName if Cat else None, output_format = Format
+	))
+	assert len(Channels(FileName, Format)[0]) == 20000
+	assert Channels(FileName, Format) == Channels(Expected + '.out', Format)
@@ -0,0 +1,67 @@
+import argparse
+
+import pytest
+
+import gpsx
+import trackgen
+
+START	= '2021-05-04T00:08:10Z'	# trackgen.START_TIME + 500s
+END		= '2021-05-04T00:24:50Z'	# trackgen.START_TIME + 1500s
+
+def Channels(GpsLog):
+	return [list(getattr(GpsLog, Name)) for Name in GpsLog.Channels]
+
+# streaming 変換 (CHUNK_SIZE 点毎に yield) して出力を読み直す
+def Convert(tmp_path, FileName, Format, Name = 'out.gpx', **KwArgs):
+	Output = str(tmp_path / Name)
+	gpsx.Convert(argparse.Namespace(
+		input_file = [FileName], input_format = Format, output_file = Output, output_format = None,
+		start = START, end = END, **KwArgs
+	))
+	
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Read(Output, 'gpx')
+	return GpsLog
+
+@pytest.mark.parametrize('Format', ('nmea', 'vsd'))
+@pytest.mark.parametrize('Index', (None, 60))
+def test_Window(WriteTrack, tmp_path, Format, Index):
+	_, FileName = WriteTrack(20000, Format)
+	
+	GpsLog = Convert(tmp_path, FileName, Format, index = Index)
+	Min = gpsx.Iso2Time(START)
+	Max = gpsx.Iso2Time(END)
+	
+	assert len(GpsLog) == 10001
+	assert GpsLog.Time[0] == Min and GpsLog.Time[-1] == Max
+	
+	# 全点を読んでから窓の外を捨てた結果と同じ
+	Full = gpsx.GpsLogClass()
+	Full.Read(FileName, Format)
+	Full.StartTime = Min
+	Full.EndTime = Max
+	Full.Window(0)
+	assert list(GpsLog.Time) == list(Full.Time)
+	assert list(GpsLog.Latitude) == pytest.approx(list(Full.Latitude), abs = 1e-8)
+	
+	if Index:
+		assert (tmp_path / (trackgen.Formats[Format] + '.gpsxidx')).exists()
+
+# cache を作る読み込み (miss) と cache からの読み込み (hit) の両方で窓が正しく，
+# cache には窓に関係なく全点が入る
+def test_WindowCache(WriteTrack, tmp_path):
+	_, FileName = WriteTrack(20000)
+	Cache = str(tmp_path / 'cache')
+	
+	Plain	= Convert(tmp_path, FileName, 'nmea', 'plain.gpx')
+	Miss	= Convert(tmp_path, FileName, 'nmea', 'miss.gpx', cache = Cache)
+	Hit		= Convert(tmp_path, FileName, 'nmea', 'hit.gpx', cache = Cache)
+	assert len(Plain) == 10001
+	assert Channels(Miss) == Channels(Plain)
+	assert Channels(Hit) == Channels(Plain)
+	
+	Cached = gpsx.GpsLogClass()
+	Cached.Read(str(next((tmp_path / 'cache').glob('*.gpsx'))), 'gpsx')
+	Full = gpsx.GpsLogClass()
+	Full.Read(FileName, 'nmea')
+	assert list(Cached.Time) == list(Full.Time)
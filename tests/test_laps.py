@@ -0,0 +1,66 @@
+import argparse
+import csv
+import json
+import math
+
+import pytest
+
+import gpsx
+
+LAT		= 35.0
+LNG		= 137.0
+RADIUS	= 100		# [m]
+PERIOD	= 60000		# 1周 [ms]
+LAPS	= 10
+
+# 半径 RADIUS の円を時計回りに一定速度で LAPS 周する 10Hz のログ
+def WriteCircuit(FileName):
+	GpsLog = gpsx.GpsLogClass()
+	Ky = 6378137.0 * math.pi / 180
+	Kx = Ky * math.cos(math.radians(LAT))
+	
+	# 計時線の直前から走り始める
+	for i in range(LAPS * PERIOD // 100 + 10):
+		a = 2 * math.pi * (i * 100 - 500) / PERIOD
+		GpsLog.AppendPoint(
+			1620000000000 + i * 100,
+			LNG + RADIUS * math.sin(a) / Kx,
+			LAT + RADIUS * math.cos(a) / Ky
+		)
+	GpsLog.Write(FileName, 'gpx')
+	
+	# 北 (start / finish) と南 (sector) で円を横切る計時線
+	return [
+		(LAT + 80 / Ky, LNG, LAT + 120 / Ky, LNG),
+		(LAT - 80 / Ky, LNG, LAT - 120 / Ky, LNG),
+	]
+
+@pytest.mark.parametrize('Ext', ('json', 'csv'))
+def test_Laps(tmp_path, Ext):
+	Gate = WriteCircuit(str(tmp_path / 'circuit.gpx'))
+	
+	# streaming 変換で chunk の境界を跨ぐ
+	gpsx.Convert(argparse.Namespace(
+		input_file = [str(tmp_path / 'circuit.gpx')], input_format = None,
+		output_file = str(tmp_path / 'out.gpx'), output_format = None,
+		gate = Gate, laps = str(tmp_path / ('laps.' + Ext))
+	))
+	
+	with open(tmp_path / ('laps.' + Ext), 'rt') as FileIn:
+		if Ext == 'json':
+			Laps = [(Lap['time'], Lap['sectors']) for Lap in json.load(FileIn)]
+		else:
+			Rows = list(csv.DictReader(FileIn))
+			Laps = [(float(Row['time']), [float(Row['sector1']), float(Row['sector2'])]) for Row in Rows]
+	
+	assert len(Laps) == LAPS
+	for Time, Sectors in Laps:
+		assert Time == pytest.approx(PERIOD / 1000, abs = 0.002)
+		assert Sectors == pytest.approx([PERIOD / 2000] * 2, abs = 0.002)
+
+def test_GateArgs():
+	with pytest.raises(gpsx.GpsxException):
+		gpsx.Convert(argparse.Namespace(
+			input_file = ['-'], input_format = None, output_file = None, output_format = 'gpx',
+			gate = [(0, 0, 1, 1)], laps = None
+		))
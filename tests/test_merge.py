@@ -0,0 +1,113 @@
+import pytest
+
+import gpsx
+import gpsx_nmea
+
+# Sec 秒目の点 (入力毎に Lat を変えて区別する) の NMEA を書く
+def WriteNmea(tmp_path, Name, Secs, Lat):
+	Lines = []
+	for Sec in Secs:
+		for Body in (
+			'GPRMC,08%02d%02d.000,A,%04d.0000,N,13945.3994,E,10.0,90.0,010912,,,A' % (Sec // 60, Sec % 60, Lat),
+			'GPGGA,08%02d%02d.000,%04d.0000,N,13945.3994,E,1,08,1.0,6.9,M,35.9,M,,0000' % (Sec // 60, Sec % 60, Lat),
+		):
+			Lines.append('$%s%s\n' % (Body, gpsx_nmea.GenChksum(Body)))
+	
+	FileName = str(tmp_path / (Name + '.nmea'))
+	with open(FileName, 'wt') as FileOut:
+		FileOut.writelines(Lines)
+	return FileName
+
+def Rows(GpsLog, Start = 0):
+	return list(zip(GpsLog.Time, GpsLog.Latitude))[Start:]
+
+def ReadMerge(Files, Dedup):
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.ReadMerge(Files, None, Dedup)
+	return Rows(GpsLog)
+
+# OpenStream() で chunk 毎に読み，出力対象の点を集める
+def Stream(Files, Dedup):
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.OpenStream(Files, None, Dedup)
+	Result = []
+	for _ in GpsLog.Chunks():
+		Result += Rows(GpsLog, GpsLog.Lookback)
+	return Result
+
+# 各入力を単独で読んで時刻順 (同じ時刻は入力順) に並べ，Dedup を適用したもの
+def Expected(Files, Dedup):
+	Result = []
+	for File in Files:
+		GpsLog = gpsx.GpsLogClass()
+		GpsLog.Read(File, None)
+		Result += Rows(GpsLog)
+	Result.sort(key = lambda Row: Row[0])
+	
+	if Dedup == 'none':
+		return Result
+	
+	Point = {}
+	for Row in Result:
+		if Dedup == 'last' or Row[0] not in Point:
+			Point[Row[0]] = Row
+	return sorted(Point.values())
+
+# 小さい chunk で cursor の読み込み・MergeSource() の chunk 分割を跨がせる
+@pytest.fixture(autouse = True)
+def SmallChunk(monkeypatch):
+	monkeypatch.setattr(gpsx.GpsLogClass, 'CHUNK_SIZE', 7)
+
+@pytest.mark.parametrize('Read', (ReadMerge, Stream))
+def test_MergeInterleave(tmp_path, Read):
+	Files = [
+		WriteNmea(tmp_path, 'a', range(0, 40, 2), 3500),
+		WriteNmea(tmp_path, 'b', range(1, 40, 2), 3600),
+	]
+	Result = Read(Files, 'first')
+	
+	assert len(Result) == 40
+	assert [Time for Time, Lat in Result] == sorted(Time for Time, Lat in Result)
+	assert [round(Lat) for Time, Lat in Result] == [35, 36] * 20
+	assert Result == Expected(Files, 'first')
+
+# 同じ時刻の点が複数の入力にある
+@pytest.mark.parametrize('Read', (ReadMerge, Stream))
+@pytest.mark.parametrize('Dedup, Num', (('first', 40), ('last', 40), ('none', 70)))
+def test_MergeDedup(tmp_path, Read, Dedup, Num):
+	Files = [
+		WriteNmea(tmp_path, 'a', range(0, 20), 3500),
+		WriteNmea(tmp_path, 'b', range(10, 40), 3600),
+		WriteNmea(tmp_path, 'c', range(15, 35), 3700),
+	]
+	Result = Read(Files, Dedup)
+	
+	assert len(Result) == Num
+	assert Result == Expected(Files, Dedup)
+	
+	# 15 秒目は a, b, c の全てにある
+	Lat = [round(Lat) for Time, Lat in Result if Time == Result[0][0] + 15000]
+	assert Lat == {'first': [35], 'last': [37], 'none': [35, 36, 37]}[Dedup]
+
+# 点の無い入力は (時刻範囲の指定が無ければ) エラー
+@pytest.mark.parametrize('Read', (ReadMerge, Stream))
+def test_MergeEmpty(tmp_path, Read):
+	Files = [
+		WriteNmea(tmp_path, 'a', range(0, 20), 3500),
+		WriteNmea(tmp_path, 'empty', (), 3600),
+		WriteNmea(tmp_path, 'c', range(10, 30), 3700),
+	]
+	with pytest.raises(gpsx.GpsxNoInputException, match = 'empty.nmea'):
+		Read(Files, 'first')
+
+# 時刻範囲の指定時は，範囲内の点が無い入力があってもよい
+def test_MergeEmptyWindow(tmp_path):
+	Files = [
+		WriteNmea(tmp_path, 'a', range(0, 20), 3500),
+		WriteNmea(tmp_path, 'empty', (), 3600),
+		WriteNmea(tmp_path, 'c', range(10, 30), 3700),
+	]
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.StartTime = 0
+	GpsLog.ReadMerge(Files, None, 'first')
+	assert Rows(GpsLog) == Expected([Files[0], Files[2]], 'first')
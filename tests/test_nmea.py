@@ -0,0 +1,92 @@
+import pytest
+
+import gpsx
+import gpsx_nmea
+
+# numpy 版と numpy 無し版の両方で読む
+@pytest.fixture(params = ('numpy', 'python'))
+def Reader(request, monkeypatch):
+	if request.param == 'numpy':
+		pytest.importorskip('numpy')
+	else:
+		monkeypatch.setattr(gpsx_nmea, 'numpy', None)
+	return request.param
+
+# 1秒毎の RMC + GGA (Chksum: '*hh' を付けるか)
+def GenLines(Num, Talker = 'GP', Chksum = True):
+	Lines = []
+	for Sec in range(Num):
+		for Body in (
+			'%sRMC,0851%02d.000,A,3541.%04d,N,13945.3994,E,10.0,90.0,010912,,,A' % (Talker, Sec, Sec),
+			'%sGGA,0851%02d.000,3541.%04d,N,13945.3994,E,1,08,1.0,6.9,M,35.9,M,,0000' % (Talker, Sec, Sec),
+		):
+			Sum = gpsx_nmea.GenChksum(Body) if Chksum else ''
+			Lines.append('$%s%s\n' % (Body, Sum))
+	return Lines
+
+def Read(tmp_path, Lines):
+	FileName = str(tmp_path / 'test.nmea')
+	with open(FileName, 'wt', newline = '') as FileOut:
+		FileOut.writelines(Lines)
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Read(FileName, 'nmea')
+	return GpsLog
+
+def Channels(GpsLog):
+	return [list(getattr(GpsLog, Name)) for Name in GpsLog.Channels]
+
+# talker は $GP 以外 ($GN, $GL ...) も読み，英大文字2文字でなければ捨てる
+def test_Talker(tmp_path, Reader):
+	Expected = Channels(Read(tmp_path, GenLines(10)))
+	assert len(Expected[0]) == 10
+	assert Expected[3] == [6.9] * 10
+	
+	for Talker in ('GN', 'GL'):
+		assert Channels(Read(tmp_path, GenLines(10, Talker))) == Expected
+	
+	for Talker in ('gp', 'G1'):
+		with pytest.raises(gpsx.GpsxNoInputException):
+			Read(tmp_path, GenLines(10, Talker))
+
+# '*hh' が合わない文は捨てる (RMC が無くなった点は捨てる)
+@pytest.mark.parametrize('Sum', ('*00', '*ZZ', '*'))
+def test_BadChksum(tmp_path, Reader, Sum):
+	Lines = GenLines(10)
+	Expected = Channels(Read(tmp_path, Lines[:6] + Lines[8:]))
+	
+	Lines[6] = Lines[6].split('*')[0] + Sum + '\n'
+	assert Channels(Read(tmp_path, Lines)) == Expected
+	
+	# GGA だけ壊れていれば高度の無い点になる
+	Lines = GenLines(10)
+	Lines[7] = Lines[7].split('*')[0] + Sum + '\n'
+	GpsLog = Read(tmp_path, Lines)
+	assert len(GpsLog.Time) == 10
+	assert not GpsLog.Flag[3] & GpsLog.HAS_ALTITUDE
+	assert GpsLog.Altitude[3] == 0
+
+# '*hh' の無い文は検証せずに使う ('\r\n' 改行でも)
+@pytest.mark.parametrize('NewLine', ('\n', '\r\n'))
+def test_NoChksum(tmp_path, Reader, NewLine):
+	Expected = Channels(Read(tmp_path, GenLines(10)))
+	
+	Lines = [Line.replace('\n', NewLine) for Line in GenLines(10, Chksum = False)]
+	assert Channels(Read(tmp_path, Lines)) == Expected
+	
+	# '*hh' の有無が混ざっていても同じ
+	Lines[::3] = [Line.replace('\n', NewLine) for Line in GenLines(10)[::3]]
+	assert Channels(Read(tmp_path, Lines)) == Expected
+
+# chunk の境界で分かれた文・同じ時刻の RMC / GGA も 1回で読んだ時と同じになる
+@pytest.mark.parametrize('ReadSize', (37, 100, 1000, 4096))
+def test_ChunkBoundary(WriteTrack, monkeypatch, Reader, ReadSize):
+	_, FileName = WriteTrack(1000)
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Read(FileName, 'nmea')
+	Expected = Channels(GpsLog)
+	assert len(Expected[0]) == 1000
+	
+	monkeypatch.setattr(gpsx.GpsLogClass, 'READ_SIZE', ReadSize)
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Read(FileName, 'nmea')
+	assert Channels(GpsLog) == Expected
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import gpsx
+
+Plugin = '''
+def Read(GpsLog, FileName, Range = None):
+	with open(FileName) as FileIn:
+		for Line in FileIn:
+			(Time, Lon, Lat) = Line.split(',')
+			GpsLog.AppendPoint(int(Time), float(Lon), float(Lat))
+			if GpsLog.ChunkFull(): yield
+	yield
+
+def Write(GpsLog, FileName):
+	with open(FileName, 'w') as FileOut:
+		for Point in zip(GpsLog.Time, GpsLog.Longitude, GpsLog.Latitude):
+			FileOut.write('%d,%r,%r\\n' % Point)
+'''
+
+def test_ModulePlugin(WriteTrack, tmp_path, monkeypatch):
+	(tmp_path / 'plugfmt.py').write_text(Plugin)
+	monkeypatch.syspath_prepend(str(tmp_path))
+	monkeypatch.setattr(gpsx.FormatRegistry, 'Formats', dict(gpsx.FormatRegistry.Formats))
+	gpsx.RegisterFormat('plug', 'plugfmt:Read', 'plugfmt:Write')
+	
+	Src, _ = WriteTrack(3000)
+	Src.Write(str(tmp_path / 'track.plug'), 'plug')
+	assert 'plugfmt' in sys.modules
+	
+	# 拡張子から format を決める
+	assert gpsx.FormatRegistry.FromExt('plug').Name == 'plug'
+	Dst = gpsx.GpsLogClass()
+	Dst.Read(str(tmp_path / 'track.plug'), 'plug')
+	assert list(Dst.Time) == list(Src.Time)
+	assert list(Dst.Longitude) == list(Src.Longitude)
+	assert list(Dst.Latitude) == list(Src.Latitude)
+
+# import gpsx だけでは numpy や format / 機能毎の module を import しない
+def test_LazyImport():
+	Modules = ('numpy', 'gpsx_nmea', 'gpsx_native', 'gpsx_cache', 'gpsx_index', 'gpsx_watch', 'gpsx_profile', 'gpsx_lap')
+	Loaded = subprocess.run(
+		[sys.executable, '-c', 'import sys, gpsx; print(" ".join(sorted(set(sys.argv[1:]) & set(sys.modules))))', *Modules],
+		cwd = os.path.dirname(gpsx.__file__), capture_output = True, text = True, check = True
+	).stdout.split()
+	assert Loaded == []
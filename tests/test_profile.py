@@ -0,0 +1,51 @@
+import os
+
+import gpsx
+
+def Stage(Profile, Name):
+	return next(r for r in Profile.Result()['stages'] if r['stage'] == Name)
+
+def Read(FileName, Cache = None):
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Cache = Cache
+	Profile = GpsLog.StartProfile()
+	GpsLog.Read(FileName, 'nmea')
+	return GpsLog, Profile
+
+# Gen* の点数を数え，入れ子で呼ばれた GenXY() の点数は重ねない
+def test_ProfileDerivePoints(WriteTrack):
+	_, FileName = WriteTrack(3000)
+	GpsLog, Profile = Read(FileName)
+	GpsLog.GenDistance()
+	
+	Derive = Stage(Profile, 'derive')
+	assert Derive['calls'] == 2
+	assert Derive['points'] == 3000
+
+# cache から読んだ時は入力ではなく cache ファイルの byte 数を数える
+def test_ProfileCacheHit(WriteTrack, tmp_path):
+	_, FileName = WriteTrack(3000)
+	Cache = gpsx.ParseCacheClass(str(tmp_path / 'cache'))
+	
+	_, Profile = Read(FileName, Cache)
+	Miss = Stage(Profile, 'read')
+	assert Miss['bytes'] == os.path.getsize(FileName)
+	assert Miss['cache_hits'] == 0
+	
+	_, Profile = Read(FileName, Cache)
+	Hit = Stage(Profile, 'read')
+	CacheFile, = (tmp_path / 'cache').glob('*.gpsx')
+	assert Hit['bytes'] == os.path.getsize(CacheFile)
+	assert Hit['cache_hits'] == 1
+	assert Hit['points'] == 3000
+
+# peak RSS は process 全体で 1つ，段階毎には増分
+def test_ProfileRss(WriteTrack):
+	_, FileName = WriteTrack(3000)
+	_, Profile = Read(FileName)
+	
+	Result = Profile.Result()
+	assert all(r['rss_growth'] >= 0 for r in Result['stages'])
+	assert sum(r['rss_growth'] for r in Result['stages']) <= Result['process_peak_rss']
+	assert 'peak_rss' not in Result['stages'][0]
+	assert Profile.Table().splitlines()[-1].startswith('total')
@@ -0,0 +1,87 @@
+import argparse
+
+import pytest
+
+import gpsx
+import trackgen
+
+# numpy 版と numpy 無し版の両方で間引く
+@pytest.fixture(params = ('numpy', 'python'))
+def Impl(request, monkeypatch):
+	if request.param == 'numpy':
+		pytest.importorskip('numpy')
+	else:
+		monkeypatch.setattr(gpsx, 'numpy', None)
+	return request.param
+
+def Track(Num = 3000):
+	GpsLog = trackgen.GenTrack(Num)
+	GpsLog.GenXY()
+	return GpsLog
+
+# 直線上の点は両端だけ残る
+@pytest.mark.parametrize('Method', ('dp', 'vw'))
+def test_ReduceStraight(Impl, Method):
+	GpsLog = gpsx.GpsLogClass()
+	for i in range(200):
+		GpsLog.AppendPoint(1600000000000 + i * 100, 136.9 + i * 1e-5, 35.1 + i * 1e-5)
+	Time = GpsLog.Time.tolist()
+	
+	Stats = GpsLog.Reduce(Method, 1)
+	assert (Stats['Input'], Stats['Output']) == (200, 2)
+	assert GpsLog.Time.tolist() == [Time[0], Time[-1]]
+
+# dp: 間引いた点は残した点の線分から Tolerance 以内
+@pytest.mark.parametrize('Tolerance', (0.5, 5, 50))
+def test_ReduceToleranceDP(Impl, Tolerance):
+	GpsLog = Track()
+	Index = GpsLog.SimplifyDP(Tolerance)
+	
+	assert 2 < len(Index) < len(GpsLog)
+	for Start, End in zip(Index, Index[1:]):
+		for i in range(Start + 1, End):
+			assert GpsLog.DistanceLine2Pix(Start, i, End) <= Tolerance ** 2
+
+# Tolerance が大きいほど少なくなる
+@pytest.mark.parametrize('Method', ('dp', 'vw'))
+def test_ReduceToleranceOrder(Impl, Method):
+	Num = [Track().Reduce(Method, Tolerance)['Output'] for Tolerance in (0.5, 5, 50)]
+	assert 3000 > Num[0] > Num[1] > Num[2] > 2
+
+# MaxPoints を指定すれば (Tolerance で残る点がそれより多ければ) ちょうど MaxPoints 点になる
+@pytest.mark.parametrize('Method', ('dp', 'vw'))
+@pytest.mark.parametrize('MaxPoints', (2, 3, 10, 500))
+def test_ReduceMaxPoints(Impl, Method, MaxPoints):
+	GpsLog = Track()
+	Time = GpsLog.Time.tolist()
+	
+	Stats = GpsLog.Reduce(Method, 0.01, MaxPoints)
+	assert Stats['Output'] == len(GpsLog) == MaxPoints
+	assert (GpsLog.Time[0], GpsLog.Time[-1]) == (Time[0], Time[-1])
+	assert set(GpsLog.Time.tolist()) <= set(Time)
+
+# 先頭と末尾の点は常に残る
+@pytest.mark.parametrize('Method', ('dp', 'vw'))
+@pytest.mark.parametrize('Tolerance', (0, 5, 1e7))
+def test_ReduceKeepEnds(Impl, Method, Tolerance):
+	GpsLog = Track()
+	Time = GpsLog.Time.tolist()
+	
+	GpsLog.Reduce(Method, Tolerance)
+	assert (GpsLog.Time[0], GpsLog.Time[-1]) == (Time[0], Time[-1])
+	if Tolerance == 1e7:
+		assert len(GpsLog) == 2
+
+# --max-points (-r 省略時は dp)．--tolerance で残る点の方が少なければそちらになる
+@pytest.mark.parametrize('Tolerance, Exact', ((0.01, True), (5, False)))
+def test_ConvertMaxPoints(WriteTrack, tmp_path, Tolerance, Exact):
+	_, FileName = WriteTrack(3000)
+	Output = str(tmp_path / 'reduced.nmea')
+	gpsx.Convert(argparse.Namespace(
+		input_file = [FileName], input_format = None, output_file = Output, output_format = 'nmea',
+		tolerance = Tolerance, max_points = 100
+	))
+	
+	GpsLog = gpsx.GpsLogClass()
+	GpsLog.Read(Output, 'nmea')
+	assert len(GpsLog) == 100 if Exact else 2 < len(GpsLog) < 100
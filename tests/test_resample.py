@@ -0,0 +1,109 @@
+import math
+
+import pytest
+
+import gpsx
+import trackgen
+
+Base = 1600000000000	# 1秒の倍数の時刻 [ms]
+
+# numpy 版と numpy 無し版の両方で resample する
+@pytest.fixture(params = ('numpy', 'python'))
+def Impl(request, monkeypatch):
+	if request.param == 'numpy':
+		pytest.importorskip('numpy')
+	else:
+		monkeypatch.setattr(gpsx, 'numpy', None)
+	return request.param
+
+# Sec [s] の点 (Value(Sec) を高度, 方位は Bearing(Sec))
+def MakeLog(Secs, Value = lambda Sec: 0.0, Bearing = lambda Sec: 0.0):
+	GpsLog = gpsx.GpsLogClass()
+	for Sec in Secs:
+		GpsLog.AppendPoint(
+			Base + round(Sec * 1000), 136.9 + Sec * 1e-5, 35.1, Value(Sec), 36.0, Bearing(Sec), Sec * 10.0
+		)
+	return GpsLog
+
+def Secs(GpsLog):
+	return [(Time - Base) / 1000 for Time in GpsLog.Time]
+
+# MaxGap を超える区間は補間せず，その間の点は作らない
+@pytest.mark.parametrize('Method', gpsx.GpsLogClass.RESAMPLE)
+def test_ResampleGap(Impl, Method):
+	GpsLog = MakeLog([0, 1, 2, 3, 4, 20, 21, 22, 23, 24])
+	Stats = GpsLog.Resample(2, Method, 5)
+	
+	Expected = [i / 2 for i in range(0, 9)] + [20 + i / 2 for i in range(0, 9)]
+	assert Secs(GpsLog) == Expected
+	assert Stats['Output'] == len(Expected)
+	
+	# gap が MaxGap 以下なら補間する
+	GpsLog = MakeLog([0, 1, 2, 3, 4, 8, 9])
+	GpsLog.Resample(2, Method, 5)
+	assert Secs(GpsLog) == [i / 2 for i in range(0, 19)]
+
+# 方位は 359°→ 0°を跨いでも近い側で補間する (2点なので spline も直線)
+@pytest.mark.parametrize('Method', gpsx.GpsLogClass.RESAMPLE)
+@pytest.mark.parametrize('From, To, Mid', ((359, 1, 0), (1, 359, 0), (350, 10, 0), (170, 190, 180)))
+def test_ResampleBearingWrap(Impl, Method, From, To, Mid):
+	GpsLog = MakeLog([0, 1], Bearing = lambda Sec: (From, To)[Sec])
+	GpsLog.Resample(2, Method)
+	
+	assert Secs(GpsLog) == [0, 0.5, 1]
+	Bearing = GpsLog.Bearing[1]
+	assert min(abs(Bearing - Mid), 360 - abs(Bearing - Mid)) < 1e-9
+	assert all(0 <= b < 360 for b in GpsLog.Bearing)
+
+# linear は区間の両端の直線，spline (Hermite) は 2次式を (端以外の区間で) 再現する
+def test_ResampleLinearSpline(Impl):
+	Square = lambda Sec: Sec * Sec
+	
+	Linear = MakeLog(range(5), Square)
+	Linear.Resample(4, 'linear')
+	Spline = MakeLog(range(5), Square)
+	Spline.Resample(4, 'spline')
+	
+	assert Secs(Linear) == Secs(Spline) == [i / 4 for i in range(17)]
+	for Sec, a, b in zip(Secs(Linear), Linear.Altitude, Spline.Altitude):
+		Left = math.floor(Sec)
+		Chord = Square(Left) + (Square(Left + 1) - Square(Left)) * (Sec - Left) if Sec < 4 else 16
+		assert a == pytest.approx(Chord)
+		if 1 <= Sec <= 3:
+			assert b == pytest.approx(Square(Sec))
+	
+	# 元の点の時刻では元の値
+	assert Linear.Altitude[::4].tolist() == Spline.Altitude[::4].tolist() == [0, 1, 4, 9, 16]
+	
+	# 距離は spline でも線形補間
+	assert Spline.Distance.tolist() == pytest.approx([Sec * 10 for Sec in Secs(Spline)])
+
+# numpy 版と numpy 無し版の結果は丸め誤差以内で同じ
+@pytest.mark.parametrize('Method', gpsx.GpsLogClass.RESAMPLE)
+def test_ResampleParity(monkeypatch, Method):
+	pytest.importorskip('numpy')
+	
+	def Resample(Numpy):
+		GpsLog = trackgen.GenTrack(3000)
+		GpsLog.GenDistance()
+		
+		# gap と，時刻の逆転・重複を作る
+		Index = list(range(0, 1000)) + list(range(1200, 3000))
+		Index[500], Index[501] = Index[501], Index[500]
+		Index.insert(700, 699)
+		GpsLog.Compress(Index)
+		
+		with monkeypatch.context() as m:
+			if not Numpy:
+				m.setattr(gpsx, 'numpy', None)
+			Stats = GpsLog.Resample(3, Method, 5)
+		return GpsLog, Stats
+	
+	a, StatsA = Resample(True)
+	b, StatsB = Resample(False)
+	
+	assert StatsA == StatsB
+	assert a.Time.tolist() == b.Time.tolist()
+	assert a.Flag.tolist() == b.Flag.tolist()
+	for Name in ('Longitude', 'Latitude', 'Altitude', 'Speed', 'Bearing', 'Distance'):
+		assert getattr(a, Name).tolist() == pytest.approx(getattr(b, Name).tolist(), rel = 1e-12, abs = 1e-9), Name
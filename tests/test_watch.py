@@ -0,0 +1,66 @@
+import argparse
+import os
+import random
+
+import pytest
+
+import gpsx
+
+# Convert() を経由しないので既定値も全て指定する
+def WatchArg(InputFile, OutputFormat):
+	return argparse.Namespace(
+		input_file = [InputFile], input_format = None, output_file = None, output_format = OutputFormat,
+		reduce = None, tolerance = gpsx.GpsLogClass.REDUCE_TOLERANCE, max_points = None,
+		rate = None, interp = 'linear', max_gap = gpsx.GpsLogClass.RESAMPLE_MAX_GAP,
+		gate = None, laps = None, profile = None, progress = None,
+		cache = None, cache_size = 1, start = None, end = None, index = None,
+		gzip_level = gpsx.GZIP_LEVEL, gzip_threads = 1, dedup = 'first', watch = None, append = False
+	)
+
+# 出力ファイル (RaceChrono はディレクトリ内の各ファイル) の内容
+def Output(InputFile, Format):
+	Path = gpsx.OutputFileName(InputFile, Format)
+	if not os.path.isdir(Path):
+		with open(Path, 'rb') as FileIn:
+			return FileIn.read()
+	
+	Data = {}
+	for Name in sorted(os.listdir(Path)):
+		with open(os.path.join(Path, Name), 'rb') as FileIn:
+			Data[Name] = FileIn.read()
+	return Data
+
+# 行の途中で切れた追記を含め，少しずつ追記しながら変換した結果が一括変換と同じ
+@pytest.mark.parametrize('Format, OutputFormat', (('nmea', 'gpx'), ('nmea', 'RaceChrono'), ('vsd', 'nmea')))
+def test_Watch(WriteTrack, tmp_path, Format, OutputFormat):
+	_, FileName = WriteTrack(6000, Format)
+	with open(FileName, 'rb') as FileIn:
+		Data = FileIn.read()
+	
+	# nmea の最後の時刻の点は次の時刻の文が来るまで出力されない
+	os.mkdir(tmp_path / 'once')
+	Once = str(tmp_path / 'once' / os.path.basename(FileName))
+	with open(Once, 'wb') as FileOut:
+		FileOut.write(Data[:Data.rindex(b'$GPRMC')] if Format == 'nmea' else Data)
+	gpsx.Convert(WatchArg(Once, OutputFormat))
+	
+	os.mkdir(tmp_path / 'watch')
+	Watched = str(tmp_path / 'watch' / os.path.basename(FileName))
+	open(Watched, 'wb').close()
+	Watch = gpsx.WatchClass(WatchArg(Watched, OutputFormat), 0)
+	
+	Rand	= random.Random(1)
+	Pos		= 0
+	while Pos < len(Data):
+		Size = Rand.randint(1, 50000)
+		with open(Watched, 'ab') as FileOut:
+			FileOut.write(Data[Pos:Pos + Size])
+		Pos += Size
+		Watch.Run(1)
+	
+	assert Output(Watched, OutputFormat) == Output(Once, OutputFormat)
+
+def test_WatchNoAppend(WriteTrack):
+	_, FileName = WriteTrack(10)
+	with pytest.raises(gpsx.GpsxException):
+		gpsx.WatchClass(WatchArg(FileName, 'kml'))